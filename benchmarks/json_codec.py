@@ -0,0 +1,183 @@
+"""
+JSON codec benchmark.
+
+Builds large get_tasks responses shaped like Clickup's and Todoist's, then times each
+available JSON codec decoding them, decoding and converting every task into a Task
+object, and encoding them. The median of each is written to a JSON file.
+
+Usage: python benchmarks/json_codec.py --tasks 100,1000 --repeat 20
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Konnector's settings for the benchmark. No requests are sent to the platforms.
+KONNECTOR_ENV = {
+    "ENDPOINT": "http://127.0.0.1",
+    "TODOIST_ACCESS": "benchmark",
+    "TODOIST_CLIENT_ID": "benchmark",
+    "TODOIST_SECRET": "benchmark",
+    "TODOIST_STATE": "benchmark",
+    "CLICKUP_TOKEN": "benchmark",
+    "CLICKUP_WEBHOOK_ID": "benchmark",
+    "CLICKUP_WEBHOOK_SECRET": "benchmark",
+    "TIMEZONE": "UTC",
+}
+os.environ.update({k: os.getenv(k, v) for k, v in KONNECTOR_ENV.items()})
+
+from konnector import jsonlib  # noqa: E402
+from konnector.main import todoist, clickup  # noqa: E402
+
+USER = {"id": 2511898, "username": "User", "email": "user@example.com", "color": ""}
+
+
+def clickup_task(n: int) -> dict:
+    """A task with the fields Clickup's API returns, most of which aren't used."""
+    return {
+        "id": f"86{n:07d}",
+        "custom_id": None,
+        "name": f"Task {n}",
+        "text_content": "Some notes about the task. " * 4,
+        "description": "Some notes about the task. " * 4,
+        "status": {"status": "next action", "color": "#d3d3d3", "type": "custom"},
+        "orderindex": f"{n}.00000000000000000000000000000000",
+        "date_created": "1672621323000",
+        "date_updated": "1672621323000",
+        "date_closed": None,
+        "archived": False,
+        "creator": USER,
+        "assignees": [USER],
+        "watchers": [USER],
+        "checklists": [],
+        "tags": [{"name": "home", "tag_fg": "#fff", "tag_bg": "#000"}],
+        "parent": None,
+        "priority": {"id": "2", "priority": "high", "color": "#ffcc00"},
+        "due_date": "1675209600000",
+        "start_date": None,
+        "points": None,
+        "time_estimate": None,
+        "custom_fields": [
+            {
+                "id": "550a93a0-6978-4664-be6d-777cc0d7aff6",
+                "name": "Todoist ID",
+                "type": "short_text",
+                "value": str(6000000000 + n),
+            }
+        ],
+        "dependencies": [],
+        "linked_tasks": [],
+        "team_id": "2193273",
+        "url": f"https://app.clickup.com/t/86{n:07d}",
+        "list": {"id": "38260663", "name": "Inbox", "access": True},
+        "project": {"id": "17398998", "name": "Folder", "access": True},
+        "folder": {"id": "17398998", "name": "Folder", "access": True},
+        "space": {"id": "4416464"},
+    }
+
+
+def todoist_task(n: int) -> dict:
+    """A task with the fields Todoist's REST API returns."""
+    return {
+        "id": str(6000000000 + n),
+        "assigner_id": None,
+        "assignee_id": None,
+        "project_id": "2200213434",
+        "section_id": None,
+        "parent_id": None,
+        "order": n,
+        "content": f"Task {n}",
+        "description": "Some notes about the task. " * 4,
+        "is_completed": False,
+        "labels": ["home"],
+        "priority": 3,
+        "comment_count": 0,
+        "creator_id": "20038827",
+        "created_at": "2023-01-02T01:02:03.000000Z",
+        "due": {
+            "date": "2023-02-01",
+            "string": "Feb 1",
+            "lang": "en",
+            "is_recurring": False,
+        },
+        "url": f"https://todoist.com/showTask?id={6000000000 + n}",
+        "duration": None,
+    }
+
+
+def median_ms(func, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return round(statistics.median(times) * 1000, 3)
+
+
+def run(args) -> dict:
+    codecs = [jsonlib.JsonCodec()]
+    if jsonlib.orjson is not None:
+        codecs.append(jsonlib.OrjsonCodec())
+    else:
+        print("orjson is not installed. Only the standard library is benchmarked.")
+
+    results = []
+    for platform, build, wrap in (
+        (clickup, clickup_task, lambda tasks: {"tasks": tasks}),
+        (todoist, todoist_task, lambda tasks: tasks),
+    ):
+        for count in args.tasks:
+            response = wrap([build(n) for n in range(count)])
+            body = json.dumps(response).encode()
+            result = {"platform": str(platform), "tasks": count, "bytes": len(body)}
+            for codec in codecs:
+
+                def convert():
+                    tasks = platform._get_result_get_tasks(codec.loads(body))
+                    return [platform._convert_task_from_platform(t) for t in tasks]
+
+                result[codec.name] = {
+                    "decode_ms": median_ms(lambda: codec.loads(body), args.repeat),
+                    "decode_convert_ms": median_ms(convert, args.repeat),
+                    "encode_ms": median_ms(lambda: codec.dumps(response), args.repeat),
+                }
+            print(result)
+            results.append(result)
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "settings": {"repeat": args.repeat},
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--tasks",
+        type=lambda s: [int(n) for n in s.split(",")],
+        default=[100, 1000],
+        help="Comma separated numbers of tasks in each response",
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default="json_output.json")
+    args = parser.parse_args()
+
+    output = run(args)
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {args.output}")
@@ -0,0 +1,178 @@
+"""
+Startup time benchmark.
+
+Measures, in fresh processes, how long it takes to import konnector.main, to create
+the app with create_app, and for gunicorn to serve its first response with different
+numbers of workers. The median of each is written to a JSON file and compared with
+the startup targets.
+
+Usage: python benchmarks/startup_time.py --workers 1,4 --repeat 5
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Konnector's settings for the benchmark. No requests are sent to the platforms.
+KONNECTOR_ENV = {
+    "ENDPOINT": "http://127.0.0.1",
+    "TODOIST_ACCESS": "benchmark",
+    "TODOIST_CLIENT_ID": "benchmark",
+    "TODOIST_SECRET": "benchmark",
+    "TODOIST_STATE": "benchmark",
+    "CLICKUP_TOKEN": "benchmark",
+    "CLICKUP_WEBHOOK_ID": "benchmark",
+    "CLICKUP_WEBHOOK_SECRET": "benchmark",
+    "TIMEZONE": "UTC",
+}
+
+# Median seconds that each stage should take
+TARGETS = {
+    "import": 0.35,
+    "create_app": 0.4,
+    "gunicorn_ready": 1.0,
+}
+
+TIMED_SCRIPT = """
+import time
+start = time.perf_counter()
+import konnector.main
+imported = time.perf_counter()
+konnector.main.create_app({"DEFER_SCHEDULER": True})
+created = time.perf_counter()
+print(imported - start, created - imported)
+"""
+
+
+def konnector_env(**extra) -> dict:
+    env = {**os.environ, **extra}
+    for key, value in KONNECTOR_ENV.items():
+        env.setdefault(key, value)
+    # Each run starts with an empty store, as after a deploy
+    env["KONNECTOR_DATA_DIR"] = tempfile.mkdtemp(prefix="konnector-startup-")
+    return env
+
+
+def time_import() -> tuple[float, float]:
+    """Return the seconds taken to import konnector.main and then create the app."""
+    result = subprocess.run(
+        [sys.executable, "-c", TIMED_SCRIPT],
+        cwd=ROOT,
+        env=konnector_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imported, created = result.stdout.split()
+    return float(imported), float(imported) + float(created)
+
+
+def time_gunicorn(workers: int, port: int, args) -> float:
+    """Return the seconds from starting gunicorn until it serves a response."""
+    env = konnector_env(
+        WEB_CONCURRENCY=str(workers),
+        BIND=f"127.0.0.1:{port}",
+        LOG_LEVEL="warning",
+        METRICS_DIR=tempfile.mkdtemp(prefix="konnector-startup-"),
+    )
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [
+            args.gunicorn,
+            "-c",
+            os.path.join(ROOT, "gunicorn_conf.py"),
+            "konnector.main:app",
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                requests.get(f"http://127.0.0.1:{port}", timeout=1)
+                return time.perf_counter() - start
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.01)
+        raise Exception(f"gunicorn with {workers} workers did not start")
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run(args) -> dict:
+    imports = [time_import() for _ in range(args.repeat)]
+    results = {
+        "import": round(statistics.median(t[0] for t in imports), 3),
+        "create_app": round(statistics.median(t[1] for t in imports), 3),
+    }
+    print(f"import: {results['import']}s, create_app: {results['create_app']}s")
+    if args.gunicorn is not None:
+        results["gunicorn_ready"] = {}
+        for workers in args.workers:
+            seconds = statistics.median(
+                time_gunicorn(workers, args.port, args) for _ in range(args.repeat)
+            )
+            results["gunicorn_ready"][workers] = round(seconds, 3)
+            print(f"gunicorn with {workers} workers ready: {seconds:.3f}s")
+
+    missed = [
+        stage
+        for stage, target in TARGETS.items()
+        if stage in results
+        and max(
+            results[stage].values()
+            if isinstance(results[stage], dict)
+            else [results[stage]]
+        )
+        > target
+    ]
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "settings": {"repeat": args.repeat},
+        "targets": TARGETS,
+        "missed_targets": missed,
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--workers",
+        type=lambda s: [int(n) for n in s.split(",")],
+        default=[1, 4],
+        help="Comma separated numbers of gunicorn workers to benchmark",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8091)
+    parser.add_argument("--gunicorn", default=shutil.which("gunicorn"))
+    parser.add_argument("--output", default="startup_output.json")
+    args = parser.parse_args()
+
+    output = run(args)
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {args.output}")
+    if output["missed_targets"]:
+        print(f"Missed targets: {', '.join(output['missed_targets'])}")
+        sys.exit(1)
@@ -0,0 +1,287 @@
+"""
+End-to-end webhook throughput benchmark.
+
+Runs Konnector under gunicorn with different numbers of workers, against fake Todoist
+and Clickup APIs, and sends it correctly signed webhooks. For each webhook event the
+throughput, latency percentiles, API requests per webhook and peak memory use of the
+gunicorn processes are written to a JSON file.
+
+Usage: python benchmarks/webhook_throughput.py --workers 1,2,4 --webhooks 200
+"""
+import argparse
+import concurrent.futures
+import datetime
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Konnector's settings for the benchmark. Webhooks are signed with these secrets.
+KONNECTOR_ENV = {
+    "ENDPOINT": "http://127.0.0.1",
+    "TODOIST_ACCESS": "benchmark",
+    "TODOIST_CLIENT_ID": "benchmark",
+    "TODOIST_SECRET": "benchmark-todoist-secret",
+    "TODOIST_STATE": "benchmark",
+    "CLICKUP_TOKEN": "benchmark",
+    "CLICKUP_WEBHOOK_ID": "benchmark",
+    "CLICKUP_WEBHOOK_SECRET": "benchmark-clickup-secret",
+    "TIMEZONE": "UTC",
+}
+os.environ.update({k: os.getenv(k, v) for k, v in KONNECTOR_ENV.items()})
+
+from konnector.fake_api import FakeApi, FakeApiServer  # noqa: E402
+from konnector.main import todoist, clickup  # noqa: E402
+from konnector.main import todoistEndpoint, clickupEndpoint  # noqa: E402
+
+
+def percentile(sortedValues: list, percent: float) -> float:
+    index = min(len(sortedValues) - 1, int(round(percent / 100 * len(sortedValues))))
+    return sortedValues[index]
+
+
+def process_tree(pid: int) -> list[int]:
+    """Return a process and all of its descendants (Linux only)."""
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        children = []
+    for child in children:
+        pids.extend(process_tree(child))
+    return pids
+
+
+def peak_rss(pid: int) -> dict:
+    """Peak resident memory (kB) of a gunicorn master and its workers."""
+    peaks = {}
+    for treePid in process_tree(pid):
+        try:
+            with open(f"/proc/{treePid}/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        peaks[treePid] = int(line.split()[1])
+        except OSError:
+            continue
+    return {
+        "master_kb": peaks.pop(pid, None),
+        "max_worker_kb": max(peaks.values(), default=None),
+        "workers_total_kb": sum(peaks.values()),
+    }
+
+
+def unique_rss(pid: int) -> dict:
+    """
+    Resident memory (kB) that each gunicorn worker doesn't share with other processes,
+    e.g. pages copied on write after fork (Linux only).
+    """
+    unique = {}
+    for treePid in process_tree(pid)[1:]:
+        try:
+            with open(f"/proc/{treePid}/smaps_rollup") as f:
+                unique[treePid] = sum(
+                    int(line.split()[1])
+                    for line in f
+                    if line.startswith(("Private_Clean:", "Private_Dirty:"))
+                )
+        except OSError:
+            continue
+    return {
+        "max_worker_unique_kb": max(unique.values(), default=None),
+        "workers_unique_total_kb": sum(unique.values()),
+    }
+
+
+def build_webhooks(api: FakeApi, event: str, count: int) -> list:
+    """
+    Create tasks in the fake APIs and signed webhooks for them. Each webhook has its
+    own task as most events change the task they are sent for.
+    """
+    webhooks = []
+    for _ in range(count):
+        if event == "todoist:new_task":
+            task = api.add_todoist_task(todoist.get_list_id("inbox"), priority=4)
+            body, headers = api.todoist_webhook(
+                todoist.secret, "item:added", task["id"], todoist.userIds[0]
+            )
+            webhooks.append((todoistEndpoint, body, headers))
+        elif event == "clickup:task_updated":
+            task = api.add_clickup_task(
+                clickup.get_list_id("inbox"),
+                status={"status": "next action"},
+                priority={"id": "2"},
+            )
+            body, headers = api.clickup_webhook(
+                clickup.secret, task["id"], clickup.userIds[0]
+            )
+            webhooks.append((clickupEndpoint, body, headers))
+        else:
+            raise Exception(f"Unknown benchmark event: {event}")
+    return webhooks
+
+
+def send_webhooks(url: str, webhooks: list, concurrency: int) -> tuple[float, list]:
+    """
+    Send webhooks concurrently.
+
+    Returns:
+        The total time taken and the latency of each webhook, in seconds.
+    """
+    session = requests.Session()
+
+    def send(webhook):
+        endpoint, body, headers = webhook
+        start = time.perf_counter()
+        response = session.post(url + endpoint, data=body, headers=headers)
+        latency = time.perf_counter() - start
+        if response.status_code != 202 or b"success" not in response.content:
+            raise Exception(f"Webhook failed: {response.text}")
+        return latency
+
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        latencies = list(executor.map(send, webhooks))
+    return time.perf_counter() - start, latencies
+
+
+def start_gunicorn(workers: int, port: int, server: FakeApiServer, args):
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "BIND": f"127.0.0.1:{port}",
+        "LOG_LEVEL": "warning",
+        "TODOIST_API_URL": server.url("todoist"),
+        "CLICKUP_API_URL": server.url("clickup"),
+        "METRICS_DIR": tempfile.mkdtemp(prefix="konnector-benchmark-"),
+    }
+    process = subprocess.Popen(
+        [
+            args.gunicorn,
+            "-c",
+            os.path.join(ROOT, "gunicorn_conf.py"),
+            "konnector.main:app",
+        ],
+        cwd=ROOT,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return process, url
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.1)
+    process.terminate()
+    raise Exception(f"gunicorn with {workers} workers did not start")
+
+
+def run(args) -> dict:
+    api = FakeApi(latency=args.api_latency, rateLimit=args.rate_limit)
+    results = []
+    with FakeApiServer(api) as server:
+        for workers in args.workers:
+            process, url = start_gunicorn(workers, args.port, server, args)
+            try:
+                events = {}
+                for event in args.events:
+                    api.reset()
+                    webhooks = build_webhooks(
+                        api, event, args.webhooks + args.concurrency
+                    )
+                    # Warm up imports and connections before measuring
+                    send_webhooks(url, webhooks[: args.concurrency], args.concurrency)
+                    webhooks = webhooks[args.concurrency :]
+                    api.requests.clear()
+
+                    duration, latencies = send_webhooks(url, webhooks, args.concurrency)
+                    latencies.sort()
+                    events[event] = {
+                        "webhooks": len(webhooks),
+                        "webhooks_per_sec": round(len(webhooks) / duration, 2),
+                        "latency_ms": {
+                            f"p{p}": round(percentile(latencies, p) * 1000, 2)
+                            for p in (50, 95, 99)
+                        },
+                        "api_calls_per_webhook": round(
+                            len(api.requests) / len(webhooks), 2
+                        ),
+                    }
+                    print(f"workers={workers} {event}: {events[event]}")
+                results.append(
+                    {
+                        "workers": workers,
+                        "events": events,
+                        "peak_rss": peak_rss(process.pid),
+                        "unique_rss": unique_rss(process.pid),
+                    }
+                )
+                print(f"workers={workers} memory: {results[-1]['unique_rss']}")
+            finally:
+                process.terminate()
+                process.wait()
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "commit": commit,
+        "settings": {
+            "webhooks": args.webhooks,
+            "concurrency": args.concurrency,
+            "api_latency": args.api_latency,
+        },
+        "results": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--workers",
+        type=lambda s: [int(n) for n in s.split(",")],
+        default=[1, 2, 4],
+        help="Comma separated numbers of gunicorn workers to benchmark",
+    )
+    parser.add_argument(
+        "--events",
+        type=lambda s: s.split(","),
+        default=["todoist:new_task", "clickup:task_updated"],
+    )
+    parser.add_argument("--webhooks", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument(
+        "--api-latency",
+        type=float,
+        default=0.02,
+        help="Seconds added to each fake API response",
+    )
+    parser.add_argument("--rate-limit", type=int, default=1000000)
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--gunicorn", default=shutil.which("gunicorn"))
+    parser.add_argument("--output", default="bench_output.json")
+    args = parser.parse_args()
+    # Don't log every request to the fake APIs
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    if args.gunicorn is None:
+        parser.error("gunicorn was not found. Install it or use --gunicorn")
+
+    output = run(args)
+    with open(args.output, "w") as f:
+        json.dump(output, f, indent=2)
+    print(f"Results written to {args.output}")
@@ -1,14 +1,31 @@
 from __future__ import print_function
 
+import gc
 import json
 import multiprocessing
 import os
 
-workers_per_core_str = os.getenv("WORKERS_PER_CORE", "2")
+# With preload_app, objects that exist before fork are shared by the workers until
+# they are written to. Garbage collection is paused while the app loads, so no gaps
+# are left in those pages, and the loaded objects are frozen before fork so that
+# collections in the workers don't write to them. PRELOAD_FREEZE=false disables this.
+preload_freeze = os.getenv("PRELOAD_FREEZE", "true").lower() in ("true", "1")
+if preload_freeze:
+    gc.disable()
+
+workers_per_core_str = os.getenv("WORKERS_PER_CORE", "1")
 web_concurrency_str = os.getenv("WEB_CONCURRENCY", None)
+# Each worker serves many webhooks at once while they wait on platform APIs.
+# "gthread" runs THREADS threads per worker. "gevent" runs up to WORKER_CONNECTIONS
+# greenlets per worker and requires gevent to be installed.
+worker_class_str = os.getenv("WORKER_CLASS", "gthread")
+threads_str = os.getenv("THREADS", "8")
+worker_connections_str = os.getenv("WORKER_CONNECTIONS", "100")
 host = os.getenv("HOST", "0.0.0.0")
 port = os.getenv("PORT", "80")
 bind_env = os.getenv("BIND", None)
+# The scheduler is started in a worker after forking
+os.environ.setdefault("DEFER_SCHEDULER", "true")
 use_loglevel = os.getenv("LOG_LEVEL", "info")
 if bind_env:
     use_bind = bind_env
@@ -27,6 +44,10 @@ else:
 # Gunicorn config variables
 loglevel = use_loglevel
 workers = web_concurrency
+worker_class = worker_class_str
+# Gunicorn switches sync workers to gthread if threads is above 1
+threads = int(threads_str) if worker_class == "gthread" else 1
+worker_connections = int(worker_connections_str)
 bind = use_bind
 keepalive = 120
 errorlog = "-"
@@ -37,6 +58,9 @@ preload_app = True
 log_data = {
     "loglevel": loglevel,
     "workers": workers,
+    "worker_class": worker_class,
+    "threads": threads,
+    "preload_freeze": preload_freeze,
     "bind": bind,
     # Additional, non-gunicorn variables
     "workers_per_core": workers_per_core,
@@ -44,3 +68,30 @@ log_data = {
     "port": port,
 }
 print(json.dumps(log_data))
+
+
+# Server hooks
+def on_starting(server):
+    # Metrics from a previous run would otherwise be merged with this run's workers.
+    from konnector.metrics import REGISTRY
+
+    REGISTRY.clear()
+
+
+def when_ready(server):
+    # Runs in the master once the app is loaded, before the first worker is forked
+    if preload_app:
+        from konnector.main import warm_up
+
+        warm_up(server.app.wsgi())
+    if preload_freeze:
+        gc.freeze()
+        gc.enable()
+
+
+def post_fork(server, worker):
+    # Each worker makes its own connections. One worker is elected to run scheduled
+    # jobs and another takes over if it dies.
+    from konnector.main import after_fork
+
+    after_fork()
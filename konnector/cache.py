@@ -0,0 +1,134 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import logging
+import os
+import sqlite3
+import time
+
+from konnector import jsonlib, metrics, store
+
+logger = logging.getLogger("gunicorn.error")
+
+store.register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS cache_entries (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value BLOB NOT NULL,
+        expires REAL NOT NULL,
+        accessed REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    );
+    CREATE INDEX IF NOT EXISTS cache_entries_accessed ON cache_entries (accessed);
+    """
+)
+
+# Seconds that an entry is used for. 0 turns the cache off.
+TTL = float(os.getenv("CACHE_TTL", 30))
+# Entries kept before the least recently used are evicted
+MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+# Access times are only updated this often, so that reads of a popular entry aren't
+# all writes
+ACCESS_RESOLUTION = 1.0
+
+CACHE_REQUESTS = metrics.Counter(
+    "konnector_cache_requests_total",
+    "Lookups in the shared cache, by whether the entry was found.",
+    ["namespace", "result"],
+)
+CACHE_EVICTIONS = metrics.Counter(
+    "konnector_cache_evictions_total",
+    "Entries removed from the shared cache because they expired or it was full.",
+    ["reason"],
+)
+
+
+def get(namespace, key: str):
+    """
+    Return a cached value, or None if it isn't cached or has expired.
+
+    Arguments:
+        namespace: What the key identifies, e.g. a platform for its tasks.
+        key: The entry's key within the namespace.
+    """
+    now = time.time()
+    try:
+        row = store.execute(
+            "SELECT value, expires, accessed FROM cache_entries WHERE namespace = ?"
+            " AND key = ?",
+            (str(namespace), str(key)),
+        ).fetchone()
+        if row is not None and row["expires"] <= now:
+            invalidate(namespace, key)
+            CACHE_EVICTIONS.inc(reason="expired")
+            row = None
+        elif row is not None and now - row["accessed"] > ACCESS_RESOLUTION:
+            store.execute(
+                "UPDATE cache_entries SET accessed = ? WHERE namespace = ? AND key = ?",
+                (now, str(namespace), str(key)),
+            )
+    except sqlite3.Error as err:
+        logger.warning(f"Unable to read the cache: {err}")
+        row = None
+    CACHE_REQUESTS.inc(namespace=namespace, result="miss" if row is None else "hit")
+    return None if row is None else jsonlib.CODEC.loads(row["value"])
+
+
+def put(namespace, key: str, value, ttl: float = None) -> None:
+    """
+    Cache a value that can be encoded as JSON, evicting the least recently used
+    entries if the cache is full.
+
+    Arguments:
+        namespace: What the key identifies, e.g. a platform for its tasks.
+        key: The entry's key within the namespace.
+        value: The value to cache.
+        ttl: Seconds to use the value for. Defaults to CACHE_TTL.
+    """
+    ttl = TTL if ttl is None else ttl
+    if ttl <= 0 or MAX_ENTRIES <= 0:
+        return
+    now = time.time()
+    try:
+        conn = store.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (namespace, key, value, expires,"
+                " accessed) VALUES (?, ?, ?, ?, ?)",
+                (str(namespace), str(key), jsonlib.CODEC.dumps(value), now + ttl, now),
+            )
+            excess = (
+                conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+                - MAX_ENTRIES
+            )
+            if excess > 0:
+                expired = conn.execute(
+                    "DELETE FROM cache_entries WHERE expires <= ?", (now,)
+                ).rowcount
+                evicted = conn.execute(
+                    "DELETE FROM cache_entries WHERE rowid IN (SELECT rowid FROM"
+                    " cache_entries ORDER BY accessed LIMIT ?)",
+                    (max(excess - expired, 0),),
+                ).rowcount
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as err:
+        logger.warning(f"Unable to update the cache: {err}")
+        return
+    if excess > 0:
+        CACHE_EVICTIONS.inc(expired, reason="expired")
+        CACHE_EVICTIONS.inc(evicted, reason="size")
+
+
+def invalidate(namespace, key: str) -> None:
+    """Remove a cached value, e.g. after it was changed."""
+    try:
+        store.execute(
+            "DELETE FROM cache_entries WHERE namespace = ? AND key = ?",
+            (str(namespace), str(key)),
+        )
+    except sqlite3.Error as err:
+        logger.warning(f"Unable to update the cache: {err}")
@@ -1,7 +1,9 @@
 from konnector.konnector import Task, Platform
+from konnector import cache, limiter, metrics
 
 import os
 import hmac
+import types
 import logging
 import datetime
 from dateutil import tz
@@ -20,6 +22,11 @@ class Clickup(Platform):
     apiUrl = "https://api.clickup.com/api/v2"
     webhookEvents = {"taskUpdated": "task_updated"}
     signatureKey = "X-Signature"
+    # The user ID's key, "id", is used throughout Clickup webhooks so isn't prefiltered
+    webhookEventKey = "event"
+    webhookListKey = "parent_id"
+    # Tasks in each page of a list
+    pageSize = 100
     propertyMappings = {
         "name": "name",
         "description": "description",
@@ -43,6 +50,7 @@ class Clickup(Platform):
         newTaskLists: list = None,
         folder: str = None,
         listStatuses: dict = None,
+        apiUrl: str = None,
     ):
         super().__init__(
             appEndpoint,
@@ -53,6 +61,7 @@ class Clickup(Platform):
             secret,
             userIds,
             newTaskLists,
+            apiUrl,
         )
 
         # Defaults
@@ -61,13 +70,15 @@ class Clickup(Platform):
         if folder is not None:
             self.folder = folder
         if listStatuses is not None:
-            self.listStatuses = listStatuses
+            self.listStatuses = types.MappingProxyType(dict(listStatuses))
 
         self.workspace = workspace
-        self.headers = {
-            "Authorization": accessToken,
-            "Content-Type": "application/json",
-        }
+        self.headers = types.MappingProxyType(
+            {
+                "Authorization": accessToken,
+                "Content-Type": "application/json",
+            }
+        )
 
     def _digest_hmac(self, hmac: hmac.HMAC):
         return hmac.hexdigest()
@@ -87,7 +98,17 @@ class Clickup(Platform):
 
     def _get_task_from_webhook(self, data):
         taskId = data["task_id"]
-        return self._get_task_data(taskId=taskId)
+        # The task has changed, so it isn't taken from the cache
+        return self._get_task_data(taskId=taskId, cached=False)
+
+    def warm_up(self) -> None:
+        # Time zones are read from disk and cached on first use
+        tz.gettz("UTC")
+        tz.gettz(TIMEZONE)
+
+    def _get_version_from_webhook(self, data):
+        dates = [int(item["date"]) for item in data.get("history_items", [])]
+        return (str(data["task_id"]), max(dates)) if dates else None
 
     def _get_id_from_task(self, data):
         return str(data["id"])
@@ -102,7 +123,27 @@ class Clickup(Platform):
         return f"/task/{params['taskId']}", "GET", {}
 
     def _get_url_get_tasks(self, params):
-        return f"/list/{params['listId']}/task", "GET", {}
+        # Listname required for clickup
+        if "listId" not in params:
+            raise Exception("A list name is required to get tasks from Clickup")
+        # Subtasks are included unless filtered out, so that the mirror has the whole
+        # hierarchy of a list
+        outParams = {"page": params["page"], "subtasks": "true"}
+        for name, value in params["filters"].items():
+            if name == "statuses":
+                outParams["statuses[]"] = list(value)
+            elif name in ("include_closed", "subtasks"):
+                outParams[name] = "true" if value else "false"
+            elif name == "date_updated_gt":
+                # Datetimes or ms since the epoch
+                if isinstance(value, datetime.datetime):
+                    value = value.timestamp() * 1000
+                outParams[name] = int(value)
+            else:
+                raise Exception(
+                    f"Unsupported filter for getting tasks from {self}: {name}"
+                )
+        return f"/list/{params['listId']}/task", "GET", outParams
 
     def _get_url_create_task(self, params):
         # listId is given in task data object
@@ -120,11 +161,17 @@ class Clickup(Platform):
     def _get_result_get_tasks(self, response):
         return super()._get_result_get_tasks(response)["tasks"]
 
+    def _get_next_page_get_tasks(self, params: dict, response) -> dict:
+        tasks = response["tasks"]
+        if not tasks or response.get("last_page", len(tasks) < self.pageSize):
+            return None
+        return {**params, "page": params["page"] + 1}
+
     def _convert_task_to_platform(self, task: Task) -> dict:
         platformProps = super()._convert_task_to_platform(task)
 
         logger.info(f"task object converted to {self} parameters")
-        logger.debug(f"Converted task: {platformProps}")
+        logger.debug("Converted task: %s", platformProps)
         return platformProps
 
     def _convert_task_from_platform(self, platformProps, new: bool = None) -> Task:
@@ -157,13 +204,11 @@ class Clickup(Platform):
             ids=task.get_all_ids(),
         )
         convertedTask.status = platformProps["status"]["status"]
+        convertedTask.parentId = platformProps["parent"]
         convertedTask.subTask = False if platformProps["parent"] is None else True
 
-        # if "parent" in platformProps and platformProps["parent"] is not None:
-        #     task.parentTask = platformProps["parent"]
-
         logger.info(f"{self} task converted to task object")
-        logger.debug(f"Converted task: {repr(convertedTask)}")
+        logger.debug("Converted task: %r", convertedTask)
         return convertedTask
 
     def check_request(self, request):
@@ -174,16 +219,10 @@ class Clickup(Platform):
                 and historyItem["after"]["status"] == "complete"
             ):
                 event = "task_complete"
+                metrics.set_webhook_event(event)
                 break
         return event, listName, normalizedTask, data
 
-    def get_tasks(self, listName: str) -> list[Task]:
-        # Listname required for clickup
-        if listName is None:
-            raise Exception("A list name is required to get tasks from Clickup")
-        tasks = super().get_tasks(listName)
-        return tasks
-
     def update_custom_fields(self, task: Task, taskDiffs: dict = None) -> bool:
         """
         Update the custom fields of an existing Clickup task
@@ -204,12 +243,12 @@ class Clickup(Platform):
             taskDiffs if taskDiffs is not None else self.compare_tasks(task)
         )
 
-        if "custom_fields" not in taskDiffs:
-            raise Exception(f"No custom fields found in: {taskDiffs}")
+        if "custom_fields" not in platformTaskUpdate:
+            raise Exception(f"No custom fields found in: {platformTaskUpdate}")
 
         taskId = task.get_id(self)
 
-        for customField in taskDiffs["custom_fields"]:
+        def update_custom_field(customField: dict):
             try:
                 self._send_request(
                     f"/task/{taskId}/field/{customField['id']}",
@@ -223,16 +262,33 @@ class Clickup(Platform):
                     f" {err}"
                 )
 
+        # Each field has its own endpoint, so fields are updated concurrently
+        try:
+            limiter.fan_out(update_custom_field, platformTaskUpdate["custom_fields"])
+        finally:
+            cache.invalidate(self, taskId)
+
         logger.debug(f"Updated custom fields on {self} task: {repr(task)}")
 
         return True
 
-    def update_task(self, task: Task, propertyDiffs: dict = None) -> bool:
+    def update_task(
+        self, task: Task, propertyDiffs: dict = None, taskDiffs: dict = None
+    ) -> bool:
         # Clickup requires custom field updates to use a different endpoint
-        taskDiffs = self.compare_tasks(task, propertyDiffs)
-        taskUpdate = super().update_task(task, taskDiffs=taskDiffs)
-        if "custom_fields" in taskDiffs:
-            return self.update_custom_fields(task, taskDiffs=taskDiffs) and taskUpdate
+        if taskDiffs is None:
+            taskDiffs = self.compare_tasks(task, propertyDiffs)
+        taskDiffs = dict(taskDiffs)
+        customFields = taskDiffs.pop("custom_fields", None)
+        # The task itself is only updated if more than its custom fields changed
+        taskUpdate = (
+            super().update_task(task, taskDiffs=taskDiffs) if taskDiffs else True
+        )
+        if customFields:
+            return (
+                self.update_custom_fields(task, {"custom_fields": customFields})
+                and taskUpdate
+            )
         else:
             return taskUpdate
 
@@ -0,0 +1,502 @@
+"""
+Fake Todoist and Clickup APIs implementing the endpoints used by Konnector.
+
+The fakes can be served on localhost and selected by setting a platform's apiUrl
+(TODOIST_API_URL & CLICKUP_API_URL in main), for offline testing and benchmarking.
+Latency, errors and rate limiting can be injected, and signed webhooks can be built
+for tasks stored in the fakes.
+
+Usage: python -m konnector.fake_api --latency 0.05 --error-rate 0.01
+"""
+from flask import Flask, request, jsonify, abort, make_response, g
+from werkzeug.serving import make_server
+import argparse
+import base64
+import collections
+import hashlib
+import hmac
+import itertools
+import json
+import random
+import threading
+import time
+
+# Base paths of the APIs, matching the real platforms' API URLs.
+API_PATHS = {"todoist": "/rest/v2", "clickup": "/api/v2"}
+# Tasks in each page of a Clickup list
+CLICKUP_PAGE_SIZE = 100
+
+
+def sign_todoist(secret: str, body: bytes) -> str:
+    return base64.b64encode(
+        hmac.new(secret.encode(), body, hashlib.sha256).digest()
+    ).decode()
+
+
+def sign_clickup(secret: str, body: bytes) -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+
+class FakeApi:
+    """
+    In-memory task storage and a log of the requests received by the fake APIs.
+
+    ...
+
+    Attributes
+    ----------
+    todoistTasks : dict
+        Todoist tasks in REST API notation, indexed by ID.
+    clickupTasks : dict
+        Clickup tasks in API notation, indexed by ID.
+    clickupWebhooks : dict
+        Clickup webhooks, indexed by ID.
+    requests : list
+        (platform name, HTTP method, path) of each request received.
+    latency : float
+        Seconds to wait before responding to each request.
+    errorRate : float
+        The probability (0-1) of a request failing with errorStatus.
+    errorStatus : int
+        The HTTP status code of injected errors.
+    rateLimit : int
+        The number of requests allowed per platform in each rateLimitWindow.
+    rateLimitWindow : float
+        The length of the rate limit window, in seconds.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        errorRate: float = 0.0,
+        errorStatus: int = 500,
+        rateLimit: int = 100,
+        rateLimitWindow: float = 60.0,
+        seed: int = None,
+    ):
+        self.todoistTasks = {}
+        self.clickupTasks = {}
+        self.clickupWebhooks = {}
+        self.requests = []
+        self.latency = latency
+        self.errorRate = errorRate
+        self.errorStatus = errorStatus
+        self.rateLimit = rateLimit
+        self.rateLimitWindow = rateLimitWindow
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1000)
+        self._random = random.Random(seed)
+        self._requestTimes = collections.defaultdict(collections.deque)
+        self.apps = {
+            "todoist": create_todoist_app(self),
+            "clickup": create_clickup_app(self),
+        }
+
+    def reset(self) -> None:
+        """Remove all stored tasks and logged requests."""
+        with self.lock:
+            self.todoistTasks.clear()
+            self.clickupTasks.clear()
+            self.clickupWebhooks.clear()
+            self.requests.clear()
+            self._requestTimes.clear()
+
+    def new_id(self) -> str:
+        return str(next(self._ids))
+
+    def add_todoist_task(self, projectId: str, **props) -> dict:
+        task = {
+            "id": self.new_id(),
+            "content": "A task",
+            "description": "",
+            "priority": 1,
+            "due": None,
+            "project_id": str(projectId),
+            "is_completed": False,
+            "updated_at": _todoist_time(),
+            **props,
+        }
+        self.todoistTasks[task["id"]] = task
+        return task
+
+    def add_clickup_task(self, listId: str, **props) -> dict:
+        task = {
+            "id": self.new_id(),
+            "name": "A task",
+            "description": "",
+            "status": {"status": "to do"},
+            "priority": None,
+            "due_date": None,
+            "due_date_time": False,
+            "parent": None,
+            "custom_fields": [],
+            "list": {"id": str(listId)},
+            "date_updated": _clickup_time(),
+            **props,
+        }
+        self.clickupTasks[task["id"]] = task
+        return task
+
+    def todoist_webhook(
+        self, secret: str, eventName: str, taskId: str, userId: str
+    ) -> tuple[bytes, dict]:
+        """
+        Build a signed Todoist webhook for a stored task.
+
+        Returns:
+            The request body and headers
+        """
+        task = self.todoistTasks[taskId]
+        body = json.dumps(
+            {
+                "event_name": eventName,
+                "user_id": str(userId),
+                # Webhooks use the Sync API notation
+                "event_data": {**task, "checked": task["is_completed"]},
+            }
+        ).encode()
+        headers = {
+            "User-Agent": "Todoist-Webhooks",
+            "Content-Type": "application/json",
+            "X-Todoist-Hmac-SHA256": sign_todoist(secret, body),
+        }
+        return body, headers
+
+    def clickup_webhook(
+        self, secret: str, taskId: str, userId: str, field: str = "name"
+    ) -> tuple[bytes, dict]:
+        """
+        Build a signed Clickup taskUpdated webhook for a stored task.
+
+        Returns:
+            The request body and headers
+        """
+        task = self.clickupTasks[taskId]
+        body = json.dumps(
+            {
+                "event": "taskUpdated",
+                "task_id": taskId,
+                "history_items": [
+                    {
+                        "date": task["date_updated"],
+                        "user": {"id": int(userId)},
+                        "parent_id": task["list"]["id"],
+                        "field": field,
+                        "after": task["status"] if field == "status" else None,
+                    }
+                ],
+            }
+        ).encode()
+        headers = {
+            "Content-Type": "application/json",
+            "X-Signature": sign_clickup(secret, body),
+        }
+        return body, headers
+
+    def _check_request(self, platformName: str):
+        """Log, delay, rate limit and inject errors into a received request."""
+        self.requests.append((platformName, request.method, request.path))
+        if self.latency:
+            time.sleep(self.latency)
+
+        now = time.time()
+        with self.lock:
+            requestTimes = self._requestTimes[platformName]
+            while requestTimes and requestTimes[0] <= now - self.rateLimitWindow:
+                requestTimes.popleft()
+            limited = len(requestTimes) >= self.rateLimit
+            if not limited:
+                requestTimes.append(now)
+            g.rateLimitRemaining = self.rateLimit - len(requestTimes)
+            g.rateLimitReset = (
+                requestTimes[0] if requestTimes else now
+            ) + self.rateLimitWindow
+            failed = self._random.random() < self.errorRate
+
+        if limited:
+            abort(429)
+        if failed:
+            abort(self.errorStatus)
+
+    def _add_rate_limit_headers(self, response):
+        if "rateLimitRemaining" in g:
+            response.headers["X-RateLimit-Limit"] = str(self.rateLimit)
+            response.headers["X-RateLimit-Remaining"] = str(g.rateLimitRemaining)
+            response.headers["X-RateLimit-Reset"] = str(int(g.rateLimitReset))
+        return response
+
+
+def _todoist_time() -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S.000000Z", time.gmtime())
+
+
+def _clickup_time() -> str:
+    return str(int(time.time() * 1000))
+
+
+def _create_app(api: FakeApi, platformName: str) -> Flask:
+    app = Flask(f"fake_{platformName}")
+
+    @app.before_request
+    def check_request():
+        api._check_request(platformName)
+
+    app.after_request(api._add_rate_limit_headers)
+    return app
+
+
+def _no_content():
+    response = make_response("", 204)
+    # The platforms don't send a content type with empty responses
+    del response.headers["Content-Type"]
+    return response
+
+
+def _set_todoist_due(task: dict, body: dict):
+    if "due_datetime" in body:
+        task["due"] = {
+            "date": body["due_datetime"][:10],
+            "datetime": body["due_datetime"],
+        }
+    elif "due_date" in body:
+        task["due"] = {"date": body["due_date"], "datetime": None}
+
+
+def create_todoist_app(api: FakeApi) -> Flask:
+    app = _create_app(api, "todoist")
+    path = API_PATHS["todoist"]
+    props = ("content", "description", "priority", "project_id")
+
+    def find(taskId):
+        if taskId not in api.todoistTasks:
+            abort(404)
+        return api.todoistTasks[taskId]
+
+    @app.route(f"{path}/tasks", methods=["GET"])
+    def get_tasks():
+        projectId = request.args.get("project_id")
+        return jsonify(
+            [
+                task
+                for task in list(api.todoistTasks.values())
+                if not task["is_completed"]
+                and (projectId is None or task["project_id"] == projectId)
+            ]
+        )
+
+    @app.route(f"{path}/tasks", methods=["POST"])
+    def create_task():
+        body = request.get_json()
+        task = api.add_todoist_task(
+            body["project_id"], **{k: body[k] for k in props if k in body}
+        )
+        _set_todoist_due(task, body)
+        return jsonify(task)
+
+    @app.route(f"{path}/tasks/<taskId>", methods=["GET"])
+    def get_task(taskId):
+        return jsonify(find(taskId))
+
+    @app.route(f"{path}/tasks/<taskId>", methods=["POST"])
+    def update_task(taskId):
+        task = find(taskId)
+        body = request.get_json()
+        task.update({k: body[k] for k in props if k in body})
+        _set_todoist_due(task, body)
+        task["updated_at"] = _todoist_time()
+        return jsonify(task)
+
+    @app.route(f"{path}/tasks/<taskId>/close", methods=["POST"])
+    def close_task(taskId):
+        find(taskId)["is_completed"] = True
+        return _no_content()
+
+    @app.route(f"{path}/tasks/<taskId>", methods=["DELETE"])
+    def delete_task(taskId):
+        find(taskId)
+        api.todoistTasks.pop(taskId, None)
+        return _no_content()
+
+    return app
+
+
+def create_clickup_app(api: FakeApi) -> Flask:
+    app = _create_app(api, "clickup")
+    path = API_PATHS["clickup"]
+    props = ("name", "description", "due_date", "due_date_time", "parent")
+
+    def find(taskId):
+        if taskId not in api.clickupTasks:
+            abort(404)
+        return api.clickupTasks[taskId]
+
+    def update(task: dict, body: dict):
+        task.update({k: body[k] for k in props if k in body})
+        if body.get("priority") is not None:
+            task["priority"] = {"id": str(body["priority"])}
+        if "status" in body:
+            task["status"] = {"status": body["status"]}
+        for customField in body.get("custom_fields", []):
+            set_field(task, customField["id"], customField["value"])
+        task["date_updated"] = _clickup_time()
+
+    def set_field(task: dict, fieldId: str, value):
+        task["custom_fields"] = [
+            field for field in task["custom_fields"] if field["id"] != fieldId
+        ] + [{"id": fieldId, "value": value}]
+
+    def matches(task: dict, args) -> bool:
+        statuses = args.getlist("statuses[]")
+        if statuses and task["status"]["status"] not in statuses:
+            return False
+        if args.get("include_closed") == "false" and task["status"].get("type") in (
+            "closed",
+            "done",
+        ):
+            return False
+        if args.get("subtasks") == "false" and task["parent"] is not None:
+            return False
+        updatedAfter = args.get("date_updated_gt")
+        if updatedAfter is not None and int(task["date_updated"]) <= int(updatedAfter):
+            return False
+        return True
+
+    @app.route(f"{path}/list/<listId>/task", methods=["GET"])
+    def get_tasks(listId):
+        # Pages of 100 tasks, like Clickup
+        page = int(request.args.get("page", 0))
+        tasks = [
+            task
+            for task in list(api.clickupTasks.values())
+            if task["list"]["id"] == listId and matches(task, request.args)
+        ]
+        pageTasks = tasks[page * CLICKUP_PAGE_SIZE : (page + 1) * CLICKUP_PAGE_SIZE]
+        return jsonify(
+            {
+                "tasks": pageTasks,
+                "last_page": (page + 1) * CLICKUP_PAGE_SIZE >= len(tasks),
+            }
+        )
+
+    @app.route(f"{path}/list/<listId>/task", methods=["POST"])
+    def create_task(listId):
+        task = api.add_clickup_task(listId)
+        update(task, request.get_json())
+        return jsonify(task)
+
+    @app.route(f"{path}/task/<taskId>", methods=["GET"])
+    def get_task(taskId):
+        return jsonify(find(taskId))
+
+    @app.route(f"{path}/task/<taskId>", methods=["PUT"])
+    def update_task(taskId):
+        task = find(taskId)
+        update(task, request.get_json(silent=True) or {})
+        return jsonify(task)
+
+    @app.route(f"{path}/task/<taskId>/field/<fieldId>", methods=["POST"])
+    def set_custom_field(taskId, fieldId):
+        task = find(taskId)
+        set_field(task, fieldId, request.get_json()["value"])
+        task["date_updated"] = _clickup_time()
+        return jsonify({})
+
+    @app.route(f"{path}/task/<taskId>", methods=["DELETE"])
+    def delete_task(taskId):
+        find(taskId)
+        api.clickupTasks.pop(taskId, None)
+        return _no_content()
+
+    @app.route(f"{path}/team/<teamId>/webhook", methods=["GET"])
+    def get_webhooks(teamId):
+        return jsonify({"webhooks": list(api.clickupWebhooks.values())})
+
+    @app.route(f"{path}/team/<teamId>/webhook", methods=["POST"])
+    def create_webhook(teamId):
+        webhook = {"id": api.new_id(), "status": "active", **request.get_json()}
+        api.clickupWebhooks[webhook["id"]] = webhook
+        return jsonify({"id": webhook["id"], "webhook": webhook})
+
+    @app.route(f"{path}/webhook/<webhookId>", methods=["PUT"])
+    def update_webhook(webhookId):
+        if webhookId not in api.clickupWebhooks:
+            abort(404)
+        api.clickupWebhooks[webhookId].update(request.get_json())
+        return jsonify({"id": webhookId, "webhook": api.clickupWebhooks[webhookId]})
+
+    @app.route(f"{path}/webhook/<webhookId>", methods=["DELETE"])
+    def delete_webhook(webhookId):
+        api.clickupWebhooks.pop(webhookId, None)
+        return jsonify({})
+
+    return app
+
+
+class FakeApiServer:
+    """
+    Serves the fake APIs on localhost, each platform on its own port, from a
+    background thread.
+    """
+
+    def __init__(self, api: FakeApi = None, host: str = "127.0.0.1", ports=None):
+        self.api = api if api is not None else FakeApi()
+        self.host = host
+        ports = ports if ports is not None else {}
+        self.servers = {
+            platformName: make_server(
+                host, ports.get(platformName, 0), app, threaded=True
+            )
+            for platformName, app in self.api.apps.items()
+        }
+        self._threads = []
+
+    def url(self, platformName: str) -> str:
+        """The apiUrl that a platform should use to send requests to its fake API"""
+        port = self.servers[platformName].server_port
+        return f"http://{self.host}:{port}{API_PATHS[platformName]}"
+
+    def start(self) -> "FakeApiServer":
+        for server in self.servers.values():
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self) -> None:
+        for server in self.servers.values():
+            server.shutdown()
+            server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve fake Todoist & Clickup APIs")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--todoist-port", type=int, default=8081)
+    parser.add_argument("--clickup-port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=100)
+    args = parser.parse_args()
+
+    server = FakeApiServer(
+        FakeApi(
+            latency=args.latency,
+            errorRate=args.error_rate,
+            rateLimit=args.rate_limit,
+        ),
+        args.host,
+        {"todoist": args.todoist_port, "clickup": args.clickup_port},
+    )
+    print(f"TODOIST_API_URL={server.url('todoist')}")
+    print(f"CLICKUP_API_URL={server.url('clickup')}")
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
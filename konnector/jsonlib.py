@@ -0,0 +1,141 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import json
+import logging
+import os
+from typing import Union
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger("gunicorn.error")
+
+
+class JsonCodec:
+    """
+    Encodes and decodes JSON with the standard library. Output is compact.
+
+    ...
+
+    Attributes
+    ----------
+    name : str
+        What the codec is called, used to choose it with JSON_CODEC.
+    """
+
+    name = "json"
+
+    def loads(self, data: Union[bytes, str]):
+        """Decode a JSON document, e.g. a webhook body or API response."""
+        return json.loads(data)
+
+    def dumps(
+        self, obj, indent: bool = False, sortKeys: bool = False, default=None
+    ) -> bytes:
+        """
+        Encode an object as JSON.
+
+        Arguments:
+            obj: The object to encode.
+            indent: Indent the output by 2 spaces instead of making it compact.
+            sortKeys: Sort dictionary keys.
+            default: Called to convert objects that can't otherwise be encoded.
+        """
+        return json.dumps(
+            obj,
+            indent=2 if indent else None,
+            separators=None if indent else (",", ":"),
+            sort_keys=sortKeys,
+            default=default,
+            # UTF-8 like orjson, rather than escaped
+            ensure_ascii=False,
+        ).encode()
+
+
+class OrjsonCodec(JsonCodec):
+    """
+    Encodes and decodes JSON with orjson, which is several times faster than the
+    standard library. Unlike the standard library, datetimes are written in ISO 8601.
+    """
+
+    name = "orjson"
+
+    def loads(self, data: Union[bytes, str]):
+        return orjson.loads(data)
+
+    def dumps(
+        self, obj, indent: bool = False, sortKeys: bool = False, default=None
+    ) -> bytes:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sortKeys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=default, option=option)
+
+
+def get_codec(name: str = None) -> JsonCodec:
+    """
+    Return a JSON codec.
+
+    Arguments:
+        name: "orjson" or "json". Defaults to orjson if it is installed.
+    """
+    if name is None:
+        name = "orjson" if orjson is not None else "json"
+    if name == "orjson":
+        if orjson is not None:
+            return OrjsonCodec()
+        logger.warning("orjson is not installed. Using the standard library for JSON.")
+    elif name != "json":
+        raise Exception(f"Unknown JSON codec: {name}")
+    return JsonCodec()
+
+
+# Used by platforms and the app unless they are given another codec
+CODEC = get_codec(os.getenv("JSON_CODEC"))
+
+
+class JsonProvider(DefaultJSONProvider):
+    """
+    Flask's JSON provider, using a JSON codec for request bodies and responses.
+    Responses are compact.
+
+    ...
+
+    Attributes
+    ----------
+    codec : JsonCodec
+        Encodes and decodes JSON.
+    """
+
+    compact = True
+
+    def __init__(self, app, codec: JsonCodec = None):
+        super().__init__(app)
+        self.codec = codec if codec is not None else CODEC
+
+    def dumps(self, obj, **kwargs) -> str:
+        if set(kwargs) - {"indent", "separators", "sort_keys"}:
+            # e.g. a custom encoder class
+            return super().dumps(obj, **kwargs)
+        return self.codec.dumps(
+            obj,
+            indent=kwargs.get("indent") is not None,
+            sortKeys=kwargs.get("sort_keys", self.sort_keys),
+            default=self.default,
+        ).decode()
+
+    def loads(self, s: Union[bytes, str], **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return self.codec.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self.codec.dumps(obj, sortKeys=self.sort_keys, default=self.default)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
@@ -2,14 +2,45 @@
 from __future__ import annotations
 import hashlib
 import hmac
+import json
 import logging
+import os
+import re
+import threading
 import time
+import types
 import requests
-from typing import Union
+from typing import Iterator, Union
+
+from konnector import (
+    cache,
+    jsonlib,
+    lanes,
+    limiter,
+    locks,
+    metrics,
+    mirror,
+    oplog,
+    polling,
+    recorder,
+    tracing,
+    versions,
+)
 
 logger = logging.getLogger("gunicorn.error")
 
 
+class WebhookRejected(Exception):
+    """
+    Raised when a webhook is authentic but not for a recognised user, event or list,
+    or fails its signature check. The reason labels konnector_webhooks_rejected_total.
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
 def reverse_lookup(lookupVal, dictionary: dict):
     """Find a dictionary key from its associated value in the dictionary"""
     return next(
@@ -244,6 +275,81 @@ class Task:
         """Return the number of ids with a length > 0"""
         return len([v for v in self.get_all_ids().values() if len(v) > 0])
 
+    def to_dict(self) -> dict:
+        """
+        Convert the task to a dictionary that can be stored as JSON.
+        Platforms are referenced by their names.
+        """
+        return {
+            "properties": dict(self.get_all_properties()),
+            "new": self.new,
+            "lists": {str(k): v for k, v in self.get_all_lists().items()},
+            "completed": {str(k): v for k, v in self.get_all_completed().items()},
+            "ids": {str(k): v for k, v in self.get_all_ids().items()},
+            # Only set on tasks from some platforms
+            "status": getattr(self, "status", None),
+            "subTask": getattr(self, "subTask", None),
+            "parentId": getattr(self, "parentId", None),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, platforms: dict[str, Platform]) -> Task:
+        """
+        Create a task from a dictionary made by to_dict.
+
+        Arguments:
+            data: The dictionary representing the task.
+            platforms: Platform objects indexed by their names. Lists, completed
+                booleans and IDs from platforms that aren't included are dropped.
+        """
+        task = cls(
+            properties=data["properties"],
+            lists={platforms[k]: v for k, v in data["lists"].items() if k in platforms},
+            completed={
+                platforms[k]: v for k, v in data["completed"].items() if k in platforms
+            },
+            ids={platforms[k]: v for k, v in data["ids"].items() if k in platforms},
+        )
+        # Set after creation so that the default priority of new tasks isn't applied
+        task.new = data["new"]
+        if data.get("status") is not None:
+            task.status = data["status"]
+        if data.get("subTask") is not None:
+            task.subTask = data["subTask"]
+            task.parentId = data.get("parentId")
+        return task
+
+
+# A JSON string or number following a key's colon
+_JSON_VALUE = re.compile(rb'\s*:\s*("(?:[^"\\]|\\.)*"|-?\d+)')
+
+
+def find_json_values(body: bytes, key: bytes) -> set[str]:
+    """
+    Find the string or number values of a key anywhere in a JSON document without
+    parsing it.
+
+    Arguments:
+        body: The JSON document.
+        key: The key, including its quotes, e.g. b'"id"'.
+
+    Returns:
+        The values as strings
+    """
+    values = set()
+    position = body.find(key)
+    while position != -1:
+        match = _JSON_VALUE.match(body, position + len(key))
+        if match is not None:
+            value = match.group(1)
+            # Only values with escapes need decoding as JSON
+            if b"\\" in value:
+                values.add(str(json.loads(value)))
+            else:
+                values.add(value.strip(b'"').decode())
+        position = body.find(key, position + len(key))
+    return values
+
 
 class Platform:
     """
@@ -273,6 +379,14 @@ class Platform:
     signatureKey : str =  ""
         A header name that refers to the HMAC signature sent in this platform's
         webhooks.
+    webhookUserAgent : str = None
+        The User-Agent header sent with this platform's webhooks, if it is checked.
+    jsonCodec : jsonlib.JsonCodec
+        Encodes request data and decodes responses from the platform's API.
+    webhookUserKey, webhookEventKey, webhookListKey : str = None
+        The JSON keys of the user ID, event and list ID in this platform's webhook
+        bodies. Webhooks are rejected from these values before they are parsed. A key
+        that is None or can't be found is only checked once the body is parsed.
     headers : dict
         A dictionary of headers that will be sent in all requests to the platform's API.
     authURL : str =  ""
@@ -292,6 +406,11 @@ class Platform:
         "task_updated": "task_updated",
     }
     signatureKey = ""
+    jsonCodec = jsonlib.CODEC
+    webhookUserAgent = None
+    webhookUserKey = None
+    webhookEventKey = None
+    webhookListKey = None
     headers = {}
     propertyMappings = {
         "name": "name",
@@ -312,6 +431,7 @@ class Platform:
         secret: str = None,
         userIds: list = None,
         newTaskLists: list = None,
+        apiUrl: str = None,
     ):
         """
         Parameters
@@ -342,6 +462,8 @@ class Platform:
         newTaskLists : list
             A list of list names. These lists store tasks that are treated by the
             application as new and can be handled in a specific way.
+        apiUrl : str
+            Replaces the platform's default API URL, e.g. to use a fake API.
         """
         # Defaults
         self.accessToken = ""
@@ -349,8 +471,10 @@ class Platform:
         self.secret = ""
         self.userIds = []
         self.newTaskLists = []
-        self.fromPlatformCustomFuncs = []
-        self.toPlatformCustomFuncs = []
+        self.fromPlatformCustomFuncs = ()
+        self.lanes = lanes.LaneScheduler(self)
+        self.limiter = limiter.AimdLimiter(self)
+        self.toPlatformCustomFuncs = ()
 
         if accessToken is not None:
             self.accessToken = accessToken
@@ -362,10 +486,34 @@ class Platform:
             self.userIds = userIds
         if newTaskLists is not None:
             self.newTaskLists = newTaskLists
+        if apiUrl is not None:
+            self.apiUrl = apiUrl
 
-        self.lists = lists
         self.appEndpoint = appEndpoint
         self.platformEndpoint = platformEndpoint
+        # Configuration is read-only so that platforms can be shared between threads
+        self.lists = types.MappingProxyType(dict(lists))
+        self.userIds = tuple(self.userIds)
+        self.newTaskLists = tuple(self.newTaskLists)
+        self._sessions = threading.local()
+        # Copied for each webhook instead of hashing the secret into a new key
+        self._hmacKey = hmac.new(bytes(self.secret, "utf-8"), digestmod=hashlib.sha256)
+        self._webhookFilters = {
+            f'"{key}"'.encode(): (reason, frozenset(allowed), message)
+            for reason, key, allowed, message in (
+                # Most uninteresting webhooks are for other events, so checked first
+                ("event", self.webhookEventKey, self.webhookEvents, "Invalid {} event"),
+                (
+                    "list",
+                    self.webhookListKey,
+                    self.lists.values(),
+                    "Invalid {} list ID",
+                ),
+                ("user", self.webhookUserKey, self.userIds, "Unrecognised {} User"),
+            )
+            if key is not None
+        }
+        mirror.register_platform(self)
 
     def __str__(self) -> str:
         return f"{self.name}"
@@ -396,6 +544,37 @@ class Platform:
         """
         return hmac.digest()
 
+    def sign_webhook(self, body: bytes):
+        """
+        Calculate the signature of a webhook request body using the platform's secret.
+
+        Arguments:
+            body: The raw body of a webhook request.
+
+        Returns:
+            The value of the signatureKey header that the platform would send.
+        """
+        mac = self._hmacKey.copy()
+        mac.update(body)
+        return self._digest_hmac(mac)
+
+    def _prefilter_webhook(self, body: bytes) -> None:
+        """
+        Reject a webhook for an unrecognised user, event or list using only the raw
+        body, before it is parsed or any request is sent. Every value of each of the
+        platform's webhook keys is read, and a webhook is only rejected if none of
+        them are recognised.
+
+        Arguments:
+            body: The raw body of a webhook request.
+        """
+        for key, (reason, allowed, message) in self._webhookFilters.items():
+            values = find_json_values(body, key)
+            if values and values.isdisjoint(allowed):
+                raise WebhookRejected(
+                    reason, f"{message.format(self)}: {', '.join(sorted(values))}"
+                )
+
     def _get_check_user_from_webhook(self, data) -> str:
         """
         Get the user ID (as a string) from received webhook data.
@@ -403,7 +582,7 @@ class Platform:
         """
         userIdStr = str(data)
         if userIdStr not in self.userIds:
-            raise Exception(f"Unrecognised {self} User: {userIdStr}")
+            raise WebhookRejected("user", f"Unrecognised {self} User: {userIdStr}")
         logger.debug(f"{self} user recognised: {userIdStr}")
         return userIdStr
 
@@ -414,7 +593,7 @@ class Platform:
         """
         listIdStr = str(data)
         if listIdStr not in self.lists.values():
-            raise Exception(f"Invalid {self} list ID: {listIdStr}")
+            raise WebhookRejected("list", f"Invalid {self} list ID: {listIdStr}")
         listName = self.get_list_name(listIdStr)
         logger.debug(f"{self} list recognised: {listName}. ID: {listIdStr}")
         return listName, listIdStr
@@ -426,7 +605,7 @@ class Platform:
         """
         platformEvent = data
         if platformEvent not in self.webhookEvents.keys():
-            raise Exception(f"Invalid {self} event: {platformEvent}")
+            raise WebhookRejected("event", f"Invalid {self} event: {platformEvent}")
         eventType = self.webhookEvents[platformEvent]
         logger.debug(
             f"{self} event recognised: {eventType}. {self} notation: {platformEvent}"
@@ -437,6 +616,14 @@ class Platform:
         """Get a dictionary of task properties from a received webhook."""
         return data
 
+    def _get_version_from_webhook(self, data) -> tuple[str, int]:
+        """
+        Get the ID of the task associated with a received webhook and when it was
+        modified, in ms since the epoch, without requests to the platform's API.
+        Returns None if the webhook doesn't include the modification time.
+        """
+        return None
+
     def _get_id_from_task(self, data) -> str:
         """Get the ID of the task associated with a received webhook."""
         return str(data["id"])
@@ -464,12 +651,18 @@ class Platform:
     def _get_url_get_tasks(self, params):
         """
         Return endpoint, HTTP method and parameters for this platform's get_tasks call.
+        Raise an exception if the platform doesn't support any of the filters.
 
-        params: listId
+        params: listId (optional), page, filters
 
         Default HTTP method: GET
         """
-        return "/tasks", "GET", params
+        if params["filters"]:
+            raise Exception(
+                f"Unsupported filters for getting tasks from {self}:"
+                f" {', '.join(params['filters'])}"
+            )
+        return "/tasks", "GET", {k: params[k] for k in params if k == "listId"}
 
     def _get_url_create_task(self, params):
         """
@@ -512,6 +705,36 @@ class Platform:
         """
         return f"/tasks/{str(params['taskId'])}", "DELETE", params
 
+    def _get_request_headers(self) -> dict:
+        """Return the headers for a request to the platform's API."""
+        return self.headers
+
+    def _session(self) -> requests.Session:
+        """
+        Return this thread's HTTP session for the platform's API, creating it if
+        needed. Sessions keep connections to the API open between requests. They are
+        not shared between threads or across fork.
+        """
+        session = getattr(self._sessions, "session", None)
+        if session is None or self._sessions.pid != os.getpid():
+            session = requests.Session()
+            self._sessions.session = session
+            self._sessions.pid = os.getpid()
+        return session
+
+    def warm_up(self) -> None:
+        """
+        Fill caches that converting tasks and webhooks would otherwise fill on first
+        use. A server that preloads the app calls this before forking its workers, so
+        the caches are shared with all of them.
+        """
+        pass
+
+    def after_fork(self) -> None:
+        """Drop HTTP sessions inherited from the parent process after fork."""
+        self._sessions = threading.local()
+
+    @tracing.traced
     def _send_request(
         self,
         url,
@@ -526,30 +749,51 @@ class Platform:
         Returns the request response.
         """
 
-        headers = self.headers
+        headers = self._get_request_headers()
         fullUrl = self.apiUrl + url if useApiUrl is True else url
-        try:
-            if not data:
-                response = requests.request(
-                    reqType, fullUrl, headers=headers, params=params
+        # Requests for webhooks are sent before requests for background jobs, and only
+        # as many requests are in flight as the platform can absorb.
+        with self.lanes.request(), self.limiter.request():
+            start = time.perf_counter()
+            status = "error"  # No response received
+            try:
+                if not data:
+                    response = self._session().request(
+                        reqType, fullUrl, headers=headers, params=params
+                    )
+                else:
+                    response = self._session().request(
+                        reqType,
+                        fullUrl,
+                        headers={"Content-Type": "application/json", **headers},
+                        data=self.jsonCodec.dumps(data),
+                        params=params,
+                    )
+                status = response.status_code
+                metrics.observe_rate_limit(self, response.headers)
+                self.lanes.observe(response.headers)
+
+                # Raise exception if error code returned
+                response.raise_for_status()
+            except requests.exceptions.RequestException as e:
+                logger.error(e)
+                logger.error(
+                    f"request type {reqType}. headers: {headers}. data: {data}"
                 )
-            else:
-                response = requests.request(
-                    reqType, fullUrl, headers=headers, json=data, params=params
-                )
-
-            # Raise exception if error code returned
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            logger.error(e)
-            logger.error(f"request type {reqType}. headers: {headers}. data: {data}")
+                if oplog.is_transient(e):
+                    oplog.mark_unavailable(self)
 
-            raise
+                raise
+            finally:
+                metrics.observe_api_request(
+                    self, reqType, status, time.perf_counter() - start
+                )
+                tracing.set_attributes(method=reqType, url=url, status=status)
         if response.headers.get("Content-Type") is None:
             return
         if "application/json" in response.headers.get("Content-Type"):
-            # logger.debug(f"Request response (JSON): {response.json()}")
-            return response.json()
+            # logger.debug(f"Request response (JSON): {response.content}")
+            return self.jsonCodec.loads(response.content)
         else:
             # logger.debug(f"Request response (text): {response.text}")
             return response.text
@@ -558,6 +802,13 @@ class Platform:
         """Get the list of tasks from a get_tasks API call"""
         return response
 
+    def _get_next_page_get_tasks(self, params: dict, response) -> dict:
+        """
+        Return the parameters for the next page of a get_tasks API call, or None if
+        the response was the last page. By default, all tasks are returned at once.
+        """
+        return None
+
     def _convert_task_to_platform(self, task: Task) -> dict:
         """
         Convert a Task object into a dictionary of task properties to be sent to the
@@ -643,9 +894,10 @@ class Platform:
         Set additional functions that run when
         converting tasks to or from the platform.
         """
-        self.fromPlatformCustomFuncs = fromFuncs
-        self.toPlatformCustomFuncs = toFuncs
+        self.fromPlatformCustomFuncs = tuple(fromFuncs)
+        self.toPlatformCustomFuncs = tuple(toFuncs)
 
+    @tracing.traced
     def check_request(self, request) -> tuple[str, str, Task, any]:
         """
         Test and retrieve the following data received from a webhook:
@@ -664,37 +916,61 @@ class Platform:
             The raw data given in the wehbook request
         """
         logger.info(f"{self} request received. Checking headers.")
-        calcHmac = self._digest_hmac(
-            hmac.new(
-                bytes(self.secret, "utf-8"),
-                msg=request.get_data(),
-                digestmod=hashlib.sha256,
-            )
-        )
-        if request.headers[self.signatureKey] != calcHmac:
-            raise Exception("Bad HMAC")
-        logger.info("Headers check OK.")
-
-        data = request.get_json(force=True)
-        # logger.debug(f"Webhook request data: {data}")
-
-        self._get_check_user_from_webhook(data)
-
-        event, platformEvent = self._get_check_event_from_webhook(data)
+        try:
+            userAgent = request.headers.get("User-Agent")
+            if self.webhookUserAgent is not None and userAgent != self.webhookUserAgent:
+                raise WebhookRejected("user_agent", "Bad user agent")
+            body = request.get_data()
+            signature = request.headers.get(self.signatureKey, "")
+            if not hmac.compare_digest(signature, self.sign_webhook(body)):
+                raise WebhookRejected("signature", "Bad HMAC")
+            logger.info("Headers check OK.")
+            recorder.record_webhook(self, request)
+
+            # Uninteresting webhooks are rejected before the body is parsed
+            self._prefilter_webhook(body)
+            data = request.get_json(force=True)
+            # logger.debug(f"Webhook request data: {data}")
+
+            self._get_check_user_from_webhook(data)
+
+            event, platformEvent = self._get_check_event_from_webhook(data)
+            metrics.set_webhook_event(event)
+            tracing.set_attributes(event=event)
+
+            listName, listId = self._get_check_list_from_webhook(data)
+        except WebhookRejected as e:
+            metrics.WEBHOOKS_REJECTED.inc(platform=self, reason=e.reason)
+            raise
+        polling.record_webhook(self, listName)
 
-        listName, listId = self._get_check_list_from_webhook(data)
+        # Webhooks can arrive out of order. Drop older ones before fetching the task.
+        version = self._get_version_from_webhook(data)
+        if version is not None and not versions.apply(self, *version):
+            metrics.WEBHOOKS_STALE.inc(platform=self, event=event)
+            raise Exception(f"Stale {self} webhook for task {version[0]}")
 
         task = self._get_task_from_webhook(data)
         new = True if event == "new_task" else False
         normalizedTask = self._convert_task_from_platform(task, new)
-        logger.debug(f"Normalized {self} webhook task: {normalizedTask}")
+        logger.debug("Normalized %s webhook task: %s", self, normalizedTask)
+        # The task has changed, so its cached copy is out of date
+        cache.invalidate(self, normalizedTask.get_id(self))
+        if event == "task_removed":
+            mirror.remove(self, normalizedTask.get_id(self))
+        else:
+            mirror.save(self, normalizedTask)
 
         return event, listName, normalizedTask, data
 
-    def _get_task_data(self, task: Task = None, taskId=None) -> dict:
+    def _get_task_data(
+        self, task: Task = None, taskId=None, cached: bool = True
+    ) -> dict:
         """
         Retrieve a dictionary of properties for a task from the platform's API.
         Either a taskId or a task containing an Id can be used to fetch the task.
+        Tasks retrieved by any worker in the last CACHE_TTL seconds are taken from the
+        shared cache, unless cached is False.
         """
         logger.info(
             f"Trying to get task data from {self}: {taskId if task is None else task}"
@@ -709,6 +985,12 @@ class Platform:
                 return None
             taskId = task.get_id(self)
 
+        if cached:
+            retrievedTask = cache.get(self, taskId)
+            if retrievedTask is not None:
+                logger.info(f"{self} task found in cache.")
+                return retrievedTask
+
         url, reqType, params = self._get_url_get_task({"taskId": taskId})
         try:
             retrievedTask = self._send_request(url, reqType, params)
@@ -718,10 +1000,13 @@ class Platform:
             )
 
         logger.info(f"{self} task retrieved.")
+        if cached and retrievedTask is not None:
+            cache.put(self, taskId, retrievedTask)
         # logger.debug(f"Retrieved task dictionary: {retrievedTask}")
 
         return retrievedTask
 
+    @tracing.traced
     def get_task(self, task: Task = None, taskId=None) -> Task:
         """
         Retrieve a specific task from the platform's API and convert to a task object.
@@ -740,17 +1025,68 @@ class Platform:
 
         if retrievedTask is not None:
             outTask = self._convert_task_from_platform(retrievedTask)
+            mirror.save(self, outTask)
         else:
             outTask = None
         return outTask
 
-    def get_tasks(self, listName: str = None) -> list[Task]:
+    def _get_task_pages(self, listName: str, filters: dict) -> Iterator[list[Task]]:
+        """
+        Retrieve tasks from the platform's API a page at a time. The next page is only
+        requested once the previous page has been used.
+
+        Arguments:
+            listName: An optional list that tasks should be taken from
+            filters: Filters that the platform's API applies to the tasks
+
+        Returns:
+            An iterator of lists of (Task) objects
+        """
+        isNew = (listName in self.newTaskLists) if listName is not None else None
+        params = {"page": 0, "filters": filters}
+        if listName is not None:
+            params["listId"] = self.lists[listName]
+        while params is not None:
+            url, reqType, reqParams = self._get_url_get_tasks(params)
+            try:
+                response = self._send_request(url, reqType, reqParams)
+            except requests.exceptions.RequestException as err:
+                raise Exception(f"Error getting tasks from {self}: {err}")
+            yield [
+                self._convert_task_from_platform(retrievedTask, isNew)
+                for retrievedTask in self._get_result_get_tasks(response)
+            ]
+            params = self._get_next_page_get_tasks(params, response)
+
+    def iter_tasks(self, listName: str = None, **filters) -> Iterator[Task]:
+        """
+        Retrieve tasks from the platform's API as they are needed, rather than all at
+        once. Only a page of tasks is held at a time, so large lists use little memory.
+        Tasks are saved to the mirror a page at a time.
+
+        Arguments:
+            listName: An optional list that tasks should be taken from
+            filters: Filters that the platform's API applies to the tasks. Clickup
+                supports statuses, include_closed, subtasks and date_updated_gt.
+
+        Returns:
+            An iterator of (Task) objects
+        """
+        logger.info(f"Trying to iterate tasks from {self} in list {listName}")
+        for pageTasks in self._get_task_pages(listName, filters):
+            mirror.save_many(self, pageTasks)
+            yield from pageTasks
+
+    @tracing.traced
+    def get_tasks(self, listName: str = None, **filters) -> list[Task]:
         """
         Retrieve a list of tasks from the platform's API.
         If no list name is provided, all tasks will be requested.
 
         Arguments:
             listName: an optional list that tasks should be taken from
+            filters: Filters that the platform's API applies to the tasks, as for
+                iter_tasks
 
         Returns:
             A list of (Task) objects
@@ -758,27 +1094,20 @@ class Platform:
 
         logger.info(f"Trying to get tasks from {self} in list {listName}")
 
-        params = {"listId": self.lists[listName]} if listName is not None else None
-        url, reqType, params = self._get_url_get_tasks(params)
-        try:
-            retrievedTasks = self._get_result_get_tasks(
-                self._send_request(url, reqType, params)
-            )
-        except requests.exceptions.RequestException as err:
-            raise Exception(f"Error getting tasks from {self}: {err}")
-
-        normalizedTasks = []
-        for retrievedTask in retrievedTasks:
-            if listName is not None:
-                isNew = True if listName in self.newTaskLists else False
-            else:
-                isNew = None
-            normalizedTask = self._convert_task_from_platform(retrievedTask, isNew)
-            normalizedTasks.append(normalizedTask)
+        normalizedTasks = [
+            task
+            for pageTasks in self._get_task_pages(listName, filters)
+            for task in pageTasks
+        ]
         logger.info(f"{self} tasks retrieved.")
-        # logger.debug(f"Retrieved tasks: {normalizedTasks}")
+        if filters:
+            # Tasks that were filtered out are still there
+            mirror.save_many(self, normalizedTasks)
+        else:
+            mirror.save_all(self, normalizedTasks, listName)
         return normalizedTasks
 
+    @tracing.traced
     def create_task(self, task: Task, listName: str) -> Task:
         """
         Create a new task on the platform's API from a task object.
@@ -811,9 +1140,11 @@ class Platform:
         # logger.debug(f"Created task response: {response}")
 
         newTask = self._convert_task_from_platform(response)
+        mirror.save(self, newTask)
 
         return newTask
 
+    @tracing.traced
     def compare_tasks(self, task: Task, propertyDiffs: dict = None) -> dict:
         retrievedTask = self.get_task(task)
         logger.info(f"Comparing {self} tasks")
@@ -831,8 +1162,19 @@ class Platform:
         taskUpdate = Task(properties=propertyDiffs, ids=task.get_all_ids())
         logger.debug(repr(taskUpdate))
 
-        return self._convert_task_to_platform(taskUpdate)
+        # Properties that hold IDs, e.g. Clickup's custom fields, aren't sent if the
+        # platform already has them
+        retrievedIds = self._convert_task_to_platform(
+            Task(ids=retrievedTask.get_all_ids())
+        )
+        platformUpdate = self._convert_task_to_platform(taskUpdate)
+        return {
+            propName: propValue
+            for propName, propValue in platformUpdate.items()
+            if propName not in retrievedIds or retrievedIds[propName] != propValue
+        }
 
+    @tracing.traced
     def update_task(
         self, task: Task, propertyDiffs: dict = None, taskDiffs: dict = None
     ) -> bool:
@@ -869,12 +1211,17 @@ class Platform:
             raise Exception(
                 f"Error updating {self} task with details: {platformTaskUpdate}: {err}"
             )
+        finally:
+            # After the write, so that a copy cached by another worker while it was
+            # being sent is removed too
+            cache.invalidate(self, taskId)
 
         logger.info(f"{self} task updated.")
         logger.debug(f"Updated task: {repr(task)}")
 
         return True
 
+    @tracing.traced
     def complete_task(self, task: Task) -> bool:
         """
         Mark an existing task as complete on the platform's API.
@@ -899,12 +1246,16 @@ class Platform:
             self._send_request(url, reqType, params)
         except requests.exceptions.RequestException as err:
             raise Exception(f"Error completing {self} task: {err}")
+        finally:
+            cache.invalidate(self, taskId)
 
         logger.info(f"{self} task completed.")
         logger.debug(f"Completed task: {task}")
+        mirror.set_completed(self, taskId)
 
         return True
 
+    @tracing.traced
     def delete_task(self, task: Task) -> bool:
         """
         Delete a task on the platform's API.
@@ -929,12 +1280,16 @@ class Platform:
             self._send_request(url, reqType, params)
         except requests.exceptions.RequestException as err:
             raise Exception(f"Error deleting {self} task: {err}")
+        finally:
+            cache.invalidate(self, taskId)
 
         logger.info(f"{self} task deleted.")
         logger.debug(f"Deleted task: {task}")
+        mirror.remove(self, taskId)
 
         return True
 
+    @tracing.traced
     def check_if_task_exists(
         self, task: Task, listName: str = None, returnTask: bool = False
     ) -> Union[bool, Task]:
@@ -971,7 +1326,9 @@ class Platform:
     def add_id(self, task: Task, platform: Platform, id: str):
         logger.info(f"Adding {platform} id to {self}")
         task.add_id(platform, id)
-        return self.update_task(task)
+        # Only the IDs are written, so the task isn't compared with the platform's
+        taskDiffs = self._convert_task_to_platform(Task(ids=task.get_all_ids()))
+        return self.update_task(task, taskDiffs=taskDiffs)
 
     def auth_init(self, request):
         return "<a href='" + self.authURL + "'>Click to authorize</a>"
@@ -1000,8 +1357,42 @@ class Platform:
         )
 
 
+def index_tasks(tasks) -> dict[tuple[str, str], Task]:
+    """Index tasks by each of their platform IDs, e.g. {("todoist", "123"): task}."""
+    return {
+        (str(platform), platformId): task
+        for task in tasks
+        for platform, platformId in task.get_all_ids().items()
+    }
+
+
+def _find_existing_task(
+    task: Task,
+    outPlatform: Platform,
+    outList: str,
+    snapshots: dict[Platform, dict],
+) -> Union[bool, Task]:
+    """
+    Find a task on a platform by any of its IDs, using a snapshot of the list if one
+    was taken. Tasks created since the snapshot are found in the mirror.
+    """
+    if outPlatform not in snapshots:
+        return outPlatform.check_if_task_exists(task, outList, returnTask=True)
+    for platform, platformId in task.get_all_ids().items():
+        foundTask = snapshots[outPlatform].get((str(platform), platformId))
+        if foundTask is not None:
+            return foundTask
+    foundTasks = mirror.find(outPlatform, outList, ids=task.get_all_ids())
+    return foundTasks[0] if foundTasks else False
+
+
+@tracing.traced
+@metrics.counted
 def move_task(
-    task: Task, outLists: dict[Platform, str], deleteTask: bool = False
+    task: Task,
+    outLists: dict[Platform, str],
+    deleteTask: bool = False,
+    snapshots: dict[Platform, dict] = None,
 ) -> Task:
     """
     Move or copy a task from a list on one platform to a list on another.
@@ -1011,54 +1402,130 @@ def move_task(
         outLists: A dictionary of lists for the task to be moved to. An object
             representing the platform is used as the key.
         deleteTask: If the task should be moved rather than copied.
+        snapshots: Tasks already retrieved from the out lists, indexed by platform
+            and then by index_tasks. Out lists without a snapshot are retrieved to
+            check whether the task is already there.
 
     Returns:
         The original task with the new platform IDs and lists added.
 
     """
+    if snapshots is None:
+        snapshots = {}
+
+    with locks.lock_task(task) as waited:
+        if waited and deleteTask is True:
+            # Another webhook or scheduled job may have moved the task while waiting
+            for inPlatform, inList in task.get_all_lists().items():
+                if inPlatform not in outLists and not inPlatform.check_if_task_exists(
+                    task, inList
+                ):
+                    logger.info(f"Task has already been moved from {inPlatform}.")
+                    return task
+
+        inLists = ""
+        for inPlatform, inList in task.get_all_lists().items():
+            inLists += f"\n{inPlatform}: {inList}"
+
+        taskLists = task.get_all_lists() if deleteTask is False else {}
+        # Keep the ID of the old list so it can still be found if a webhook comes in
+        # late.
+        taskIds = task.get_all_ids()
+        mergedTask = Task(
+            properties=task.get_all_properties(),
+            lists=taskLists,
+            completed=task.get_all_completed(),
+            new=False,
+            ids=taskIds,
+        )
 
-    inLists = ""
-    for inPlatform, inList in task.get_all_lists().items():
-        inLists += f"\n{inPlatform}: {inList}"
-
-    taskLists = task.get_all_lists() if deleteTask is False else {}
-    # Keep the ID of the old list so it can still be found if a webhook comes in late.
-    taskIds = task.get_all_ids()
-    mergedTask = Task(
-        properties=task.get_all_properties(),
-        lists=taskLists,
-        completed=task.get_all_completed(),
-        new=False,
-        ids=taskIds,
-    )
+        queued = False
+        for outPlatform, outList in outLists.items():
+            # Check if any IDs already exist on the platform. If the platform is
+            # unavailable, this is checked when the queued create is sent.
+            foundTask = False
+            if oplog.is_available(outPlatform):
+                try:
+                    foundTask = _find_existing_task(
+                        task, outPlatform, outList, snapshots
+                    )
+                except Exception as e:
+                    # The platform has just become unavailable, so the create is
+                    # queued
+                    if not oplog.is_transient(e):
+                        raise
+                    logger.warning(f"Unable to check for task on {outPlatform}: {e}")
+            if foundTask is not False:
+                logger.warning(
+                    f"Cannot move task. Task already exists in {outPlatform}. Updating"
+                    " task instead."
+                )
+                mergedTask.add_list(outPlatform, outList)
+                mergedTask.add_id(outPlatform, foundTask.get_id(outPlatform))
+                oplog.write(outPlatform, "update", mergedTask)
+                continue
+            outTask = oplog.write(outPlatform, "create", mergedTask, outList)
 
-    for outPlatform, outList in outLists.items():
-        # Check if any IDs already exist on the platform
-        foundTask = outPlatform.check_if_task_exists(task, outList, returnTask=True)
-        if foundTask is not False:
-            logger.warning(
-                f"Cannot move task. Task already exists in {outPlatform}. Updating task"
-                " instead."
-            )
             mergedTask.add_list(outPlatform, outList)
-            mergedTask.add_id(outPlatform, foundTask.get_id(outPlatform))
-            outPlatform.update_task(mergedTask)
-            continue
-        outTask = outPlatform.create_task(mergedTask, outList)
-
-        mergedTask.add_list(outPlatform, outList)
-        mergedTask.add_id(outPlatform, outTask.get_id(outPlatform))
-
-        logger.info(f"Successfully added new task to {outPlatform}.")
+            if outTask is None:
+                logger.info(f"Queued new task for {outPlatform}.")
+                queued = True
+                continue
+            mergedTask.add_id(outPlatform, outTask.get_id(outPlatform))
+
+            logger.info(f"Successfully added new task to {outPlatform}.")
+
+        if queued and deleteTask is True:
+            # The task stays where it is until it has been created, in case the
+            # queued create is never sent. It is deleted when moved again, as it is
+            # then found on the out platform.
+            logger.info("Task not deleted as its move was queued.")
+            for inPlatform, inList in task.get_all_lists().items():
+                mergedTask.add_list(inPlatform, inList)
+            return mergedTask
+        for inplatform in task.get_all_ids():
+            if deleteTask is True:
+                # TODO Possibly add option to remove task, without completing?
+                oplog.write(inplatform, "delete", task)
+
+        return mergedTask
+
+
+@tracing.traced
+def move_tasks(
+    tasks: list[Task], outLists: dict[Platform, str], deleteTask: bool = False
+) -> list[Task]:
+    """
+    Move or copy many tasks, e.g. a backlog in an inbox. Each out list is retrieved
+    once, rather than once per task, and the tasks are moved concurrently as fast as
+    the platforms allow. Sources are deleted as each task is moved.
 
-    for inplatform in task.get_all_ids():
-        if deleteTask is True:
-            # TODO Possibly add option to remove task, without completing?
-            inplatform.delete_task(task)
+    Arguments:
+        tasks: The tasks to be moved or copied.
+        outLists: A dictionary of lists for the tasks to be moved to. An object
+            representing the platform is used as the key.
+        deleteTask: If the tasks should be moved rather than copied.
 
-    return mergedTask
+    Returns:
+        The original tasks with the new platform IDs and lists added.
+    """
+    tasks = list(tasks)
+    if not tasks:
+        return []
+    # If a platform is unavailable, its queued creates check for the task when sent
+    snapshots = {
+        outPlatform: index_tasks(outPlatform.iter_tasks(outList))
+        for outPlatform, outList in outLists.items()
+        if oplog.is_available(outPlatform)
+    }
+    logger.info(f"Moving {len(tasks)} tasks to {outLists}")
+    return limiter.fan_out(
+        lambda task: move_task(task, outLists, deleteTask, snapshots), tasks
+    )
 
 
+@tracing.traced
+@metrics.counted
 def modify_task(
     task: Task, event: str, outLists: dict[Platform, str] = None
 ) -> dict[Platform, bool]:
@@ -1078,28 +1545,36 @@ def modify_task(
 
     """
 
-    inLists = ""
-    for inPlatform, inList in task.get_all_lists().items():
-        inLists += f"\n{inPlatform}: {inList}"
-
-    if outLists is None:
-        outLists = task.get_all_lists()
-
-    # Loop through out lists and modify tasks. Task must already have outPlatforms ids
-    results = {}
-    for outPlatform, outList in outLists.items():
-        logger.debug(
-            f"Attempting to modify task in {outPlatform}-{outList}. "
-            f"Input lists are: {inLists}"
-            f"Event: {event}"
-        )
-
-        task.add_list(outPlatform, outList)
+    # Webhooks and scheduled jobs for the same task are processed one at a time
+    with locks.lock_task(task):
+        inLists = ""
+        for inPlatform, inList in task.get_all_lists().items():
+            inLists += f"\n{inPlatform}: {inList}"
+
+        if outLists is None:
+            outLists = task.get_all_lists()
+
+        # Loop through out lists and modify tasks. Task must already have outPlatforms
+        # ids
+        results = {}
+        for outPlatform, outList in outLists.items():
+            logger.debug(
+                f"Attempting to modify task in {outPlatform}-{outList}. "
+                f"Input lists are: {inLists}"
+                f"Event: {event}"
+            )
 
-        results[outPlatform] = {
-            "task_complete": outPlatform.complete_task,
-            "task_updated": outPlatform.update_task,
-            "task_removed": outPlatform.delete_task,
-        }[event](task)
+            task.add_list(outPlatform, outList)
+
+            # Writes are queued while the platform is unavailable
+            results[outPlatform] = oplog.write(
+                outPlatform,
+                {
+                    "task_complete": "complete",
+                    "task_updated": "update",
+                    "task_removed": "delete",
+                }[event],
+                task,
+            )
 
-    return results
+        return results
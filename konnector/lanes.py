@@ -0,0 +1,195 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import contextlib
+import contextvars
+import functools
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from konnector import metrics, store
+
+logger = logging.getLogger("gunicorn.error")
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+# Fraction of each rate limit window that background requests leave for webhooks
+BACKGROUND_RESERVE = float(os.getenv("BACKGROUND_RATE_RESERVE", "0.2"))
+# Seconds that background requests wait after a webhook request in any process
+INTERACTIVE_GRACE = 0.5
+# Seconds that a rate limit window is assumed to last if the platform doesn't say
+# when it ends
+DEFAULT_WINDOW = 60.0
+
+store.register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS lane_activity (
+        platform TEXT PRIMARY KEY,
+        last_interactive REAL NOT NULL
+    );
+    """
+)
+
+# Requests are interactive unless sent from a background job
+_lane = contextvars.ContextVar("lane", default=INTERACTIVE)
+
+
+def current() -> str:
+    return _lane.get()
+
+
+def background(func):
+    """Decorate a scheduled job so that its API requests give way to webhooks."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _lane.set(BACKGROUND)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _lane.reset(token)
+
+    return wrapper
+
+
+class LaneScheduler:
+    """
+    Orders requests to a platform's API so that requests made while processing
+    webhooks always go first and background jobs, e.g. sweeps of whole lists, only
+    use the rate limit that webhooks leave.
+
+    Background requests wait while a webhook request is in flight in this process, or
+    was sent by any process in the last grace period, and while less than the
+    reserved fraction of the platform's rate limit window is left.
+
+    ...
+
+    Attributes
+    ----------
+    platform : Platform
+        The platform that requests are sent to.
+    reserve : float
+        The fraction of the rate limit that background requests leave unused.
+    grace : float
+        Seconds that background requests wait after a webhook request.
+    window : float
+        Seconds that a rate limit window is assumed to last when responses don't
+        include X-RateLimit-Reset.
+    interactive : int
+        Webhook requests in flight in this process.
+    remaining : int
+        Requests left in the current rate limit window, if the platform reports it.
+    limit : int
+        Requests allowed in each rate limit window, if the platform reports it.
+    reset : float
+        When the current rate limit window ends, in seconds since the epoch.
+    """
+
+    def __init__(
+        self,
+        platform,
+        reserve: float = BACKGROUND_RESERVE,
+        grace: float = INTERACTIVE_GRACE,
+        window: float = DEFAULT_WINDOW,
+    ):
+        self.platform = platform
+        self.reserve = reserve
+        self.grace = grace
+        self.window = window
+        self.interactive = 0
+        self.remaining = None
+        self.limit = None
+        self.reset = None
+        self._condition = threading.Condition()
+        self._lastShared = 0.0
+
+    def observe(self, headers) -> None:
+        """Update the rate limit headroom from an API response's headers."""
+        remaining = headers.get("X-RateLimit-Remaining")
+        limit = headers.get("X-RateLimit-Limit")
+        reset = headers.get("X-RateLimit-Reset")
+        with self._condition:
+            if remaining is not None:
+                self.remaining = int(remaining)
+            if limit is not None:
+                self.limit = int(limit)
+            if reset is not None:
+                self.reset = float(reset)
+            elif remaining is not None:
+                # Without a reset time, background requests would wait for a webhook
+                # to report more headroom. The window is assumed to end instead.
+                now = time.time()
+                if self.reset is None or now >= self.reset:
+                    self.reset = now + self.window
+            self._condition.notify_all()
+
+    def _share_activity(self, now: float) -> None:
+        # Written at most a few times per grace period to keep webhooks cheap
+        if now - self._lastShared < self.grace / 2:
+            return
+        self._lastShared = now
+        try:
+            store.execute(
+                "INSERT OR REPLACE INTO lane_activity VALUES (?, ?)",
+                (str(self.platform), now),
+            )
+        except sqlite3.Error as err:
+            logger.warning(f"Unable to share {self.platform} webhook activity: {err}")
+
+    def _recent_activity(self, now: float) -> bool:
+        try:
+            row = store.execute(
+                "SELECT last_interactive FROM lane_activity WHERE platform = ?",
+                (str(self.platform),),
+            ).fetchone()
+        except sqlite3.Error:
+            return False
+        return row is not None and row["last_interactive"] > now - self.grace
+
+    def _low_budget(self, now: float) -> bool:
+        if self.remaining is None or not self.limit:
+            return False
+        if self.reset is not None and now >= self.reset:
+            # A new window has started
+            return False
+        return self.remaining < self.reserve * self.limit
+
+    def background_blocked(self) -> bool:
+        """Check if a background request should wait."""
+        now = time.time()
+        return (
+            self.interactive > 0 or self._low_budget(now) or self._recent_activity(now)
+        )
+
+    @contextlib.contextmanager
+    def request(self, lane: str = None):
+        """
+        Wait until a request can be sent in a lane, then hold its place while it is
+        sent.
+
+        Arguments:
+            lane: INTERACTIVE or BACKGROUND. Defaults to the lane of the current
+                context.
+        """
+        lane = current() if lane is None else lane
+        start = time.perf_counter()
+        if lane == INTERACTIVE:
+            with self._condition:
+                self.interactive += 1
+            self._share_activity(time.time())
+        else:
+            with self._condition:
+                while self.background_blocked():
+                    self._condition.wait(timeout=0.1)
+        metrics.LANE_QUEUE_SECONDS.observe(
+            time.perf_counter() - start, platform=self.platform, lane=lane
+        )
+        try:
+            yield
+        finally:
+            if lane == INTERACTIVE:
+                with self._condition:
+                    self.interactive -= 1
+                    self._condition.notify_all()
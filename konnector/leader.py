@@ -0,0 +1,120 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger("gunicorn.error")
+
+# Processes that share this directory take part in the same elections.
+LOCK_DIR = os.getenv("LOCK_DIR", tempfile.gettempdir())
+# Seconds between attempts to take over from the leader
+POLL_INTERVAL = 1.0
+
+
+class LeaderElection:
+    """
+    Elects a single process on this host as the leader, e.g. to run scheduled jobs.
+
+    The leader holds an exclusive lock on a file. Other processes try to take the lock
+    every POLL_INTERVAL seconds in a background thread, without blocking, so that
+    gevent workers keep serving requests while they wait. The operating system
+    releases the lock when the leader exits or is killed, so a waiting process takes
+    over automatically.
+
+    ...
+
+    Attributes
+    ----------
+    name : str
+        What is being elected. Elections with the same name and LOCK_DIR compete.
+    path : str
+        The lock file.
+    onElected : callable
+        Called, without arguments, once this process becomes the leader. If it
+        raises, the lock is released and the election is tried again.
+    isLeader : bool
+        If this process holds the lock.
+    """
+
+    def __init__(self, name: str, onElected, lockDir: str = None):
+        self.name = name
+        self.path = os.path.join(
+            lockDir if lockDir is not None else LOCK_DIR, f"konnector-{name}.lock"
+        )
+        self.onElected = onElected
+        self.isLeader = False
+        self._fd = None
+        self._thread = None
+
+    def __str__(self) -> str:
+        return f"{self.name} election"
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _elected(self) -> bool:
+        self.isLeader = True
+        # Record the leader to help with debugging
+        os.ftruncate(self._fd, 0)
+        os.pwrite(self._fd, f"{os.getpid()}\n".encode(), 0)
+        logger.info(f"Process {os.getpid()} is the leader for {self}")
+        try:
+            self.onElected()
+        except Exception:
+            # Otherwise no process would do the leader's work until this one exits
+            logger.exception(f"Process {os.getpid()} failed to start as the leader")
+            self.release()
+            return False
+        return True
+
+    def _wait(self) -> None:
+        # A blocking flock would block gevent's hub, so the lock is polled instead
+        while True:
+            try:
+                if self.try_acquire():
+                    return
+            except OSError as err:
+                logger.warning(f"Unable to wait for {self}: {err}")
+                return
+            time.sleep(POLL_INTERVAL)
+
+    def try_acquire(self) -> bool:
+        """
+        Try to become the leader without waiting.
+
+        Returns:
+            If this process is the leader.
+        """
+        if self.isLeader:
+            return True
+        try:
+            fcntl.flock(self._open(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return self._elected()
+
+    def start(self) -> None:
+        """
+        Become the leader now if possible. Otherwise wait in the background to take
+        over from the current leader.
+        """
+        if self.try_acquire() or self._thread is not None:
+            return
+        logger.info(f"Process {os.getpid()} is waiting to be the leader for {self}")
+        self._thread = threading.Thread(
+            target=self._wait, name=f"{self.name}-election", daemon=True
+        )
+        self._thread.start()
+
+    def release(self) -> None:
+        """Stop being the leader, allowing another process to be elected."""
+        if self.isLeader:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            self.isLeader = False
+            logger.info(f"Process {os.getpid()} is no longer the leader for {self}")
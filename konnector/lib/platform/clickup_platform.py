@@ -193,13 +193,17 @@ class ClickupPlatform(Platform):
             return None
 
     def _set_custom_field(self, platformProps, fieldId: str, fieldValue):
-        """Set value for custom field in Clickup if available"""
-        return platformProps["custom_fields"].append(
-            {
-                "id": fieldId,
-                "value": fieldValue,
-            }
-        )
+        """
+        Return a copy of platformProps with a custom field set. The given properties
+        are not changed, as they may be shared with other requests.
+        """
+        customFields = [
+            customField
+            for customField in platformProps.get("custom_fields", [])
+            if customField["id"] != fieldId
+        ]
+        customFields.append({"id": fieldId, "value": fieldValue})
+        return {**platformProps, "custom_fields": customFields}
 
     def update_custom_fields(self, task: Task, taskDiffs: dict = None) -> bool:
         """
@@ -0,0 +1,162 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import concurrent.futures
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+
+import requests
+
+from konnector import lanes, metrics
+
+logger = logging.getLogger("gunicorn.error")
+
+# Requests faster than this are never treated as a latency spike
+MIN_SPIKE_SECONDS = 0.1
+
+
+def is_overload(err: BaseException) -> bool:
+    """Check if a request failed because the platform is overloaded."""
+    if isinstance(err, requests.exceptions.Timeout):
+        return True
+    if isinstance(err, requests.exceptions.HTTPError) and err.response is not None:
+        return err.response.status_code in (429, 503)
+    return False
+
+
+class AimdLimiter:
+    """
+    Limits the number of requests in flight to a platform's API, adapting the limit
+    to what the platform can absorb. The limit grows by one for each limit's worth
+    of requests with stable latency (additive increase) and halves when the platform
+    rate limits, times out or latency spikes above a multiple of its moving average
+    (multiplicative decrease). Only requests sent after the last decrease can cause
+    another, so one burst of failures halves the limit once.
+
+    Waiting webhook requests are given slots before waiting background requests.
+
+    ...
+
+    Attributes
+    ----------
+    platform : Platform
+        The platform that requests are sent to.
+    limit : float
+        The current number of requests allowed in flight.
+    minLimit : int
+        The lowest the limit can fall to.
+    maxLimit : int
+        The highest the limit can grow to.
+    backoff : float
+        The factor the limit is multiplied by on overload.
+    latencySpike : float
+        How many times the average latency counts as a spike.
+    inFlight : int
+        Requests currently in flight.
+    latency : float
+        The exponentially weighted moving average latency, in seconds.
+    """
+
+    def __init__(
+        self,
+        platform,
+        initialLimit: int = 4,
+        minLimit: int = 1,
+        maxLimit: int = 32,
+        backoff: float = 0.5,
+        latencySpike: float = 3.0,
+    ):
+        self.platform = platform
+        self.limit = float(initialLimit)
+        self.minLimit = minLimit
+        self.maxLimit = maxLimit
+        self.backoff = backoff
+        self.latencySpike = latencySpike
+        self.inFlight = 0
+        self.latency = None
+        self._waitingInteractive = 0
+        self._lastDecrease = float("-inf")
+        self._condition = threading.Condition()
+
+    def __str__(self) -> str:
+        return f"{self.platform} limiter"
+
+    def _acquire(self) -> None:
+        interactive = lanes.current() == lanes.INTERACTIVE
+        with self._condition:
+            if interactive:
+                self._waitingInteractive += 1
+            try:
+                while self.inFlight >= int(self.limit) or (
+                    not interactive and self._waitingInteractive > 0
+                ):
+                    self._condition.wait()
+            finally:
+                if interactive:
+                    self._waitingInteractive -= 1
+            self.inFlight += 1
+
+    def _release(self, start: float, overloaded: bool) -> None:
+        with self._condition:
+            self.inFlight -= 1
+            now = time.perf_counter()
+            seconds = now - start
+            spike = self.latency is not None and seconds > max(
+                self.latencySpike * self.latency, MIN_SPIKE_SECONDS
+            )
+            if overloaded or spike:
+                if start > self._lastDecrease:
+                    self._lastDecrease = now
+                    self.limit = max(self.minLimit, self.limit * self.backoff)
+                    logger.info(
+                        f"{self} decreased to {int(self.limit)}:"
+                        f" {'overloaded' if overloaded else 'latency spike'}"
+                    )
+            else:
+                self.limit = min(self.maxLimit, self.limit + 1 / self.limit)
+            if not overloaded:
+                self.latency = (
+                    seconds
+                    if self.latency is None
+                    else 0.9 * self.latency + 0.1 * seconds
+                )
+            metrics.CONCURRENCY_LIMIT.set(int(self.limit), platform=self.platform)
+            self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def request(self):
+        """Wait for a slot, then hold it while a request is sent."""
+        self._acquire()
+        start = time.perf_counter()
+        overloaded = False
+        try:
+            yield
+        except Exception as e:
+            overloaded = is_overload(e)
+            raise
+        finally:
+            self._release(start, overloaded)
+
+
+def fan_out(func, items, maxWorkers: int = 32) -> list:
+    """
+    Call a function for each item concurrently and return the results in order. The
+    platforms' limiters decide how many requests are actually in flight, so the
+    calls run as fast as the APIs allow. Exceptions are raised once all calls end.
+
+    Arguments:
+        func: The function to call with each item.
+        items: The items to call the function with.
+        maxWorkers: The most calls running at once.
+    """
+    items = list(items)
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with concurrent.futures.ThreadPoolExecutor(min(maxWorkers, len(items))) as pool:
+        # Each call keeps the caller's lane, metrics and tracing context
+        futures = [
+            pool.submit(contextvars.copy_context().run, func, item) for item in items
+        ]
+    return [future.result() for future in futures]
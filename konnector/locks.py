@@ -0,0 +1,240 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import contextlib
+import logging
+import os
+import threading
+import time
+import uuid
+
+from konnector import store
+
+logger = logging.getLogger("gunicorn.error")
+
+# Seconds a lock is held for before another process may take it, in case the process
+# holding it was killed.
+LEASE_SECONDS = 60.0
+# Seconds to wait for a lock before giving up
+LOCK_TIMEOUT = 30.0
+# Leases are renewed this many times within each lease while their lock is held
+RENEWALS_PER_LEASE = 3
+
+store.register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS task_locks (
+        key TEXT PRIMARY KEY,
+        owner TEXT NOT NULL,
+        expires REAL NOT NULL
+    );
+    """
+)
+
+_threadLocks = {}
+_threadLocksLock = threading.Lock()
+_held = threading.local()
+# Locks held by this process, indexed by owner, whose leases are renewed
+_leases = {}
+_leasesLock = threading.Lock()
+_renewer = None
+_leaseAdded = threading.Event()
+
+
+class TaskLock:
+    """
+    Exclusive access to a task across the threads and processes on this host.
+
+    Threads in the same process wait on a shared in-process lock. Processes are
+    coordinated through a lease in the shared store, which expires in case the
+    process holding it dies. The lease is renewed while the lock is held. If it
+    can't be renewed before another process takes it, releasing the lock raises.
+
+    ...
+
+    Attributes
+    ----------
+    key : str
+        What is locked, e.g. "todoist:1234".
+    owner : str
+        A unique ID of the holder of the lease.
+    waited : bool
+        If the lock was held by someone else when it was requested. The task may have
+        changed while waiting.
+    lost : bool
+        If the lease expired while the lock was held, so another process may have
+        changed the task at the same time.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.owner = f"{os.getpid()}:{uuid.uuid4().hex}"
+        self.waited = False
+        self.lost = False
+        self._threadLock = None
+
+    def __str__(self) -> str:
+        return f"lock {self.key}"
+
+    def _try_lease(self) -> bool:
+        now = time.time()
+        cursor = store.execute(
+            "INSERT INTO task_locks (key, owner, expires) VALUES (?, ?, ?)"
+            " ON CONFLICT (key) DO UPDATE SET owner = excluded.owner,"
+            " expires = excluded.expires WHERE task_locks.expires < ?",
+            (self.key, self.owner, now + LEASE_SECONDS, now),
+        )
+        return cursor.rowcount == 1
+
+    def renew(self) -> bool:
+        """
+        Extend the lease of a held lock.
+
+        Returns:
+            If the lease was still held by this lock.
+        """
+        cursor = store.execute(
+            "UPDATE task_locks SET expires = ? WHERE key = ? AND owner = ?",
+            (time.time() + LEASE_SECONDS, self.key, self.owner),
+        )
+        if cursor.rowcount != 1:
+            self.lost = True
+            logger.error(f"The lease of {self} expired while it was held")
+        return not self.lost
+
+    def acquire(self, timeout: float = LOCK_TIMEOUT) -> None:
+        deadline = time.monotonic() + timeout
+        with _threadLocksLock:
+            # Locks are shared by all threads waiting on the key and then discarded
+            self._threadLock, waiting = _threadLocks.get(
+                self.key, (threading.Lock(), 0)
+            )
+            _threadLocks[self.key] = (self._threadLock, waiting + 1)
+        if not self._threadLock.acquire(blocking=False):
+            self.waited = True
+            if not self._threadLock.acquire(timeout=timeout):
+                self._forget()
+                raise Exception(f"Timed out waiting for {self}")
+
+        delay = 0.005
+        try:
+            while not self._try_lease():
+                self.waited = True
+                if time.monotonic() > deadline:
+                    raise Exception(
+                        f"Timed out waiting for {self} held by another process"
+                    )
+                time.sleep(delay)
+                delay = min(delay * 2, 0.1)
+        except BaseException:
+            # E.g. the store is locked. Other threads may still take the lock.
+            self._threadLock.release()
+            self._forget()
+            raise
+        _renew_lease(self)
+        logger.debug(f"Acquired {self}")
+
+    def release(self) -> None:
+        with _leasesLock:
+            _leases.pop(self.owner, None)
+        try:
+            cursor = store.execute(
+                "DELETE FROM task_locks WHERE key = ? AND owner = ?",
+                (self.key, self.owner),
+            )
+            if cursor.rowcount != 1:
+                self.lost = True
+        finally:
+            self._threadLock.release()
+            self._forget()
+        logger.debug(f"Released {self}")
+        if self.lost:
+            raise Exception(f"The lease of {self} expired while it was held")
+
+    def _forget(self) -> None:
+        with _threadLocksLock:
+            threadLock, waiting = _threadLocks[self.key]
+            if waiting == 1:
+                del _threadLocks[self.key]
+            else:
+                _threadLocks[self.key] = (threadLock, waiting - 1)
+
+
+def _renew_lease(taskLock: TaskLock) -> None:
+    """Renew a lock's lease until it is released, starting the renewer if needed."""
+    global _renewer
+    with _leasesLock:
+        _leases[taskLock.owner] = (taskLock, _next_renewal())
+        # Threads don't survive fork so each process starts its own
+        if _renewer is None or not _renewer.is_alive():
+            _renewer = threading.Thread(
+                target=_renew_leases, name="lease-renewer", daemon=True
+            )
+            _renewer.start()
+    _leaseAdded.set()
+
+
+def _next_renewal() -> float:
+    return time.monotonic() + LEASE_SECONDS / RENEWALS_PER_LEASE
+
+
+def _renew_leases() -> None:
+    while True:
+        with _leasesLock:
+            now = time.monotonic()
+            due = [taskLock for taskLock, renewAt in _leases.values() if renewAt <= now]
+            for taskLock in due:
+                _leases[taskLock.owner] = (taskLock, _next_renewal())
+            wait = min(
+                (renewAt for _, renewAt in _leases.values()),
+                default=_next_renewal(),
+            )
+        for taskLock in due:
+            try:
+                if not taskLock.renew():
+                    with _leasesLock:
+                        _leases.pop(taskLock.owner, None)
+            except Exception as err:
+                logger.warning(f"Unable to renew the lease of {taskLock}: {err}")
+        # Woken early when a lock is acquired in case it is due before the others
+        _leaseAdded.wait(max(wait - time.monotonic(), 0))
+        _leaseAdded.clear()
+
+
+def task_keys(task) -> list[str]:
+    """The lock keys of a task: one for each platform ID, in a consistent order."""
+    return sorted(
+        f"{platform}:{taskId}" for platform, taskId in task.get_all_ids().items()
+    )
+
+
+@contextlib.contextmanager
+def lock_task(task, timeout: float = LOCK_TIMEOUT):
+    """
+    Hold locks on all of a task's platform IDs within the enclosed code, so that
+    webhooks and scheduled jobs don't change the same task at the same time.
+    Locks already held by this thread are not locked again.
+
+    Yields:
+        If waiting for another holder was needed. If so, the task may have changed.
+    """
+    held = getattr(_held, "keys", None)
+    if held is None:
+        held = _held.keys = set()
+    # Keys are locked in a consistent order so that two tasks can't deadlock
+    taskLocks = [TaskLock(key) for key in task_keys(task) if key not in held]
+    acquired = []
+    try:
+        for taskLock in taskLocks:
+            taskLock.acquire(timeout)
+            acquired.append(taskLock)
+            held.add(taskLock.key)
+        yield any(taskLock.waited for taskLock in taskLocks)
+    finally:
+        errors = []
+        for taskLock in reversed(acquired):
+            held.discard(taskLock.key)
+            try:
+                taskLock.release()
+            except Exception as err:
+                errors.append(err)
+        if errors:
+            raise errors[0]
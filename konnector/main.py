@@ -1,67 +1,149 @@
-from konnector.konnector import Task, Platform, modify_task, move_task, max_days_future
-from konnector.todoist import Todoist
-from konnector.clickup import Clickup
+from konnector.konnector import Task, Platform, modify_task, move_task, move_tasks
+from konnector.konnector import max_days_future
+from konnector import jsonlib, lanes, metrics, mirror, oplog, polling, tracing
+from konnector.leader import LeaderElection
+from konnector.timers import TaskTimers
 
-from flask import Flask, request, jsonify, make_response  # render_template
+from flask import Flask, current_app, request, jsonify, make_response
+
+# from flask import render_template
 import logging
 import os
+import sqlite3
+import threading
 from dotenv import load_dotenv
 
 import atexit
-from apscheduler.schedulers.background import BackgroundScheduler
 
 # from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 
 load_dotenv()
 
-
-AUTH = os.getenv("AUTH", "False").lower() in ("true", "1")
-ENDPOINT = os.environ["ENDPOINT"]
-app = Flask(__name__)
-app.config["JSONIFY_PRETTYPRINT_REGULAR"] = True
 logger = logging.getLogger("gunicorn.error")
 
-if __name__ == "__main__":
-    app.logger.handlers = logger.handlers
-    # Level set by gunicorn
-    app.logger.setLevel(logger.level)
-
-# Todoist
 todoistEndpoint = "/todoist/webhook"
-todoist = Todoist(
-    appEndpoint=ENDPOINT,
-    platformEndpoint=todoistEndpoint,
-    lists={
-        "inbox": "2200213434",
-        "alexa-todo": "2231741057",
-        "food_log": "2291635541",
-        "next_actions": "2284385839",
-    },
-    accessToken=os.environ["TODOIST_ACCESS"],
-    clientId=os.environ["TODOIST_CLIENT_ID"],
-    secret=os.environ["TODOIST_SECRET"],
-    userIds=["20038827"],
-    newTaskLists=["inbox", "alexa-todo"],
-    state=os.environ["TODOIST_STATE"],
-)
-
-# Clickup
 clickupEndpoint = "/clickup/webhook/call"
-clickup = Clickup(
-    ENDPOINT,
-    clickupEndpoint,
-    lists={"inbox": "38260663", "food_log": "176574082"},
-    accessToken=os.environ["CLICKUP_TOKEN"],
-    clientId=os.environ["CLICKUP_WEBHOOK_ID"],
-    secret=os.environ["CLICKUP_WEBHOOK_SECRET"],
-    userIds=["2511898", "0", "-1"],  # -1 is Clickbot
-    workspace="2193273",
-    folder="17398998",
-    listStatuses={
-        "inbox": ["next action", "complete"],
-    },
-)
 todoistIdInClickup = "550a93a0-6978-4664-be6d-777cc0d7aff6"
+# Clickup tasks due within this many days are next actions
+nextActionDueDays = 3
+
+# Settings that platforms can't be created without
+REQUIRED_CONFIG = (
+    "ENDPOINT",
+    "TODOIST_ACCESS",
+    "TODOIST_CLIENT_ID",
+    "TODOIST_SECRET",
+    "TODOIST_STATE",
+    "CLICKUP_TOKEN",
+    "CLICKUP_WEBHOOK_ID",
+    "CLICKUP_WEBHOOK_SECRET",
+)
+
+# The platforms ("todoist" and "clickup"), the app ("app") and the scheduler
+# ("scheduler", "todoistInboxPoller") are created on first use by module __getattr__,
+# so importing this module doesn't read credentials or import platform modules.
+_createLock = threading.RLock()
+
+
+def __getattr__(name: str):
+    with _createLock:
+        if name in ("todoist", "clickup"):
+            create_platforms()
+        elif name == "app":
+            globals()["app"] = create_app()
+        elif name in ("scheduler", "todoistInboxPoller"):
+            create_scheduler()
+        if name in globals():
+            return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_config(overrides: dict = None) -> dict:
+    """
+    Read the app's settings from environment variables.
+
+    Arguments:
+        overrides: Settings that replace those in the environment.
+    """
+    config = {
+        "AUTH": os.getenv("AUTH", "False").lower() in ("true", "1"),
+        "DEFER_SCHEDULER": os.getenv("DEFER_SCHEDULER", "False").lower()
+        in ("true", "1"),
+        "ENDPOINT": os.getenv("ENDPOINT"),
+        "TODOIST_ACCESS": os.getenv("TODOIST_ACCESS"),
+        "TODOIST_CLIENT_ID": os.getenv("TODOIST_CLIENT_ID"),
+        "TODOIST_SECRET": os.getenv("TODOIST_SECRET"),
+        "TODOIST_STATE": os.getenv("TODOIST_STATE"),
+        "TODOIST_API_URL": os.getenv("TODOIST_API_URL"),
+        "CLICKUP_TOKEN": os.getenv("CLICKUP_TOKEN"),
+        "CLICKUP_WEBHOOK_ID": os.getenv("CLICKUP_WEBHOOK_ID"),
+        "CLICKUP_WEBHOOK_SECRET": os.getenv("CLICKUP_WEBHOOK_SECRET"),
+        "CLICKUP_API_URL": os.getenv("CLICKUP_API_URL"),
+    }
+    config.update(overrides or {})
+    return config
+
+
+def create_platforms(config: dict = None) -> tuple[Platform, Platform]:
+    """
+    Create the Todoist and Clickup platforms, once per process. Their modules are
+    imported here rather than when this module is imported.
+
+    Arguments:
+        config: Settings that replace those in the environment.
+
+    Returns:
+        The Todoist and Clickup platforms
+    """
+    global todoist, clickup
+    with _createLock:
+        if "todoist" in globals():
+            return todoist, clickup
+        from konnector.todoist import Todoist
+        from konnector.clickup import Clickup
+
+        config = get_config(config)
+        missing = [key for key in REQUIRED_CONFIG if not config[key]]
+        if missing:
+            raise Exception(f"Missing settings: {', '.join(missing)}")
+        todoistPlatform = Todoist(
+            appEndpoint=config["ENDPOINT"],
+            platformEndpoint=todoistEndpoint,
+            lists={
+                "inbox": "2200213434",
+                "alexa-todo": "2231741057",
+                "food_log": "2291635541",
+                "next_actions": "2284385839",
+            },
+            accessToken=config["TODOIST_ACCESS"],
+            clientId=config["TODOIST_CLIENT_ID"],
+            secret=config["TODOIST_SECRET"],
+            userIds=["20038827"],
+            newTaskLists=["inbox", "alexa-todo"],
+            state=config["TODOIST_STATE"],
+            apiUrl=config["TODOIST_API_URL"],
+        )
+        todoistPlatform.set_custom_funcs(todoistFromCustomFuncs, todoistToCustomFuncs)
+
+        clickupPlatform = Clickup(
+            config["ENDPOINT"],
+            clickupEndpoint,
+            lists={"inbox": "38260663", "food_log": "176574082"},
+            accessToken=config["CLICKUP_TOKEN"],
+            clientId=config["CLICKUP_WEBHOOK_ID"],
+            secret=config["CLICKUP_WEBHOOK_SECRET"],
+            userIds=["2511898", "0", "-1"],  # -1 is Clickbot
+            workspace="2193273",
+            folder="17398998",
+            listStatuses={
+                "inbox": ["next action", "complete"],
+            },
+            apiUrl=config["CLICKUP_API_URL"],
+        )
+        clickupPlatform.set_custom_funcs(clickupFromCustomFuncs, clickupToCustomFuncs)
+
+        todoist, clickup = todoistPlatform, clickupPlatform
+        return todoist, clickup
 
 
 # Todoist custom funcs
@@ -92,7 +174,6 @@ def add_clickup_id_to_todoist(platform: Platform, task: Task, platformProps):
 
 todoistFromCustomFuncs = [get_clickup_id_from_todoist]
 todoistToCustomFuncs = [add_clickup_id_to_todoist]
-todoist.set_custom_funcs(todoistFromCustomFuncs, todoistToCustomFuncs)
 
 
 # Clickup custom funcs
@@ -121,9 +202,9 @@ def add_todoist_id_to_clickup(platform: Platform, task: Task, platformProps):
 
 clickupFromCustomFuncs = [get_todoist_id_from_clickup]
 clickupToCustomFuncs = [add_todoist_id_to_clickup]
-clickup.set_custom_funcs(clickupFromCustomFuncs, clickupToCustomFuncs)
 
 
+@tracing.traced
 def next_actions_criteria(clickupTask: Task):
     """
     Checks if a Clickup task meets the criteria to be put in
@@ -131,54 +212,184 @@ def next_actions_criteria(clickupTask: Task):
     """
     return clickupTask.status == "next action" and (
         clickupTask.get_property("priority") < 3
-        or max_days_future(clickupTask.get_property("due_date"), days=3)
+        or max_days_future(clickupTask.get_property("due_date"), nextActionDueDays)
         or clickupTask.subTask is not True
     )
 
 
-@app.route("/")
+@tracing.traced
+def update_next_action(clickupTask: Task, todoistTask: Task):
+    """
+    Add, update or remove a Clickup task in Todoist's next actions list, depending on
+    whether it meets the next actions criteria.
+    """
+    # Clickup task into todoist next_actions.
+    # Next action status AND (high priority OR due date < 1 week OR no project.)
+    if next_actions_criteria(clickupTask):
+        logger.info("Task meets next actions criteria")
+        if todoistTask is None:
+            logger.info("Adding task to next actions list.")
+            todoistTask = move_task(
+                clickupTask, {todoist: "next_actions"}, deleteTask=False
+            )
+
+            # The ID isn't known yet if the create was queued
+            if todoistTask.get_id(todoist) is not None:
+                clickup.add_id(clickupTask, todoist, todoistTask.get_id(todoist))
+        else:
+            logger.info("Task is already in next actions list. Modifying Todoist task.")
+            modify_task(clickupTask, "task_updated", {todoist: "next_actions"})
+    elif todoistTask is not None and todoistTask.get_list(todoist) == "next_actions":
+        logger.info(
+            "Task does not meet next actions criteria. Removing task from next"
+            " actions list."
+        )
+        todoist.delete_task(clickupTask)
+    set_due_date_timer(clickupTask)
+
+
+def set_due_date_timer(clickupTask: Task):
+    """
+    Check a Clickup next action again when its due date comes within the next
+    actions window, in case no webhook arrives to update it.
+    """
+    clickupId = clickupTask.get_id(clickup)
+    if clickupId is None:
+        logger.warning("Unable to set a due date timer for a task without an ID")
+        return
+    dueDate = clickupTask.get_property("due_date")
+    if (
+        clickupTask.status == "next action"
+        and dueDate is not None
+        and not next_actions_criteria(clickupTask)
+    ):
+        dueDateTimers.set(clickupId, int(dueDate) / 1000 - nextActionDueDays * 86400)
+    else:
+        dueDateTimers.cancel(clickupId)
+
+
+def update_sub_tasks(clickupTask: Task, clickupEvent: str) -> int:
+    """
+    Re-evaluate the subtasks of a Clickup task after it is deleted or moved, as
+    Clickup doesn't send webhooks for subtasks when their parent changes. Subtasks
+    are found in the mirror rather than requested, and only those joining or leaving
+    Todoist's next actions list cause requests.
+
+    Returns:
+        The number of subtasks re-evaluated
+    """
+    parentId = clickupTask.get_id(clickup)
+    if parentId is None:
+        return 0
+    subTasks = mirror.find(clickup, parentId=parentId)
+    if clickupEvent != "task_removed":
+        # Subtasks are moved with their parent. Other changes don't affect them.
+        subTasks = [
+            subTask
+            for subTask in subTasks
+            if subTask.get_list(clickup) != clickupTask.get_list(clickup)
+        ]
+    for subTask in subTasks:
+        subTaskId = subTask.get_id(clickup)
+        nextActions = mirror.find(todoist, "next_actions", ids={clickup: subTaskId})
+        todoistTask = nextActions[0] if nextActions else None
+        if todoistTask is not None:
+            if todoistTask.get_id(todoist) is None:
+                logger.warning(f"Todoist task for subtask {subTaskId} has no ID")
+                continue
+            subTask.add_id(todoist, todoistTask.get_id(todoist))
+        if clickupEvent == "task_removed":
+            # Clickup deletes subtasks with their parent
+            if todoistTask is not None:
+                todoist.delete_task(todoistTask)
+            mirror.remove(clickup, subTaskId)
+            dueDateTimers.cancel(subTaskId)
+            continue
+        subTask.add_list(clickup, clickupTask.get_list(clickup))
+        mirror.save(clickup, subTask)
+        if next_actions_criteria(subTask) != (todoistTask is not None):
+            update_next_action(subTask, todoistTask)
+    return len(subTasks)
+
+
+def seed_due_date_timers() -> int:
+    """
+    Set timers for the Clickup next actions in the mirror. Tasks that already existed
+    when their timers were lost, or when the mirror was rebuilt, might not get another
+    webhook before their due dates come within the next actions window.
+
+    Returns:
+        The number of next actions checked
+    """
+    # The first job in a newly elected process may run before the platforms are used
+    create_platforms()
+    try:
+        nextActions = mirror.find(clickup, status="next action", completed=False)
+    except sqlite3.Error as err:
+        # Timers are still set by webhooks, so the scheduler starts anyway
+        logger.warning(f"Unable to read next actions from the mirror: {err}")
+        return 0
+    for clickupTask in nextActions:
+        set_due_date_timer(clickupTask)
+    logger.info(f"Due date timers checked for {len(nextActions)} Clickup next actions")
+    return len(nextActions)
+
+
 def home():
-    logger.info(f"auth is set to: {AUTH}")
+    logger.info(f"auth is set to: {current_app.config['AUTH']}")
     return (
         "<ul>"
         "<li><a href='todoist/auth'>Todoist Auth</a></li>"
         "<li><a href='clickup/webhook/add'>Add Clickup webhook</a></li>"
         "<li><a href='clickup/webhook/delete'>Delete Clickup webhook</a></li>"
         "<li><a href='clickup/webhook/get'>Get Clickup webhook</a></li>"
+        "<li><a href='mirror/rebuild'>Rebuild task mirror</a></li>"
         "</ul>"
     )
 
 
+def get_metrics():
+    """Metrics from all workers in the Prometheus text format."""
+    return make_response(metrics.render(), 200, {"Content-Type": metrics.CONTENT_TYPE})
+
+
 # @app.route('/auth/init/<appname>')
 # def auth():
 #   return render_template('form.html', appname=appname)
-# TODO more secure auth system.
-if AUTH is True:
+# TODO more secure auth system. Only routed if AUTH is set.
+def todoist_auth():
+    return todoist.auth_init(request)
+
+
+def todoist_callback():
+    return todoist.auth_callback(request)
+
+
+def clickup_update_webhook():
+    return clickup.modify_webhook(request)
 
-    @app.route("/todoist/auth")
-    def todoist_auth():
-        return todoist.auth_init(request)
 
-    @app.route("/todoist/callback")
-    def todoist_callback():
-        return todoist.auth_callback(request)
+def clickup_delete_webhook():
+    return clickup.delete_webhook(request)
 
-    @app.route("/clickup/webhook/add")
-    def clickup_update_webhook():
-        return clickup.modify_webhook(request)
 
-    @app.route("/clickup/webhook/delete")
-    def clickup_delete_webhook():
-        return clickup.delete_webhook(request)
+def clickup_get_webhook():
+    webhooks = clickup.get_webhook(request)
+    return jsonify(webhooks)
 
-    @app.route("/clickup/webhook/get")
-    def clickup_get_webhook():
-        webhooks = clickup.get_webhook(request)
-        return jsonify(webhooks)
+
+@lanes.background
+def mirror_rebuild():
+    count = mirror.rebuild(
+        {platform: list(platform.lists) for platform in (todoist, clickup)}
+    )
+    seed_due_date_timers()
+    return jsonify({"tasks": count})
 
 
 # Todoist webhooks.
-@app.route(todoistEndpoint, methods=["POST"])
+@metrics.timed_webhook("todoist")
+@tracing.traced
 def todoist_webhook():
     """
     Process Todoist Webhooks.
@@ -192,6 +403,7 @@ def todoist_webhook():
       EVENT = task_updated OR task_completed THEN Update associated Clickup task
         IN_LIST = Todoist:next_action     OUT_LIST = Clickup: inbox
     """
+    todoistList = None
     try:
         (
             todoistEvent,
@@ -219,10 +431,13 @@ def todoist_webhook():
         return make_response(jsonify({"status": "success"}), 202)
     except Exception as e:
         logger.warning(f"Error in processing Todoist webhook: {e}")
+        if todoistList is not None:
+            polling.record_webhook(todoist, todoistList, failed=True)
         return make_response(repr(e), 202)
 
 
-@app.route(clickupEndpoint, methods=["POST"])
+@metrics.timed_webhook("clickup")
+@tracing.traced
 def clickup_webhook_received():
     """
     Process Clickup Webhooks.
@@ -243,6 +458,7 @@ def clickup_webhook_received():
       EVENT = task_completed OR task_removed THEN
           IF task exists in Todoist:next_actions list THEN update Todoist task
     """
+    clickupList = None
     try:
         (
             clickupEvent,
@@ -254,28 +470,7 @@ def clickup_webhook_received():
         todoistTask = todoist.get_task(clickupTask)
         todoistTaskExists = todoistTask is not None
         if clickupEvent in ["task_updated"]:
-            # Clickup task into todoist next_actions.
-            # Next action status AND (high priority OR due date < 1 week OR no project.)
-            if next_actions_criteria(clickupTask):
-                logger.info("Task meets next actions criteria")
-                if not todoistTaskExists:
-                    logger.info("Adding task to next actions list.")
-                    todoistTask = move_task(
-                        clickupTask, {todoist: "next_actions"}, deleteTask=False
-                    )
-
-                    clickup.add_id(clickupTask, todoist, todoistTask.get_id(todoist))
-                else:
-                    logger.info(
-                        "Task is already in next actions list. Modifying Todoist task."
-                    )
-                    modify_task(clickupTask, clickupEvent, {todoist: "next_actions"})
-            elif todoistTaskExists and todoistTask.get_list(todoist) == "next_actions":
-                logger.info(
-                    "Task does not meet next actions criteria. Removing task from next"
-                    " actions list."
-                )
-                todoist.delete_task(clickupTask)
+            update_next_action(clickupTask, todoistTask)
         elif (
             clickupEvent
             in [
@@ -285,35 +480,190 @@ def clickup_webhook_received():
             and todoistTaskExists
         ):
             modify_task(clickupTask, clickupEvent, {todoist: "next_actions"})
+        if clickupEvent in ["task_complete", "task_removed"]:
+            dueDateTimers.cancel(clickupTask.get_id(clickup))
+        update_sub_tasks(clickupTask, clickupEvent)
         return make_response(jsonify({"status": "success"}), 202)
     except Exception as e:
         logger.warning(f"Error in processing clickup webhook: {e}")
+        if clickupList is not None:
+            polling.record_webhook(clickup, clickupList, failed=True)
         return make_response(repr(e), 202)  # Response accepted. Not necessarily success
 
 
 # Scheduled actions
+@metrics.timed_job
+@tracing.traced
+@lanes.background
 def move_todoist_inbox():
     """
     Loops through todoist "new task" lists (projects) and moves tasks to Clickup.
+    Returns the number of tasks moved, which webhooks should have moved already.
     """
-    # TODO prevent webhooks when running? Could pause execution to run wehbook.
+    # Webhooks for the same tasks wait for their task locks in move_task.
     logger.info("Scheduled: Checking Todoist inbox for new tasks.")
-    # Clickup rate limits are 100 requests per minute. Highly unlikely to reach this.
+    movedTasks = 0
+    # Tasks are moved concurrently, checked against one snapshot of the Clickup inbox.
+    # Each platform's limiter keeps requests within what its API can absorb.
     for newTaskList in todoist.newTaskLists:
         newTodoistTasks = todoist.get_tasks(newTaskList)
-        for newTodoistTask in newTodoistTasks:
-            move_task(newTodoistTask, {clickup: "inbox"}, deleteTask=True)
+        move_tasks(newTodoistTasks, {clickup: "inbox"}, deleteTask=True)
+        movedTasks += len(newTodoistTasks)
+    return movedTasks
 
 
-# Schedule check of todoist inbox in case webhook hasn't worked.
-scheduler = BackgroundScheduler(
-    # jobstores={"default": SQLAlchemyJobStore(url="sqlite:///jobs.sqlite")}
-)
-scheduler.add_job(func=move_todoist_inbox, trigger="interval", minutes=10)
-scheduler.start()
-# Shut down the scheduler when exiting the app
-atexit.register(lambda: scheduler.shutdown())
+@metrics.timed_job
+@tracing.traced
+@lanes.background
+def next_action_due(clickupId: str):
+    """
+    Called when a Clickup task's due date comes within the next actions window.
+    Adds the task to Todoist's next actions list if it now meets the criteria.
+    """
+    clickupTask = clickup.get_task(taskId=clickupId)
+    if clickupTask is None:
+        return
+    update_next_action(clickupTask, todoist.get_task(clickupTask))
+
+
+@metrics.timed_job
+@lanes.background
+def flush_oplog():
+    """Send writes that were queued while a platform was unavailable."""
+    oplog.flush([todoist, clickup])
+
+
+# Re-checks Clickup tasks at the moment their due dates make them next actions
+dueDateTimers = TaskTimers("next_action_due", next_action_due)
+
+
+def create_scheduler():
+    """
+    Create the scheduler and its jobs, once per process. APScheduler is only imported
+    by the process that runs scheduled jobs.
+    """
+    global scheduler, todoistInboxPoller
+    with _createLock:
+        if "scheduler" in globals():
+            return scheduler
+        from apscheduler.schedulers.background import BackgroundScheduler
+
+        # Schedule check of todoist inbox in case webhook hasn't worked.
+        newScheduler = BackgroundScheduler(
+            # jobstores={"default": SQLAlchemyJobStore(url="sqlite:///jobs.sqlite")}
+        )
+        # Poll less often while Todoist webhooks are arriving and more often if they
+        # are missed
+        todoistInboxPoller = polling.AdaptivePoller(
+            "move_todoist_inbox",
+            move_todoist_inbox,
+            todoist,
+            todoist.newTaskLists,
+            baseInterval=10 * 60,
+            minInterval=2 * 60,
+            maxInterval=60 * 60,
+        )
+        todoistInboxPoller.add_to(newScheduler)
+        dueDateTimers.add_to(newScheduler)
+        newScheduler.add_job(func=flush_oplog, trigger=polling.interval_trigger(30))
+        scheduler = newScheduler
+        # Shut down the scheduler when exiting the app
+        atexit.register(stop_scheduler)
+        return scheduler
+
+
+def run_scheduler():
+    seed_due_date_timers()
+    create_scheduler().start()
+
+
+# Only one process on the host runs scheduled jobs. Another takes over if it exits.
+schedulerElection = LeaderElection("scheduler", onElected=run_scheduler)
+
+
+def start_scheduler():
+    """Run scheduled jobs in this process once it is elected as the leader."""
+    schedulerElection.start()
+
+
+def stop_scheduler():
+    if "scheduler" in globals() and scheduler.running:
+        scheduler.shutdown()
+    schedulerElection.release()
+
+
+def warm_up(flaskApp: Flask) -> None:
+    """
+    Fill the caches that the first webhook would otherwise fill in each worker. Called
+    by a server that preloads the app, before forking its workers.
+
+    Arguments:
+        flaskApp: The app that workers will serve.
+    """
+    # Module globals are only created lazily for lookups from outside this module
+    for platform in create_platforms():
+        platform.warm_up()
+    # Compiles the route matchers
+    flaskApp.url_map.update()
+
+
+def after_fork() -> None:
+    """
+    Prepare a worker forked from a process with the app loaded. Connections and
+    threads can't be shared across fork, so the worker makes its own and competes to
+    run the scheduler.
+    """
+    for platform in create_platforms():
+        platform.after_fork()
+    start_scheduler()
+
+
+def create_app(config: dict = None) -> Flask:
+    """
+    Create the Flask app, the platforms if needed, and the routes.
+
+    Arguments:
+        config: Settings that replace those in the environment, e.g.
+            {"DEFER_SCHEDULER": True} to start the scheduler later with
+            start_scheduler. gunicorn starts it after forking its workers, as threads
+            don't survive fork.
+
+    Returns:
+        The Flask app
+    """
+    config = get_config(config)
+    create_platforms(config)
+
+    flaskApp = Flask(__name__)
+    flaskApp.config.update(config)
+    # Compact JSON with a faster codec if installed
+    flaskApp.json = jsonlib.JsonProvider(flaskApp)
+
+    flaskApp.add_url_rule("/", view_func=home)
+    flaskApp.add_url_rule("/metrics", view_func=get_metrics)
+    if config["AUTH"] is True:
+        flaskApp.add_url_rule("/todoist/auth", view_func=todoist_auth)
+        flaskApp.add_url_rule("/todoist/callback", view_func=todoist_callback)
+        flaskApp.add_url_rule("/clickup/webhook/add", view_func=clickup_update_webhook)
+        flaskApp.add_url_rule(
+            "/clickup/webhook/delete", view_func=clickup_delete_webhook
+        )
+        flaskApp.add_url_rule("/clickup/webhook/get", view_func=clickup_get_webhook)
+        flaskApp.add_url_rule("/mirror/rebuild", view_func=mirror_rebuild)
+    flaskApp.add_url_rule(todoistEndpoint, view_func=todoist_webhook, methods=["POST"])
+    flaskApp.add_url_rule(
+        clickupEndpoint, view_func=clickup_webhook_received, methods=["POST"]
+    )
+
+    if not config["DEFER_SCHEDULER"]:
+        start_scheduler()
+    return flaskApp
+
 
 if __name__ == "__main__":
+    app = create_app()
+    app.logger.handlers = logger.handlers
+    # Level set by gunicorn
+    app.logger.setLevel(logger.level)
     # Reloader causes apscheduler to schedule twice in debug mode
     app.run(host="0.0.0.0", port=8080, use_reloader=False)
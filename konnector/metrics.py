@@ -0,0 +1,613 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import atexit
+import contextlib
+import contextvars
+import fcntl
+import functools
+import glob
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger("gunicorn.error")
+
+METRICS_DIR = os.getenv(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), "konnector-metrics")
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Seconds between writes of this process's metrics to the shared directory
+FLUSH_INTERVAL = 1.0
+# Counters and histograms of processes that have exited are kept in this snapshot
+ARCHIVE_FILE = "archive.json"
+# Locked while snapshots are read, and exclusively while they are archived
+ARCHIVE_LOCK_FILE = "archive.lock"
+
+
+def _escape(value) -> str:
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    """
+    A collection of metrics belonging to one process.
+
+    Gunicorn workers do not share memory, so each process writes a snapshot of its
+    metrics to its own file in a shared directory. Rendering merges the snapshots of
+    every process that has written one: counters and histograms are summed and the
+    most recently set gauge value is used. When rendering, the counters and histograms
+    of processes that are no longer running are added to an archive snapshot so that
+    they don't go down, and their gauges are discarded. A process archives any
+    snapshot left by an earlier process with the same pid before it writes its own.
+
+    ...
+
+    Attributes
+    ----------
+    directory : str
+        The directory shared by all processes that snapshots are written to.
+    metrics : dict
+        Metric objects registered with this registry, indexed by the metric name.
+    """
+
+    def __init__(self, directory: str = METRICS_DIR, pid: int = None):
+        self.directory = directory
+        self.metrics = {}
+        self._pid = pid
+        self._lock = threading.RLock()
+        self._lastFlush = 0.0
+        self._timer = None
+        self._claimedPid = None
+
+    @property
+    def pid(self) -> int:
+        # Looked up on each write as the pid changes when gunicorn forks workers.
+        return self._pid if self._pid is not None else os.getpid()
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.directory, f"{self.pid}.json")
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self.metrics[metric.name] = metric
+        return metric
+
+    def changed(self) -> None:
+        """
+        Write the snapshot if it has not been written recently, otherwise write it
+        once the interval has passed.
+        """
+        with self._lock:
+            wait = FLUSH_INTERVAL - (time.monotonic() - self._lastFlush)
+            if wait <= 0:
+                self.flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(wait, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    @contextlib.contextmanager
+    def _snapshots_lock(self, operation: int):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ARCHIVE_LOCK_FILE), "a") as lockFile:
+            fcntl.flock(lockFile, operation)
+            yield
+
+    def _claim(self) -> None:
+        """Archive a snapshot left by an earlier process that had this pid."""
+        if self._claimedPid == self.pid:
+            return
+        self._claimedPid = self.pid
+        if os.path.exists(self.path):
+            self.archive([self.path])
+
+    def flush(self) -> None:
+        """Write this process's metrics to the shared directory."""
+        with self._lock:
+            self._lastFlush = time.monotonic()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._claim()
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmpPath = f"{self.path}.tmp"
+                with open(tmpPath, "w") as f:
+                    json.dump(self.snapshot(), f)
+                os.replace(tmpPath, self.path)
+            except OSError as err:
+                logger.warning(f"Unable to write metrics to {self.directory}: {err}")
+
+    def forked(self) -> None:
+        """
+        Start a forked process's metrics from zero. The parent's metrics are still
+        written to the parent's snapshot so would otherwise be counted twice.
+        """
+        self._lock = threading.RLock()
+        self._timer = None
+        self._lastFlush = 0.0
+        for metric in self.metrics.values():
+            metric._lock = threading.Lock()
+            metric.samples = {}
+        self._claim()
+
+    def collect(self) -> dict:
+        """Merge the snapshots written by every running process and the archive."""
+        self.flush()
+        self.prune()
+        merged = {}
+        with self._snapshots_lock(fcntl.LOCK_SH):
+            for path in glob.glob(os.path.join(self.directory, "*.json")):
+                snapshot = _read_snapshot(path)
+                for name, samples in snapshot.items():
+                    if name in self.metrics:
+                        self.metrics[name].merge(merged.setdefault(name, {}), samples)
+        return merged
+
+    def render(self) -> str:
+        """Return the merged metrics of all processes in Prometheus text format."""
+        merged = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.description}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            lines.extend(metric.render(merged.get(name, {})))
+        return "\n".join(lines) + "\n"
+
+    def clear(self) -> None:
+        """Remove the snapshots of all processes. Used when the app (re)starts."""
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def prune(self) -> None:
+        """Archive the snapshots of processes that are no longer running."""
+        exited = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                pid = int(os.path.basename(path)[: -len(".json")])
+            except ValueError:
+                continue
+            if pid != self.pid and not _running(pid):
+                exited.append(path)
+        if exited:
+            self.archive(exited)
+
+    def archive(self, paths: list) -> None:
+        """
+        Add the counters and histograms of snapshots to the archive and remove the
+        snapshots. Gauges are discarded as they no longer describe a process.
+        """
+        archivePath = os.path.join(self.directory, ARCHIVE_FILE)
+        try:
+            with self._snapshots_lock(fcntl.LOCK_EX):
+                archived = _read_snapshot(archivePath)
+                for path in paths:
+                    # Another process may have archived it first
+                    for name, samples in _read_snapshot(path).items():
+                        metric = self.metrics.get(name)
+                        if metric is not None and metric.type != "gauge":
+                            metric.merge(archived.setdefault(name, {}), samples)
+                tmpPath = f"{archivePath}.tmp"
+                with open(tmpPath, "w") as f:
+                    json.dump(archived, f)
+                os.replace(tmpPath, archivePath)
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+        except OSError as err:
+            logger.warning(f"Unable to archive metrics in {self.directory}: {err}")
+
+
+def _read_snapshot(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Missing, or a worker may be replacing its file
+        return {}
+
+
+def _running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running as another user
+        return True
+    return True
+
+
+REGISTRY = Registry()
+# Metrics changed since the last write would otherwise be lost when a worker exits
+atexit.register(REGISTRY.flush)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=REGISTRY.forked)
+
+
+class Metric:
+    """
+    A base class for a named metric with a set of labels.
+
+    Samples are stored by the JSON encoded list of label values so that snapshots can
+    be written to and read from files.
+    """
+
+    type = ""
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelNames: list = (),
+        registry: Registry = REGISTRY,
+    ):
+        self.name = name
+        self.description = description
+        self.labelNames = tuple(labelNames)
+        self.samples = {}
+        self._registry = registry
+        self._lock = threading.Lock()
+        registry.register(self)
+
+    def _key(self, labels: dict) -> str:
+        return json.dumps([str(labels[labelName]) for labelName in self.labelNames])
+
+    def _labels(self, key: str) -> dict:
+        return dict(zip(self.labelNames, json.loads(key)))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return json.loads(json.dumps(self.samples))
+
+    def merge(self, merged: dict, samples: dict) -> None:
+        raise NotImplementedError
+
+    def render(self, samples: dict) -> list[str]:
+        return [
+            f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+            for key, value in sorted(samples.items())
+        ]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.samples[key] = self.samples.get(key, 0) + amount
+        self._registry.changed()
+
+    def merge(self, merged: dict, samples: dict) -> None:
+        for key, value in samples.items():
+            merged[key] = merged.get(key, 0) + value
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.samples[key] = {"value": value, "time": time.time()}
+        self._registry.changed()
+
+    def merge(self, merged: dict, samples: dict) -> None:
+        # The most recent value from any worker is the current value
+        for key, sample in samples.items():
+            if key not in merged or sample["time"] > merged[key]["time"]:
+                merged[key] = sample
+
+    def render(self, samples: dict) -> list[str]:
+        return super().render({k: sample["value"] for k, sample in samples.items()})
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelNames: list = (),
+        buckets: tuple = DEFAULT_BUCKETS,
+        registry: Registry = REGISTRY,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, description, labelNames, registry)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            sample = self.samples.setdefault(
+                key, {"buckets": [0] * len(self.buckets), "sum": 0, "count": 0}
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    sample["buckets"][i] += 1
+                    break
+            sample["sum"] += value
+            sample["count"] += 1
+        self._registry.changed()
+
+    def merge(self, merged: dict, samples: dict) -> None:
+        for key, sample in samples.items():
+            if key not in merged:
+                merged[key] = {
+                    "buckets": [0] * len(self.buckets),
+                    "sum": 0,
+                    "count": 0,
+                }
+            merged[key]["buckets"] = [
+                a + b for a, b in zip(merged[key]["buckets"], sample["buckets"])
+            ]
+            merged[key]["sum"] += sample["sum"]
+            merged[key]["count"] += sample["count"]
+
+    def render(self, samples: dict) -> list[str]:
+        lines = []
+        for key, sample in sorted(samples.items()):
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, count in zip(self.buckets, sample["buckets"]):
+                cumulative += count
+                bucketLabels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucketLabels} {cumulative}")
+            # Observations above the largest bucket are only included in the count
+            lines.append(
+                f"{self.name}_bucket{_format_labels({**labels, 'le': '+Inf'})}"
+                f" {sample['count']}"
+            )
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {sample['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {sample['count']}")
+        return lines
+
+
+API_REQUEST_SECONDS = Histogram(
+    "konnector_api_request_duration_seconds",
+    "Time taken by requests to platform APIs.",
+    ["platform", "method", "status"],
+)
+WEBHOOK_SECONDS = Histogram(
+    "konnector_webhook_duration_seconds",
+    "Time taken to process a received webhook from receipt to response.",
+    ["platform", "event"],
+)
+WEBHOOK_API_CALLS = Histogram(
+    "konnector_webhook_api_calls",
+    "Number of platform API requests made while processing a webhook.",
+    ["platform", "event"],
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20),
+)
+RATE_LIMIT_REMAINING = Gauge(
+    "konnector_rate_limit_remaining",
+    "Requests remaining in the platform's current rate limit window.",
+    ["platform"],
+)
+RATE_LIMIT_LIMIT = Gauge(
+    "konnector_rate_limit_limit",
+    "Requests allowed in each of the platform's rate limit windows.",
+    ["platform"],
+)
+OPERATION_API_CALLS = Histogram(
+    "konnector_operation_api_calls",
+    "Number of requests made to a platform's API by each logical operation.",
+    ["operation", "platform"],
+    buckets=(0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20),
+)
+JOB_SECONDS = Histogram(
+    "konnector_job_duration_seconds",
+    "Time taken by scheduled jobs.",
+    ["job"],
+)
+POLL_INTERVAL_SECONDS = Gauge(
+    "konnector_poll_interval_seconds",
+    "Seconds until an adaptive polling job next runs.",
+    ["job"],
+)
+POLL_API_CALLS_SAVED = Gauge(
+    "konnector_poll_api_calls_saved",
+    "Polling API requests avoided compared with polling at the base interval.",
+    ["job"],
+)
+CONCURRENCY_LIMIT = Gauge(
+    "konnector_concurrency_limit",
+    "Requests allowed in flight to a platform's API by its adaptive limiter.",
+    ["platform"],
+)
+LANE_QUEUE_SECONDS = Histogram(
+    "konnector_lane_queue_seconds",
+    "Time that requests to platform APIs waited for their priority lane.",
+    ["platform", "lane"],
+)
+OPLOG_PENDING = Gauge(
+    "konnector_oplog_pending",
+    "Writes queued for a platform while it is unavailable.",
+    ["platform"],
+)
+OPLOG_COMPACTED = Counter(
+    "konnector_oplog_compacted_total",
+    "Queued writes combined with an earlier write to the same task.",
+    ["platform"],
+)
+WEBHOOKS_REJECTED = Counter(
+    "konnector_webhooks_rejected_total",
+    "Webhooks rejected for a bad signature or an unrecognised user, event or list.",
+    ["platform", "reason"],
+)
+WEBHOOKS_STALE = Counter(
+    "konnector_webhooks_stale_total",
+    "Webhooks dropped as older than the last webhook received for the task.",
+    ["platform", "event"],
+)
+
+
+class ApiCallCounter:
+    """
+    Counts the requests sent to each platform's API during a logical operation.
+
+    ...
+
+    Attributes
+    ----------
+    operation : str
+        The name of the operation, e.g. "move_task" or "todoist:new_task".
+    calls : dict
+        The number of requests sent, indexed by platform name.
+    """
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+    def add(self, platform) -> None:
+        platformName = str(platform)
+        # Requests can be sent from several threads during one operation
+        with self._lock:
+            self.calls[platformName] = self.calls.get(platformName, 0) + 1
+
+
+# Counters for the operations currently running. Operations can be nested.
+_apiCallCounters = contextvars.ContextVar("apiCallCounters", default=())
+_webhookEvent = contextvars.ContextVar("webhookEvent", default="unknown")
+
+
+@contextlib.contextmanager
+def count_api_calls(operation: str):
+    """
+    Count the API requests sent within the enclosed code and record them against
+    the operation. Requests also count towards any enclosing operations.
+    """
+    counter = ApiCallCounter(operation)
+    token = _apiCallCounters.set(_apiCallCounters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _apiCallCounters.reset(token)
+        for platformName, calls in counter.calls.items():
+            OPERATION_API_CALLS.observe(
+                calls, operation=counter.operation, platform=platformName
+            )
+
+
+def counted(func):
+    """Decorate a function to count the API requests it sends as an operation."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with count_api_calls(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def observe_api_request(platform, method: str, status, seconds: float) -> None:
+    """Record a request sent to a platform's API."""
+    API_REQUEST_SECONDS.observe(
+        seconds, platform=platform, method=method, status=status
+    )
+    for counter in _apiCallCounters.get():
+        counter.add(platform)
+
+
+def observe_rate_limit(platform, headers) -> None:
+    """Record the rate limit headroom reported in an API response's headers."""
+    remaining = headers.get("X-RateLimit-Remaining")
+    if remaining is not None:
+        RATE_LIMIT_REMAINING.set(float(remaining), platform=platform)
+    limit = headers.get("X-RateLimit-Limit")
+    if limit is not None:
+        RATE_LIMIT_LIMIT.set(float(limit), platform=platform)
+
+
+def set_webhook_event(event: str) -> None:
+    """Label the webhook currently being processed with its event."""
+    _webhookEvent.set(event)
+
+
+def timed_webhook(platform):
+    """
+    Decorate a webhook view to record how long it takes and how many API requests
+    are sent while processing it. Platform.check_request sets the event label and
+    the requests are counted as the operation "<platform>:<event>".
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _webhookEvent.set("unknown")
+            start = time.perf_counter()
+            try:
+                with count_api_calls(f"{platform}:unknown") as counter:
+                    try:
+                        return func(*args, **kwargs)
+                    finally:
+                        event = _webhookEvent.get()
+                        # Named once the event is known, before the calls are recorded
+                        counter.operation = f"{platform}:{event}"
+                        WEBHOOK_SECONDS.observe(
+                            time.perf_counter() - start, platform=platform, event=event
+                        )
+                        WEBHOOK_API_CALLS.observe(
+                            counter.total, platform=platform, event=event
+                        )
+            finally:
+                _webhookEvent.reset(token)
+
+        return wrapper
+
+    return decorator
+
+
+def timed_job(func):
+    """Decorate a scheduled job to record how long it takes."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with count_api_calls(func.__name__):
+                return func(*args, **kwargs)
+        finally:
+            JOB_SECONDS.observe(time.perf_counter() - start, job=func.__name__)
+            REGISTRY.flush()
+
+    return wrapper
+
+
+def render() -> str:
+    return REGISTRY.render()
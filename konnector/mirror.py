@@ -0,0 +1,309 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import json
+import logging
+import sqlite3
+import time
+
+from konnector import limiter, store
+
+logger = logging.getLogger("gunicorn.error")
+
+store.register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS mirror_tasks (
+        platform TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        list TEXT,
+        status TEXT,
+        due_date INTEGER,
+        sub_task INTEGER,
+        completed INTEGER,
+        data TEXT NOT NULL,
+        updated REAL NOT NULL,
+        PRIMARY KEY (platform, task_id)
+    );
+    CREATE INDEX IF NOT EXISTS mirror_tasks_list ON mirror_tasks (platform, list);
+    CREATE INDEX IF NOT EXISTS mirror_tasks_status ON mirror_tasks (platform, status);
+    CREATE INDEX IF NOT EXISTS mirror_tasks_due_date ON mirror_tasks (due_date);
+    CREATE TABLE IF NOT EXISTS mirror_ids (
+        platform TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        id_platform TEXT NOT NULL,
+        id TEXT NOT NULL,
+        PRIMARY KEY (platform, task_id, id_platform)
+    );
+    CREATE INDEX IF NOT EXISTS mirror_ids_id ON mirror_ids (id_platform, id);
+    CREATE TABLE IF NOT EXISTS mirror_parents (
+        platform TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        parent_id TEXT,
+        PRIMARY KEY (platform, task_id)
+    );
+    CREATE INDEX IF NOT EXISTS mirror_parents_parent ON mirror_parents (
+        platform, parent_id
+    );
+    """
+)
+
+# Platforms that tasks in the mirror refer to, indexed by name. Each platform
+# registers itself when it is created, as tasks may have been mirrored by another
+# process.
+_platforms = {}
+
+
+def register_platform(platform) -> None:
+    """Allow tasks read from the mirror to refer to a platform by its name."""
+    _platforms[str(platform)] = platform
+
+
+def _save(conn: sqlite3.Connection, platform, task) -> None:
+    taskId = task.get_id(platform)
+    if taskId is None:
+        return
+    completed = task.get_completed(platform)
+    subTask = getattr(task, "subTask", None)
+    conn.execute(
+        "INSERT OR REPLACE INTO mirror_tasks (platform, task_id, list, status,"
+        " due_date, sub_task, completed, data, updated)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            str(platform),
+            taskId,
+            task.get_list(platform),
+            getattr(task, "status", None),
+            task.get_property("due_date"),
+            None if subTask is None else int(subTask),
+            None if completed is None else int(completed),
+            json.dumps(task.to_dict()),
+            time.time(),
+        ),
+    )
+    conn.execute(
+        "DELETE FROM mirror_ids WHERE platform = ? AND task_id = ?",
+        (str(platform), taskId),
+    )
+    conn.executemany(
+        "INSERT INTO mirror_ids (platform, task_id, id_platform, id)"
+        " VALUES (?, ?, ?, ?)",
+        [
+            (str(platform), taskId, str(idPlatform), str(id))
+            for idPlatform, id in task.get_all_ids().items()
+        ],
+    )
+    # Parents are only known for tasks from platforms with subtasks. Top level tasks
+    # have no parent.
+    if hasattr(task, "parentId"):
+        conn.execute(
+            "INSERT OR REPLACE INTO mirror_parents (platform, task_id, parent_id)"
+            " VALUES (?, ?, ?)",
+            (str(platform), taskId, task.parentId),
+        )
+
+
+def _transaction(func, *args) -> None:
+    """Run a function with a connection in a transaction. The mirror is best effort."""
+    try:
+        conn = store.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            func(conn, *args)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    except sqlite3.Error as err:
+        logger.warning(f"Unable to update the task mirror: {err}")
+
+
+def save(platform, task) -> None:
+    """Store the latest state of a task on a platform."""
+    _transaction(_save, platform, task)
+
+
+def save_many(platform, tasks: list) -> None:
+    """Store the latest state of several tasks on a platform at once."""
+
+    def save_tasks(conn):
+        for task in tasks:
+            _save(conn, platform, task)
+
+    _transaction(save_tasks)
+
+
+def save_all(platform, tasks: list, listName: str = None) -> None:
+    """
+    Store all tasks retrieved from a platform list, or from the whole platform if no
+    list is given. Mirrored tasks that are no longer there are removed.
+    """
+
+    def save_tasks(conn):
+        if listName is None:
+            conn.execute(
+                "DELETE FROM mirror_tasks WHERE platform = ?", (str(platform),)
+            )
+        else:
+            conn.execute(
+                "DELETE FROM mirror_tasks WHERE platform = ? AND list = ?",
+                (str(platform), listName),
+            )
+        for task in tasks:
+            _save(conn, platform, task)
+        # IDs and parents of tasks that were removed
+        for table in ("mirror_ids", "mirror_parents"):
+            conn.execute(
+                f"DELETE FROM {table} WHERE platform = ? AND task_id NOT IN"
+                " (SELECT task_id FROM mirror_tasks WHERE platform = ?)",
+                (str(platform), str(platform)),
+            )
+
+    _transaction(save_tasks)
+
+
+def remove(platform, taskId: str) -> None:
+    """Remove a task that was deleted from a platform."""
+
+    def remove_task(conn):
+        for table in ("mirror_tasks", "mirror_ids", "mirror_parents"):
+            conn.execute(
+                f"DELETE FROM {table} WHERE platform = ? AND task_id = ?",
+                (str(platform), str(taskId)),
+            )
+
+    _transaction(remove_task)
+
+
+def set_completed(platform, taskId: str, completed: bool = True) -> None:
+    def update(conn):
+        conn.execute(
+            "UPDATE mirror_tasks SET completed = ?, updated = ? WHERE platform = ?"
+            " AND task_id = ?",
+            (int(completed), time.time(), str(platform), str(taskId)),
+        )
+
+    _transaction(update)
+
+
+def _to_task(row):
+    # Imported here as konnector.konnector imports this module
+    from konnector.konnector import Task
+
+    task = Task.from_dict(json.loads(row["data"]), _platforms)
+    if row["completed"] is not None and row["platform"] in _platforms:
+        task.completed[_platforms[row["platform"]]] = bool(row["completed"])
+    return task
+
+
+def get(platform, taskId: str):
+    """Return a mirrored task, or None if it isn't in the mirror."""
+    row = store.execute(
+        "SELECT * FROM mirror_tasks WHERE platform = ? AND task_id = ?",
+        (str(platform), str(taskId)),
+    ).fetchone()
+    return _to_task(row) if row is not None else None
+
+
+def get_parent(platform, taskId: str) -> tuple[bool, str]:
+    """
+    Look up whether a mirrored task is a subtask without calling the platform's API.
+
+    Returns:
+        Whether the task's parent is known, and the parent's ID, or None if the task
+            is a top level task.
+    """
+    row = store.execute(
+        "SELECT parent_id FROM mirror_parents WHERE platform = ? AND task_id = ?",
+        (str(platform), str(taskId)),
+    ).fetchone()
+    return (False, None) if row is None else (True, row["parent_id"])
+
+
+def find(
+    platform,
+    listName: str = None,
+    status: str = None,
+    ids: dict = None,
+    dueBefore: int = None,
+    completed: bool = None,
+    parentId: str = None,
+) -> list:
+    """
+    Query mirrored tasks on a platform.
+
+    Arguments:
+        platform: The platform that the tasks are on.
+        listName: Only tasks in this list.
+        status: Only tasks with this status.
+        ids: Only tasks with any of these IDs, indexed by platform. E.g.
+            find(todoist, "next_actions", ids={clickup: clickupId}) finds the Todoist
+            next action linked to a Clickup task.
+        dueBefore: Only tasks due before this time (ms since the epoch).
+        completed: Only completed or uncompleted tasks.
+        parentId: Only subtasks of this task.
+
+    Returns:
+        A list of Task objects
+    """
+    conditions = ["t.platform = ?"]
+    params = [str(platform)]
+    if listName is not None:
+        conditions.append("t.list = ?")
+        params.append(listName)
+    if status is not None:
+        conditions.append("t.status = ?")
+        params.append(status)
+    if dueBefore is not None:
+        conditions.append("t.due_date < ?")
+        params.append(int(dueBefore))
+    if completed is not None:
+        conditions.append("COALESCE(t.completed, 0) = ?")
+        params.append(int(completed))
+    if ids:
+        idConditions = " OR ".join(["(i.id_platform = ? AND i.id = ?)"] * len(ids))
+        conditions.append(
+            "EXISTS (SELECT 1 FROM mirror_ids i WHERE i.platform = t.platform"
+            f" AND i.task_id = t.task_id AND ({idConditions}))"
+        )
+        for idPlatform, id in ids.items():
+            params.extend([str(idPlatform), str(id)])
+    if parentId is not None:
+        conditions.append(
+            "t.task_id IN (SELECT p.task_id FROM mirror_parents p WHERE p.platform ="
+            " t.platform AND p.parent_id = ?)"
+        )
+        params.append(str(parentId))
+    rows = store.execute(
+        f"SELECT * FROM mirror_tasks t WHERE {' AND '.join(conditions)}", params
+    ).fetchall()
+    return [_to_task(row) for row in rows]
+
+
+def rebuild(platformLists: dict) -> int:
+    """
+    Replace the mirror with all tasks in a set of lists, e.g. after the mirror was
+    lost or the lists changed. Tasks are saved as they are retrieved.
+
+    Arguments:
+        platformLists: Lists to retrieve, indexed by platform.
+
+    Returns:
+        The number of tasks mirrored.
+    """
+    store.execute("DELETE FROM mirror_tasks")
+    store.execute("DELETE FROM mirror_ids")
+    store.execute("DELETE FROM mirror_parents")
+    # Lists are retrieved concurrently, as fast as each platform allows
+    lists = [
+        (platform, listName)
+        for platform, listNames in platformLists.items()
+        for listName in listNames
+    ]
+    counts = limiter.fan_out(
+        lambda platformList: sum(
+            1 for _ in platformList[0].iter_tasks(platformList[1])
+        ),
+        lists,
+    )
+    count = sum(counts)
+    logger.info(f"Task mirror rebuilt with {count} tasks")
+    return count
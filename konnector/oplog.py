@@ -0,0 +1,329 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import json
+import logging
+import sqlite3
+import time
+
+import requests
+
+from konnector import locks, metrics, store
+
+logger = logging.getLogger("gunicorn.error")
+
+# Seconds a platform is treated as unavailable after a failed request. Doubles with
+# each consecutive failure, up to the maximum.
+UNAVAILABLE_SECONDS = 30.0
+MAX_UNAVAILABLE_SECONDS = 600.0
+# Queued writes sent per second once a platform is available again
+FLUSH_RATE = 2.0
+# Queued writes sent each time the log is flushed
+FLUSH_LIMIT = 50
+
+store.register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS platform_health (
+        platform TEXT PRIMARY KEY,
+        unavailable_until REAL NOT NULL,
+        failures INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS oplog (
+        platform TEXT NOT NULL,
+        task_key TEXT NOT NULL,
+        op TEXT,
+        complete INTEGER NOT NULL DEFAULT 0,
+        list TEXT,
+        task TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        created REAL NOT NULL,
+        PRIMARY KEY (platform, task_key)
+    );
+    CREATE INDEX IF NOT EXISTS oplog_created ON oplog (platform, created);
+    """
+)
+
+
+def is_transient(err: BaseException) -> bool:
+    """
+    Check if an error, or the error it was raised from, means that the platform is
+    temporarily unavailable: no response, a server error or rate limiting.
+    """
+    while err is not None:
+        if isinstance(
+            err, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        ):
+            return True
+        if isinstance(err, requests.exceptions.HTTPError) and err.response is not None:
+            return err.response.status_code >= 500 or err.response.status_code == 429
+        err = err.__cause__ or err.__context__
+    return False
+
+
+def mark_unavailable(platform) -> None:
+    """
+    Treat a platform as unavailable after a transient error. Called by the platform
+    for any failed request.
+    """
+    try:
+        row = store.execute(
+            "SELECT failures FROM platform_health WHERE platform = ?", (str(platform),)
+        ).fetchone()
+        failures = (row["failures"] if row is not None else 0) + 1
+        cooldown = min(
+            UNAVAILABLE_SECONDS * 2 ** (failures - 1), MAX_UNAVAILABLE_SECONDS
+        )
+        store.execute(
+            "INSERT OR REPLACE INTO platform_health VALUES (?, ?, ?)",
+            (str(platform), time.time() + cooldown, failures),
+        )
+    except sqlite3.Error as err:
+        logger.warning(f"Unable to record {platform} health: {err}")
+        return
+    logger.warning(f"{platform} is unavailable. Writes are queued for {cooldown}s.")
+
+
+def mark_available(platform) -> None:
+    store.execute("DELETE FROM platform_health WHERE platform = ?", (str(platform),))
+
+
+def is_available(platform) -> bool:
+    row = store.execute(
+        "SELECT unavailable_until FROM platform_health WHERE platform = ?",
+        (str(platform),),
+    ).fetchone()
+    return row is None or row["unavailable_until"] <= time.time()
+
+
+def task_key(platform, task) -> str:
+    """
+    Identify a task in the log. Tasks that don't exist on the platform yet are
+    identified by their IDs on other platforms, so that later writes from the same
+    source task are combined with the queued create.
+    """
+    if task.get_id(platform) is not None:
+        return f"{platform}:{task.get_id(platform)}"
+    return ",".join(locks.task_keys(task))
+
+
+def _update_pending(conn: sqlite3.Connection, platform) -> None:
+    pending = conn.execute(
+        "SELECT COUNT(*) FROM oplog WHERE platform = ?", (str(platform),)
+    ).fetchone()[0]
+    metrics.OPLOG_PENDING.set(pending, platform=platform)
+
+
+def enqueue(platform, op: str, task, listName: str = None) -> None:
+    """
+    Queue a write to a platform, combining it with any write already queued for the
+    same task so that only the final state is sent:
+        create + update -> create with the latest properties
+        create + delete -> nothing
+        update + update -> update with the latest properties
+        update + delete -> delete
+        anything + complete -> the same write, then complete
+
+    Arguments:
+        platform: The platform to write to.
+        op: "create", "update", "complete" or "delete".
+        task: The task to write.
+        listName: The list to create the task in.
+    """
+    key = task_key(platform, task)
+    data = json.dumps(task.to_dict())
+    conn = store.connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        seq = conn.execute("SELECT COALESCE(MAX(seq), 0) + 1 FROM oplog").fetchone()[0]
+        row = conn.execute(
+            "SELECT op FROM oplog WHERE platform = ? AND task_key = ?",
+            (str(platform), key),
+        ).fetchone()
+        if row is None:
+            conn.execute(
+                "INSERT INTO oplog VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    str(platform),
+                    key,
+                    None if op == "complete" else op,
+                    int(op == "complete"),
+                    listName,
+                    data,
+                    seq,
+                    time.time(),
+                ),
+            )
+        else:
+            metrics.OPLOG_COMPACTED.inc(platform=platform)
+            if row["op"] == "delete":
+                pass
+            elif op == "delete" and row["op"] == "create":
+                conn.execute(
+                    "DELETE FROM oplog WHERE platform = ? AND task_key = ?",
+                    (str(platform), key),
+                )
+            elif op == "complete":
+                conn.execute(
+                    "UPDATE oplog SET complete = 1, seq = ? WHERE platform = ?"
+                    " AND task_key = ?",
+                    (seq, str(platform), key),
+                )
+            else:
+                newOp = "create" if row["op"] == "create" else op
+                conn.execute(
+                    "UPDATE oplog SET op = ?, complete = complete * ?,"
+                    " list = COALESCE(?, list), task = ?, seq = ?"
+                    " WHERE platform = ? AND task_key = ?",
+                    (
+                        newOp,
+                        int(op != "delete"),
+                        listName,
+                        data,
+                        seq,
+                        str(platform),
+                        key,
+                    ),
+                )
+        _update_pending(conn, platform)
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    logger.info(f"Queued {op} of {platform} task {key}: {task}")
+
+
+def _is_queued(platform, key: str) -> bool:
+    return (
+        store.execute(
+            "SELECT 1 FROM oplog WHERE platform = ? AND task_key = ?",
+            (str(platform), key),
+        ).fetchone()
+        is not None
+    )
+
+
+def _perform(platform, op: str, task, listName: str = None, complete: bool = False):
+    if op == "create":
+        result = platform.create_task(task, listName)
+        task.add_id(platform, result.get_id(platform))
+    elif op == "update":
+        result = platform.update_task(task)
+    elif op == "complete":
+        result = platform.complete_task(task)
+    elif op == "delete":
+        result = platform.delete_task(task)
+    else:
+        result = True
+    if complete:
+        platform.complete_task(task)
+    return result
+
+
+def write(platform, op: str, task, listName: str = None):
+    """
+    Create, update, complete or delete a task on a platform. The write is queued if
+    the platform is unavailable, if it fails because the platform is unavailable, or
+    if an earlier write to the task is still queued.
+
+    Returns:
+        The result of the write: the created task, or if an update, completion or
+        deletion was successful. None for a queued create and True for other queued
+        writes.
+    """
+    if is_available(platform) and not _is_queued(platform, task_key(platform, task)):
+        try:
+            return _perform(platform, op, task, listName)
+        except Exception as e:
+            # The platform was marked as unavailable when the request failed
+            if not is_transient(e):
+                raise
+    enqueue(platform, op, task, listName)
+    return None if op == "create" else True
+
+
+def flush(platforms: list, rate: float = FLUSH_RATE, limit: int = FLUSH_LIMIT) -> int:
+    """
+    Send queued writes, oldest first, to the platforms that are available.
+
+    Arguments:
+        platforms: The platforms to send writes to.
+        rate: The most writes sent per second.
+        limit: The most writes sent in total.
+
+    Returns:
+        The number of writes sent.
+    """
+    # Imported here as konnector.konnector imports this module
+    from konnector.konnector import Task
+
+    platformNames = {str(platform): platform for platform in platforms}
+    sent = 0
+    for platform in platforms:
+        if not is_available(platform):
+            continue
+        rows = store.execute(
+            "SELECT * FROM oplog WHERE platform = ? ORDER BY created LIMIT ?",
+            (str(platform), limit - sent),
+        ).fetchall()
+        for row in rows:
+            task = Task.from_dict(json.loads(row["task"]), platformNames)
+            with locks.lock_task(task):
+                try:
+                    _send_queued(platform, row, task)
+                    logger.info(f"Sent queued {row['op']} of {platform} task {task}")
+                except Exception as e:
+                    if is_transient(e):
+                        break
+                    logger.warning(f"Dropping queued write to {platform}: {e}")
+                _remove_sent(platform, row, task)
+            sent += 1
+            time.sleep(1 / rate)
+        else:
+            # The platform has recovered
+            mark_available(platform)
+        _update_pending(store.connection(), platform)
+    return sent
+
+
+def _send_queued(platform, row: sqlite3.Row, task) -> None:
+    op = row["op"]
+    if op == "create":
+        # The task may have been created before the platform failed
+        foundTask = platform.check_if_task_exists(task, row["list"], returnTask=True)
+        if foundTask is not False:
+            task.add_id(platform, foundTask.get_id(platform))
+            op = "update"
+    _perform(platform, op, task, row["list"], bool(row["complete"]))
+
+
+def _remove_sent(platform, row: sqlite3.Row, task) -> None:
+    """
+    Remove a write once sent. If another write to the task was queued while sending,
+    it is kept, as an update if the task has now been created.
+    """
+    conn = store.connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "DELETE FROM oplog WHERE platform = ? AND task_key = ? AND seq = ?",
+            (str(platform), row["task_key"], row["seq"]),
+        )
+        newer = conn.execute(
+            "SELECT op, task FROM oplog WHERE platform = ? AND task_key = ?",
+            (str(platform), row["task_key"]),
+        ).fetchone()
+        if newer is not None and task.get_id(platform) is not None:
+            data = json.loads(newer["task"])
+            data["ids"][str(platform)] = task.get_id(platform)
+            conn.execute(
+                "UPDATE oplog SET op = ?, task = ? WHERE platform = ? AND task_key = ?",
+                (
+                    "update" if newer["op"] == "create" else newer["op"],
+                    json.dumps(data),
+                    str(platform),
+                    row["task_key"],
+                ),
+            )
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
@@ -13,31 +13,34 @@ load_dotenv()
 
 class Clickup(ClickupPlatform):
     name = "clickup"
-    lists = ({"inbox": "38260663", "food_log": "176574082"},)
-    accessToken = (os.environ["CLICKUP_TOKEN"],)
-    clientId = (os.environ["CLICKUP_WEBHOOK_ID"],)
-    secret = (os.environ["CLICKUP_WEBHOOK_SECRET"],)
-    userIds = (["2511898", "0", "-1"],)  # -1 is Clickbot
-    workspace = ("2193273",)
+    lists = {"inbox": "38260663", "food_log": "176574082"}
+    userIds = ["2511898", "0", "-1"]  # -1 is Clickbot
+    workspace = "2193273"
     newTaskLists = None
-    folder = ("17398998",)
-    listStatuses = (
-        {
-            "inbox": ["next action", "complete"],
-        },
-    )
+    folder = "17398998"
+    listStatuses = {
+        "inbox": ["next action", "complete"],
+    }
 
     customFieldIdTodoist = "550a93a0-6978-4664-be6d-777cc0d7aff6"
     customFieldIdUrgency = ""
 
-    def __init__(self, appEndpoint: str, platformEndpoint: str, todoist: Todoist):
+    def __init__(
+        self,
+        appEndpoint: str,
+        platformEndpoint: str,
+        todoist: Todoist,
+        environ: dict = None,
+    ):
+        # Credentials are read when the platform is created, not when it is imported
+        environ = os.environ if environ is None else environ
         super().__init__(
             appEndpoint,
             platformEndpoint,
             lists=self.lists,
-            accessToken=self.accessToken,
-            clientId=self.clientId,
-            secret=self.secret,
+            accessToken=environ["CLICKUP_TOKEN"],
+            clientId=environ["CLICKUP_WEBHOOK_ID"],
+            secret=environ["CLICKUP_WEBHOOK_SECRET"],
             userIds=self.userIds,
             workspace=self.workspace,
             newTaskLists=self.newTaskLists,
@@ -0,0 +1,198 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import logging
+import random
+import sqlite3
+import time
+
+from konnector import metrics, store
+
+logger = logging.getLogger("gunicorn.error")
+
+store.register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS webhook_freshness (
+        platform TEXT NOT NULL,
+        list TEXT NOT NULL,
+        last_webhook REAL,
+        last_failure REAL,
+        PRIMARY KEY (platform, list)
+    );
+    """
+)
+
+
+def record_webhook(platform, listName: str, failed: bool = False) -> None:
+    """
+    Record that a verified webhook was received for a list, or that processing it
+    failed. Webhooks can arrive at any worker, so this is shared through the store.
+    """
+    column = "last_failure" if failed else "last_webhook"
+    try:
+        store.execute(
+            f"INSERT INTO webhook_freshness (platform, list, {column}) VALUES (?, ?, ?)"
+            f" ON CONFLICT (platform, list) DO UPDATE SET {column} = excluded.{column}",
+            (str(platform), str(listName), time.time()),
+        )
+    except sqlite3.Error as err:
+        logger.warning(f"Unable to record {platform} webhook freshness: {err}")
+
+
+def interval_trigger(seconds: float, **kwargs):
+    """
+    Create an APScheduler interval trigger. Passing a trigger object rather than the
+    name "interval" skips APScheduler's slow plugin lookup, and APScheduler is only
+    imported by the process that runs scheduled jobs.
+    """
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    return IntervalTrigger(seconds=seconds, **kwargs)
+
+
+class AdaptivePoller:
+    """
+    Runs a scheduled job that polls for changes that webhooks should have delivered,
+    at an interval that adapts to how well webhooks are being delivered.
+
+    The interval is stretched while webhooks are arriving from the platform and
+    nothing is missed. It drops to the minimum when the poll finds something a
+    webhook missed or processing a webhook for a polled list failed. With no
+    webhooks at all, it returns to the base interval.
+
+    ...
+
+    Attributes
+    ----------
+    name : str
+        The name of the scheduled job.
+    func : callable
+        The poll. Returns the number of items found that webhooks should have
+        handled.
+    platform : Platform
+        The platform whose webhooks the poll backs up.
+    lists : list
+        Names of the lists polled. Each list is assumed to need one API request.
+    baseInterval : float
+        Seconds between polls without information about webhooks.
+    minInterval : float
+        The shortest interval, used when webhooks are being missed.
+    maxInterval : float
+        The longest interval, reached while webhooks are healthy.
+    backoff : float
+        How much the interval is multiplied or divided by at each step.
+    jitter : float
+        The fraction that each interval is randomly varied by, so that polls don't
+        line up with bursts of webhooks.
+    interval : float
+        The current interval, before jitter.
+    apiCallsSaved : float
+        Polling API requests avoided compared with polling at the base interval.
+        Negative when polling more often.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func,
+        platform,
+        lists: list,
+        baseInterval: float,
+        minInterval: float,
+        maxInterval: float,
+        backoff: float = 2.0,
+        jitter: float = 0.1,
+    ):
+        self.name = name
+        self.func = func
+        self.platform = platform
+        self.lists = list(lists)
+        self.baseInterval = baseInterval
+        self.minInterval = minInterval
+        self.maxInterval = maxInterval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.interval = baseInterval
+        self.apiCallsSaved = 0.0
+        self.scheduler = None
+        self._lastPoll = time.time()
+
+    def __str__(self) -> str:
+        return self.name
+
+    def webhook_health(self, since: float) -> tuple[bool, bool]:
+        """
+        Check webhooks received from the platform since a time.
+
+        Returns:
+            If any webhooks were received.
+            If processing a webhook for a polled list failed.
+        """
+        try:
+            rows = store.execute(
+                "SELECT list, last_webhook, last_failure FROM webhook_freshness"
+                " WHERE platform = ?",
+                (str(self.platform),),
+            ).fetchall()
+        except sqlite3.Error as err:
+            logger.warning(f"Unable to check {self.platform} webhook freshness: {err}")
+            return False, True
+        flowing = any((row["last_webhook"] or 0) >= since for row in rows)
+        failing = any(
+            row["list"] in self.lists and (row["last_failure"] or 0) >= since
+            for row in rows
+        )
+        return flowing, failing
+
+    def next_interval(self, found: int, since: float) -> float:
+        """
+        Calculate the interval before the next poll.
+
+        Arguments:
+            found: Items the last poll found that webhooks missed. None if it failed.
+            since: When the previous poll started.
+        """
+        flowing, failing = self.webhook_health(since)
+        if found is None or found > 0 or failing:
+            logger.info(
+                f"{self}: webhooks missed {found} items or failed. Polling more often."
+            )
+            return self.minInterval
+        if flowing:
+            return min(self.interval * self.backoff, self.maxInterval)
+        if self.interval > self.baseInterval:
+            return max(self.interval / self.backoff, self.baseInterval)
+        return self.baseInterval
+
+    def poll(self) -> float:
+        """
+        Run the poll and adapt the interval.
+
+        Returns:
+            Seconds until the next poll, including jitter.
+        """
+        since = self._lastPoll
+        self._lastPoll = time.time()
+        found = None
+        try:
+            found = self.func()
+        finally:
+            self.interval = self.next_interval(found, since)
+            delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+            self.apiCallsSaved += (delay / self.baseInterval - 1) * len(self.lists)
+            metrics.POLL_INTERVAL_SECONDS.set(delay, job=self.name)
+            metrics.POLL_API_CALLS_SAVED.set(
+                round(self.apiCallsSaved, 2), job=self.name
+            )
+            logger.info(f"{self}: next poll in {delay:.0f}s")
+            if self.scheduler is not None:
+                self.scheduler.reschedule_job(
+                    self.name, trigger=interval_trigger(delay)
+                )
+        return delay
+
+    def add_to(self, scheduler) -> None:
+        """Schedule the poll with an APScheduler scheduler."""
+        self.scheduler = scheduler
+        scheduler.add_job(
+            func=self.poll, trigger=interval_trigger(self.interval), id=self.name
+        )
@@ -0,0 +1,51 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("gunicorn.error")
+
+# Verified webhooks are appended to this file, one JSON object per line. Recording is
+# disabled when it is empty.
+RECORD_FILE = os.getenv("RECORD_WEBHOOKS", "")
+# Headers that are not recorded. Signatures are recalculated when replaying.
+IGNORED_HEADERS = {"host", "content-length", "connection"}
+
+_recordLock = threading.Lock()
+
+
+def record_webhook(platform, request) -> None:
+    """
+    Append a webhook request that has passed its HMAC check to the record file.
+    The platform's signature header is not recorded.
+
+    Arguments:
+        platform: The platform that sent the webhook.
+        request: The webhook's HTTP request object.
+    """
+    if not RECORD_FILE:
+        return
+
+    ignored = IGNORED_HEADERS | {platform.signatureKey.lower()}
+    line = json.dumps(
+        {
+            "time": time.time(),
+            "platform": platform.name,
+            "path": request.path,
+            "headers": {
+                key: value
+                for key, value in request.headers.items()
+                if key.lower() not in ignored
+            },
+            "body": request.get_data(as_text=True),
+        }
+    )
+    try:
+        # Workers append whole lines so that records from each worker don't mix.
+        with _recordLock, open(RECORD_FILE, "a") as f:
+            f.write(line + "\n")
+    except OSError as err:
+        logger.warning(f"Unable to record webhook to {RECORD_FILE}: {err}")
@@ -0,0 +1,218 @@
+"""
+Replay recorded webhooks against a Konnector instance.
+
+Webhooks recorded by setting RECORD_WEBHOOKS are re-signed with the configured
+secrets (TODOIST_SECRET and CLICKUP_WEBHOOK_SECRET) and sent with their recorded
+timing, which can be compressed, replaced with a fixed rate or grouped into bursts.
+
+Usage: python -m konnector.replay webhooks.ndjson --url http://127.0.0.1:8080 --speed 10
+"""
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import argparse
+import concurrent.futures
+import json
+import os
+import time
+
+import requests
+from dotenv import load_dotenv
+
+
+def load_webhooks(path: str) -> list[dict]:
+    """Read webhooks recorded by konnector.recorder, oldest first."""
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda record: record["time"])
+
+
+def build_signers(todoistSecret: str, clickupSecret: str) -> dict:
+    """
+    Create platforms that sign webhooks, indexed by platform name.
+    Only the secret is needed to sign a webhook.
+    """
+    # Imported here as the platforms need TIMEZONE, which may be set from .env
+    from konnector.todoist import Todoist
+    from konnector.clickup import Clickup
+
+    todoist = Todoist("", "", {}, clientId="", secret=todoistSecret, state="")
+    clickup = Clickup(
+        "", "", {}, "", clientId="", secret=clickupSecret, userIds=[], workspace=""
+    )
+    return {platform.name: platform for platform in (todoist, clickup)}
+
+
+def sign(record: dict, signers: dict) -> tuple[bytes, dict]:
+    """
+    Re-sign a recorded webhook.
+
+    Returns:
+        The request body and headers, including the platform's signature.
+    """
+    platform = signers[record["platform"]]
+    body = record["body"].encode("utf-8")
+    headers = {**record["headers"], platform.signatureKey: platform.sign_webhook(body)}
+    return body, headers
+
+
+def schedule(
+    records: list[dict],
+    rate: float = None,
+    speed: float = 1.0,
+    maxGap: float = None,
+    burst: int = 1,
+) -> list[float]:
+    """
+    Calculate when to send each webhook, in seconds from the start of the replay.
+
+    Arguments:
+        records: Recorded webhooks, oldest first.
+        rate: Send webhooks at this many per second instead of their recorded times.
+        speed: Divides the time between recorded webhooks, e.g. 10 replays 10x faster.
+        maxGap: The longest wait between two webhooks, in seconds.
+        burst: Send webhooks in groups of this size, at the time of the first in each
+            group.
+
+    Returns:
+        The time to send each webhook.
+    """
+    offsets = []
+    offset = 0.0
+    for i, record in enumerate(records):
+        if i > 0:
+            if rate is not None:
+                gap = 1 / rate
+            else:
+                gap = max(record["time"] - records[i - 1]["time"], 0) / speed
+            if maxGap is not None:
+                gap = min(gap, maxGap)
+            offset += gap
+        offsets.append(offset)
+    return [offsets[i - i % burst] for i in range(len(offsets))]
+
+
+def percentile(sortedValues: list, percent: float) -> float:
+    if not sortedValues:
+        return None
+    index = min(len(sortedValues) - 1, int(round(percent / 100 * len(sortedValues))))
+    return sortedValues[index]
+
+
+def replay(
+    records: list[dict],
+    url: str,
+    signers: dict,
+    offsets: list[float],
+    concurrency: int = 8,
+    timeout: float = 30,
+) -> dict:
+    """
+    Send webhooks to Konnector at the scheduled times.
+
+    Arguments:
+        records: Recorded webhooks.
+        url: The base URL of the Konnector instance. Recorded paths are added to it.
+        signers: Platforms to sign webhooks with, indexed by name.
+        offsets: When to send each webhook, in seconds from the start.
+        concurrency: The most webhooks that can be waiting for a response at once.
+        timeout: Seconds to wait for each response.
+
+    Returns:
+        A summary of the responses, latencies and how far sending fell behind the
+        schedule.
+    """
+    session = requests.Session()
+    session.mount(url, requests.adapters.HTTPAdapter(pool_maxsize=max(concurrency, 10)))
+
+    def send(record: dict, scheduled: float) -> tuple[str, float, float]:
+        body, headers = sign(record, signers)
+        start = time.perf_counter()
+        try:
+            response = session.post(
+                url + record["path"], data=body, headers=headers, timeout=timeout
+            )
+        except requests.exceptions.RequestException:
+            outcome = "connection_error"
+        else:
+            if response.status_code >= 300:
+                outcome = f"http_{response.status_code}"
+            elif b"success" in response.content:
+                outcome = "success"
+            else:
+                # Konnector accepts webhooks that fail processing
+                outcome = "failed"
+        return outcome, time.perf_counter() - start, start - scheduled
+
+    futures = []
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        for record, offset in zip(records, offsets):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(executor.submit(send, record, start + offset))
+    duration = time.perf_counter() - start
+
+    outcomes = {}
+    latencies = []
+    maxLag = 0.0
+    for future in futures:
+        outcome, latency, lag = future.result()
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        latencies.append(latency)
+        maxLag = max(maxLag, lag)
+    latencies.sort()
+    return {
+        "webhooks": len(records),
+        "duration_s": round(duration, 3),
+        "webhooks_per_sec": round(len(records) / duration, 2) if duration else None,
+        "outcomes": outcomes,
+        "latency_ms": {
+            f"p{p}": round(percentile(latencies, p) * 1000, 2)
+            for p in (50, 95, 99)
+            if latencies
+        },
+        "max_lag_ms": round(maxLag * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("file", help="NDJSON file of recorded webhooks")
+    parser.add_argument("--url", default="http://127.0.0.1:8080")
+    parser.add_argument(
+        "--rate", type=float, help="Webhooks per second, ignoring recorded times"
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=1.0,
+        help="Time compression, e.g. 10 replays the recording 10x faster",
+    )
+    parser.add_argument(
+        "--max-gap", type=float, help="Longest wait between webhooks, in seconds"
+    )
+    parser.add_argument(
+        "--burst", type=int, default=1, help="Send webhooks in groups of this size"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--todoist-secret", default=os.getenv("TODOIST_SECRET", ""))
+    parser.add_argument(
+        "--clickup-secret", default=os.getenv("CLICKUP_WEBHOOK_SECRET", "")
+    )
+    args = parser.parse_args()
+
+    records = load_webhooks(args.file)
+    offsets = schedule(records, args.rate, args.speed, args.max_gap, args.burst)
+    print(f"Replaying {len(records)} webhooks over {offsets[-1] if offsets else 0}s")
+    summary = replay(
+        records,
+        args.url.rstrip("/"),
+        build_signers(args.todoist_secret, args.clickup_secret),
+        offsets,
+        args.concurrency,
+        args.timeout,
+    )
+    print(json.dumps(summary, indent=2))
@@ -0,0 +1,63 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+
+logger = logging.getLogger("gunicorn.error")
+
+# State shared by all processes on the host is kept in a SQLite database here.
+DATA_DIR = os.getenv(
+    "KONNECTOR_DATA_DIR", os.path.join(tempfile.gettempdir(), "konnector")
+)
+DB_FILE = "konnector.sqlite3"
+# Seconds to wait for another process to finish writing
+BUSY_TIMEOUT = 5.0
+
+_schemas = []
+_local = threading.local()
+
+
+def register_schema(sql: str) -> None:
+    """
+    Add SQL that creates a module's tables. It is run on each new connection, so it
+    must be idempotent, e.g. "CREATE TABLE IF NOT EXISTS".
+    """
+    _schemas.append(sql)
+
+
+def path() -> str:
+    return os.path.join(DATA_DIR, DB_FILE)
+
+
+def connection() -> sqlite3.Connection:
+    """
+    Return this thread's connection to the shared database, creating it if needed.
+
+    Connections use write-ahead logging so that readers in other workers aren't
+    blocked by writers. Statements are committed as they run unless a transaction is
+    started with "BEGIN". Connections are not shared between threads or across fork.
+    """
+    dbPath = path()
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid() or _local.path != dbPath:
+        os.makedirs(os.path.dirname(dbPath), exist_ok=True)
+        conn = sqlite3.connect(dbPath, timeout=BUSY_TIMEOUT, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.path = dbPath
+        _local.schemas = 0
+    # Modules imported after the connection was made add their tables now
+    for schema in _schemas[_local.schemas :]:
+        conn.executescript(schema)
+    _local.schemas = len(_schemas)
+    return conn
+
+
+def execute(sql: str, parameters=()) -> sqlite3.Cursor:
+    return connection().execute(sql, parameters)
@@ -0,0 +1,140 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import datetime
+import logging
+import sqlite3
+import time
+
+from konnector import polling, store
+
+logger = logging.getLogger("gunicorn.error")
+
+store.register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS task_timers (
+        name TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        fire_at REAL NOT NULL,
+        PRIMARY KEY (name, task_id)
+    );
+    CREATE INDEX IF NOT EXISTS task_timers_fire_at ON task_timers (name, fire_at);
+    """
+)
+
+
+class TaskTimers:
+    """
+    Calls a function for each task at the time that was set for it, e.g. when a due
+    date comes within range of a rule.
+
+    Timers are kept in the shared store, ordered by an index on when they fire, so
+    any worker can set or cancel a timer and only the next timer is looked up. The
+    scheduled job sleeps until the next timer fires. Timers set by other workers are
+    picked up within rescanInterval.
+
+    ...
+
+    Attributes
+    ----------
+    name : str
+        The name of the scheduled job. Timers are separate for each name.
+    callback : callable
+        Called with the ID of each task whose timer has fired.
+    rescanInterval : float
+        The longest time, in seconds, between checks for new timers.
+    scheduler : BackgroundScheduler
+        The scheduler running the job, once added to one.
+    """
+
+    def __init__(self, name: str, callback, rescanInterval: float = 60):
+        self.name = name
+        self.callback = callback
+        self.rescanInterval = rescanInterval
+        self.scheduler = None
+
+    def __str__(self) -> str:
+        return self.name
+
+    def set(self, taskId: str, fireAt: float) -> None:
+        """Set or move a task's timer to fire at a time in seconds since the epoch."""
+        try:
+            store.execute(
+                "INSERT INTO task_timers (name, task_id, fire_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (name, task_id) DO UPDATE SET fire_at = excluded.fire_at",
+                (self.name, str(taskId), fireAt),
+            )
+        except sqlite3.Error as err:
+            logger.warning(f"Unable to set {self} timer for task {taskId}: {err}")
+
+    def cancel(self, taskId: str) -> None:
+        try:
+            store.execute(
+                "DELETE FROM task_timers WHERE name = ? AND task_id = ?",
+                (self.name, str(taskId)),
+            )
+        except sqlite3.Error as err:
+            logger.warning(f"Unable to cancel {self} timer for task {taskId}: {err}")
+
+    def next_fire_time(self) -> float:
+        row = store.execute(
+            "SELECT MIN(fire_at) FROM task_timers WHERE name = ?", (self.name,)
+        ).fetchone()
+        return row[0]
+
+    def pop_due(self, now: float = None) -> list[str]:
+        """Remove and return the IDs of tasks whose timers have fired."""
+        now = time.time() if now is None else now
+        conn = store.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            taskIds = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT task_id FROM task_timers WHERE name = ? AND fire_at <= ?"
+                    " ORDER BY fire_at",
+                    (self.name, now),
+                )
+            ]
+            conn.execute(
+                "DELETE FROM task_timers WHERE name = ? AND fire_at <= ?",
+                (self.name, now),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return taskIds
+
+    def run(self) -> float:
+        """
+        Call the callback for each fired timer.
+
+        Returns:
+            Seconds until the job should run again.
+        """
+        for taskId in self.pop_due():
+            logger.info(f"{self}: timer fired for task {taskId}")
+            try:
+                self.callback(taskId)
+            except Exception as e:
+                logger.warning(f"{self}: error processing task {taskId}: {e}")
+        nextFireTime = self.next_fire_time()
+        delay = self.rescanInterval
+        if nextFireTime is not None:
+            delay = min(max(nextFireTime - time.time(), 0), delay)
+        if self.scheduler is not None:
+            # Intervals below a second would run the job continuously
+            self.scheduler.reschedule_job(
+                self.name, trigger=polling.interval_trigger(max(delay, 1))
+            )
+        return delay
+
+    def add_to(self, scheduler) -> None:
+        """Run the timers with an APScheduler scheduler."""
+        self.scheduler = scheduler
+        scheduler.add_job(
+            func=self.run,
+            trigger=polling.interval_trigger(self.rescanInterval),
+            next_run_time=datetime.datetime.now(),
+            id=self.name,
+        )
@@ -3,11 +3,12 @@ from konnector.konnector import Task, Platform
 import os
 import base64
 import hmac
+import types
 import uuid
 import logging
 import time
 import datetime
-from dateutil import tz
+from dateutil import parser, tz
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -74,6 +75,10 @@ class Todoist(Platform):
         "item:updated": "task_updated",
     }
     signatureKey = "X-Todoist-Hmac-SHA256"
+    webhookUserAgent = "Todoist-Webhooks"
+    webhookUserKey = "user_id"
+    webhookEventKey = "event_name"
+    webhookListKey = "project_id"
     propertyMappings = {
         "name": "content",
         "description": "description",
@@ -95,6 +100,7 @@ class Todoist(Platform):
         userIds: list = None,
         newTaskLists: list = None,
         state: str = None,
+        apiUrl: str = None,
     ):
         super().__init__(
             appEndpoint,
@@ -105,16 +111,18 @@ class Todoist(Platform):
             secret,
             userIds,
             newTaskLists,
+            apiUrl,
         )
 
         if state is not None:
             self.state = state
 
-        self.headers = {
-            "Authorization": "Bearer " + str(accessToken),
-            "X-Request-Id": str(uuid.uuid4()),
-            "Content-Type": "application/json",
-        }
+        self.headers = types.MappingProxyType(
+            {
+                "Authorization": "Bearer " + str(accessToken),
+                "Content-Type": "application/json",
+            }
+        )
         self.authURL = (
             "https://todoist.com/oauth/authorize?client_id="
             + clientId
@@ -123,6 +131,10 @@ class Todoist(Platform):
             + self.state
         )
 
+    def _get_request_headers(self) -> dict:
+        # Todoist ignores requests that reuse the ID of an earlier request
+        return {**self.headers, "X-Request-Id": str(uuid.uuid4())}
+
     def _digest_hmac(self, hmac: hmac.HMAC) -> str:
         return base64.b64encode(hmac.digest()).decode("utf-8")
 
@@ -140,6 +152,20 @@ class Todoist(Platform):
         # "get_task_data" would not work for completed tasks.
         return data["event_data"]
 
+    def warm_up(self) -> None:
+        # Imports strptime's parser, compiles its patterns and loads the time zones
+        convert_time_to(*convert_time_from("2023-01-02T01:02:03.000000Z"))
+        convert_time_from("2023-01-02")
+
+    def _get_version_from_webhook(self, data):
+        updatedAt = data["event_data"].get("updated_at")
+        if updatedAt is None:
+            return None
+        # fromisoformat before Python 3.11 rejects "Z" and fractions that aren't 3 or
+        # 6 digits, e.g. ".5Z"
+        updated = parser.isoparse(updatedAt)
+        return str(data["event_data"]["id"]), int(updated.timestamp() * 1000)
+
     def _get_id_from_task(self, data):
         return str(data["id"])
 
@@ -155,11 +181,8 @@ class Todoist(Platform):
         return f"/tasks/{params['taskId']}", "GET", {}
 
     def _get_url_get_tasks(self, params):
-        outParams = (
-            {"project_id": params["listId"]}
-            if params is not None and "listId" in params
-            else None
-        )
+        super()._get_url_get_tasks(params)
+        outParams = {"project_id": params["listId"]} if "listId" in params else None
         return ("/tasks", "GET", outParams)
 
     def _get_url_create_task(self, params):
@@ -195,7 +218,7 @@ class Todoist(Platform):
             platformProps["project_id"] = self.lists[task.get_list(self)]
 
         logger.info(f"task object converted to {self} parameters")
-        logger.debug(f"Converted task: {platformProps}")
+        logger.debug("Converted task: %s", platformProps)
         return platformProps
 
     def _convert_task_from_platform(self, platformProps, new: bool = None) -> Task:
@@ -230,14 +253,9 @@ class Todoist(Platform):
         )
 
         logger.info(f"{self} task converted to task object")
-        logger.debug(f"Converted task: {repr(convertedTask)}")
+        logger.debug("Converted task: %r", convertedTask)
         return convertedTask
 
-    def check_request(self, request):
-        if request.headers["User-Agent"] != "Todoist-Webhooks":
-            raise Exception("Bad user agent")
-        return super().check_request(request)
-
     def auth_callback(self, request, **kwargs):
         if request.args.get("state") != self.state:
             return "Invalid state"
@@ -0,0 +1,200 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+logger = logging.getLogger("gunicorn.error")
+
+# Tracing is disabled unless a file is given for traces to be written to.
+TRACE_FILE = os.getenv("TRACE_FILE", "")
+# The name of the span used for requests sent to platform APIs
+REQUEST_SPAN = "_send_request"
+
+_currentSpan = contextvars.ContextVar("currentSpan", default=None)
+_exportLock = threading.Lock()
+
+
+class Trace:
+    """
+    A tree of spans that started from the same root span.
+
+    ...
+
+    Attributes
+    ----------
+    traceId : str
+        A unique ID for the trace.
+    spans : list
+        All spans in the trace in the order they were started.
+    """
+
+    def __init__(self):
+        self.traceId = uuid.uuid4().hex
+        self.spans = []
+
+    def to_dict(self) -> dict:
+        root = self.spans[0]
+        requests = sorted(
+            (span.start, span.start + span.duration)
+            for span in self.spans
+            if span.name.endswith(REQUEST_SPAN)
+        )
+        # Total time spent waiting on platform APIs. Requests sent concurrently, e.g.
+        # by limiter.fan_out, overlap, so this can be longer than the trace.
+        networkTime = sum(end - start for start, end in requests)
+        # Time that at least one request was in flight, which is how much of the
+        # trace's duration was spent on the network
+        networkWallTime = 0.0
+        coveredUntil = None
+        for start, end in requests:
+            if coveredUntil is not None and start < coveredUntil:
+                start = coveredUntil
+            if end > start:
+                networkWallTime += end - start
+                coveredUntil = end
+        return {
+            "trace_id": self.traceId,
+            "name": root.name,
+            "start": root.start,
+            "duration_ms": round(root.duration * 1000, 3),
+            "network_ms": round(networkTime * 1000, 3),
+            "network_wall_ms": round(networkWallTime * 1000, 3),
+            "spans": [span.to_dict(root) for span in self.spans],
+        }
+
+
+class Span:
+    """
+    A timed operation within a trace.
+
+    ...
+
+    Attributes
+    ----------
+    name : str
+        What the operation is called.
+    parent : Span
+        The span that was open when this span started. None for a root span.
+    trace : Trace
+        The trace that this span belongs to.
+    attributes : dict
+        Additional information about the operation.
+    start : float
+        When the span started, in seconds since the epoch.
+    duration : float
+        How long the span was open for, in seconds.
+    error : str
+        A representation of the exception that ended the span, if any.
+    """
+
+    def __init__(self, name: str, parent: Span = None, attributes: dict = None):
+        self.name = name
+        self.parent = parent
+        self.trace = parent.trace if parent is not None else Trace()
+        self.spanId = uuid.uuid4().hex[:16]
+        self.attributes = dict(attributes) if attributes is not None else {}
+        self.start = time.time()
+        self.duration = None
+        self.error = None
+        self._perfStart = time.perf_counter()
+        self.trace.spans.append(self)
+
+    def set_attributes(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self) -> None:
+        self.duration = time.perf_counter() - self._perfStart
+
+    def to_dict(self, root: Span) -> dict:
+        return {
+            "span_id": self.spanId,
+            "parent_id": self.parent.spanId if self.parent is not None else None,
+            "name": self.name,
+            "offset_ms": round((self._perfStart - root._perfStart) * 1000, 3),
+            "duration_ms": (
+                round(self.duration * 1000, 3) if self.duration is not None else None
+            ),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+
+class _NoopSpan:
+    """Used in place of a span when tracing is disabled"""
+
+    def set_attributes(self, **attributes) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def export(trace: Trace) -> None:
+    """Append a finished trace to the trace file as a single line of JSON."""
+    line = json.dumps(trace.to_dict(), default=str) + "\n"
+    try:
+        with _exportLock, open(TRACE_FILE, "a") as f:
+            f.write(line)
+    except OSError as err:
+        logger.warning(f"Unable to write trace to {TRACE_FILE}: {err}")
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """
+    Time the enclosed code as a span. Spans opened within it become its children.
+    The trace is exported when its root span closes.
+    """
+    if not TRACE_FILE:
+        yield _NOOP_SPAN
+        return
+
+    parent = _currentSpan.get()
+    newSpan = Span(name, parent, attributes)
+    token = _currentSpan.set(newSpan)
+    try:
+        yield newSpan
+    except Exception as e:
+        newSpan.error = repr(e)
+        raise
+    finally:
+        newSpan.finish()
+        _currentSpan.reset(token)
+        if parent is None:
+            export(newSpan.trace)
+
+
+def current_span():
+    """Return the innermost open span."""
+    currentSpan = _currentSpan.get()
+    return currentSpan if currentSpan is not None else _NOOP_SPAN
+
+
+def set_attributes(**attributes) -> None:
+    """Add attributes to the innermost open span."""
+    current_span().set_attributes(**attributes)
+
+
+def traced(func):
+    """
+    Decorate a function to run within a span named after it.
+    Methods are named after the object they are called on, e.g. "todoist.get_task".
+    """
+    isMethod = "." in func.__qualname__.split("<locals>.")[-1]
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not TRACE_FILE:
+            return func(*args, **kwargs)
+        name = f"{args[0]}.{func.__name__}" if isMethod else func.__name__
+        with span(name):
+            return func(*args, **kwargs)
+
+    return wrapper
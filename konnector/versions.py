@@ -0,0 +1,54 @@
+# Postponed evaluation allows static typing reference to class within itself
+from __future__ import annotations
+import logging
+import sqlite3
+
+from konnector import store
+
+logger = logging.getLogger("gunicorn.error")
+
+store.register_schema(
+    """
+    CREATE TABLE IF NOT EXISTS task_versions (
+        platform TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        PRIMARY KEY (platform, task_id)
+    );
+    """
+)
+
+
+def apply(platform, taskId: str, version: int) -> bool:
+    """
+    Record the modification time of a task from a webhook, unless a webhook for a
+    later modification has already been received. Retried deliveries of the latest
+    modification are still applied.
+
+    Arguments:
+        platform: The platform that sent the webhook.
+        taskId: The ID of the task on the platform.
+        version: When the task was modified, in ms since the epoch.
+
+    Returns:
+        False if the webhook is older than the last one received for the task.
+    """
+    try:
+        cursor = store.execute(
+            "INSERT INTO task_versions (platform, task_id, version) VALUES (?, ?, ?)"
+            " ON CONFLICT (platform, task_id) DO UPDATE SET version = excluded.version"
+            " WHERE excluded.version >= task_versions.version",
+            (str(platform), str(taskId), int(version)),
+        )
+    except sqlite3.Error as err:
+        logger.warning(f"Unable to check {platform} task {taskId} version: {err}")
+        return True
+    return cursor.rowcount > 0
+
+
+def get(platform, taskId: str) -> int:
+    row = store.execute(
+        "SELECT version FROM task_versions WHERE platform = ? AND task_id = ?",
+        (str(platform), str(taskId)),
+    ).fetchone()
+    return row["version"] if row is not None else None
@@ -1,5 +1,9 @@
-from konnector.main import clickup
+from konnector.main import clickup, todoist, todoistIdInClickup
 from konnector.konnector import Task
+from konnector.fake_api import FakeApi
+from konnector import mirror
+
+import itertools
 
 # import pytest
 
@@ -25,3 +29,73 @@ class TestClickup:
             "due_time_included"
         )
         # assert convertedDict["list"]["id"] == clickup_dict["list"]["id"]
+
+    def test_iter_tasks_pages(self, fake_api: FakeApi):
+        """
+        GIVEN a Clickup list with more tasks than fit in a page
+        WHEN its tasks are iterated
+        THEN assert that pages are only requested as they are needed, and that every
+            task is returned and mirrored.
+        """
+        listId = clickup.get_list_id("inbox")
+        for n in range(250):
+            fake_api.add_clickup_task(listId, name=f"Task {n}")
+
+        tasks = clickup.iter_tasks("inbox")
+        firstPage = list(itertools.islice(tasks, 100))
+
+        assert len(fake_api.requests) == 1
+        assert [task.get_property("name") for task in firstPage] == [
+            f"Task {n}" for n in range(100)
+        ]
+        assert len(firstPage + list(tasks)) == 250
+        assert len(fake_api.requests) == 3
+        assert len(mirror.find(clickup, "inbox")) == 250
+        assert len(clickup.get_tasks("inbox")) == 250
+
+    def test_iter_tasks_filters(self, fake_api: FakeApi):
+        """
+        GIVEN Clickup tasks with different statuses
+        WHEN tasks are iterated with a status filter
+        THEN assert that the API only returns matching tasks.
+        """
+        listId = clickup.get_list_id("inbox")
+        fake_api.add_clickup_task(listId, status={"status": "next action"})
+        fake_api.add_clickup_task(listId)
+
+        (task,) = clickup.iter_tasks("inbox", statuses=["next action"], subtasks=True)
+
+        assert task.status == "next action"
+
+    def test_custom_field_writes(self, fake_api: FakeApi):
+        """
+        GIVEN a Clickup task that already holds its Todoist ID
+        WHEN its name is updated and then a new Todoist ID is added
+        THEN assert that unchanged custom fields aren't written and that adding the ID
+            only writes its custom field.
+        """
+        clickupTask = fake_api.add_clickup_task(
+            clickup.get_list_id("inbox"),
+            custom_fields=[{"id": todoistIdInClickup, "value": "123"}],
+        )
+        task = Task(properties={"name": "Renamed"}, ids={clickup: clickupTask["id"]})
+        task.add_id(todoist, "123")
+        taskPath = f"/api/v2/task/{clickupTask['id']}"
+
+        clickup.update_task(task)
+
+        assert fake_api.requests == [
+            ("clickup", "GET", taskPath),
+            ("clickup", "PUT", taskPath),
+        ]
+        fake_api.requests.clear()
+
+        clickup.add_id(task, todoist, "456")
+
+        assert fake_api.requests == [
+            ("clickup", "POST", f"{taskPath}/field/{todoistIdInClickup}")
+        ]
+        assert clickupTask["name"] == "Renamed"
+        assert clickupTask["custom_fields"] == [
+            {"id": todoistIdInClickup, "value": "456"}
+        ]
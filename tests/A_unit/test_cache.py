@@ -0,0 +1,84 @@
+from konnector.main import clickup, clickupEndpoint
+from konnector.fake_api import FakeApi
+from konnector import cache
+
+import time
+
+
+def count(metric, **labels) -> float:
+    return metric.samples.get(metric._key(labels), 0)
+
+
+class TestCache:
+    def test_expiry_and_eviction(self, monkeypatch):
+        """
+        GIVEN a cache that holds two entries
+        WHEN entries expire or a third is added
+        THEN assert that expired and least recently used entries are evicted.
+        """
+        monkeypatch.setattr(cache, "MAX_ENTRIES", 2)
+        monkeypatch.setattr(cache, "ACCESS_RESOLUTION", 0)
+        evicted = count(cache.CACHE_EVICTIONS, reason="size")
+        cache.put("test", "expired", {"a": 1}, ttl=0.01)
+        time.sleep(0.02)
+
+        assert cache.get("test", "expired") is None
+
+        cache.put("test", "1", {"a": 1})
+        cache.put("test", "2", {"a": 2})
+        cache.get("test", "1")
+        cache.put("test", "3", {"a": 3})
+
+        assert cache.get("test", "1") == {"a": 1}
+        assert cache.get("test", "2") is None
+        assert cache.get("test", "3") == {"a": 3}
+        assert count(cache.CACHE_EVICTIONS, reason="size") == evicted + 1
+
+    def test_get_task_shared(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN a Clickup task that has been retrieved
+        WHEN it is retrieved again and then a webhook for it is received
+        THEN assert that the second retrieval is a cache hit and that the webhook
+            invalidates it.
+        """
+        clickupTask = fake_api.add_clickup_task(clickup.get_list_id("inbox"))
+        hits = count(cache.CACHE_REQUESTS, namespace=clickup, result="hit")
+        clickup.get_task(taskId=clickupTask["id"])
+        fake_api.requests.clear()
+
+        assert clickup.get_task(taskId=clickupTask["id"]) is not None
+        assert fake_api.requests == []
+        assert count(cache.CACHE_REQUESTS, namespace=clickup, result="hit") == hits + 1
+
+        body, headers = fake_api.clickup_webhook(
+            clickup.secret, clickupTask["id"], clickup.userIds[0]
+        )
+        test_client.post(clickupEndpoint, data=body, headers=headers)
+
+        assert cache.get(clickup, clickupTask["id"]) is None
+
+    def test_read_during_write(self, fake_api: FakeApi, monkeypatch):
+        """
+        GIVEN a Clickup task being updated
+        WHEN another worker caches the task while the update is being sent
+        THEN assert that the copy from before the update isn't left in the cache.
+        """
+        clickupTask = fake_api.add_clickup_task(clickup.get_list_id("inbox"))
+        task = clickup.get_task(taskId=clickupTask["id"])
+        task.set_property("name", "Renamed")
+        sendRequest = clickup._send_request
+
+        def read_during_write(url, reqType="GET", *args, **kwargs):
+            if reqType == "PUT":
+                # Another worker retrieves the task just before it is changed
+                clickup._get_task_data(taskId=clickupTask["id"])
+            return sendRequest(url, reqType, *args, **kwargs)
+
+        monkeypatch.setattr(clickup, "_send_request", read_during_write)
+
+        clickup.update_task(task)
+
+        assert cache.get(clickup, clickupTask["id"]) is None
+        assert (
+            clickup.get_task(taskId=clickupTask["id"]).get_property("name") == "Renamed"
+        )
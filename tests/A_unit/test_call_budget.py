@@ -0,0 +1,189 @@
+from konnector.main import todoist, clickup, todoistEndpoint, clickupEndpoint
+from konnector.main import todoistIdInClickup, move_todoist_inbox
+from konnector import metrics
+from konnector.fake_api import FakeApi
+
+# The maximum number of requests to each platform's API per webhook.
+# Raise these deliberately if a change needs more requests.
+BUDGETS = {
+    "todoist:new_task": {"clickup": 2, "todoist": 2},
+    "todoist:task_updated": {"clickup": 3},
+    "todoist:task_complete": {"clickup": 2},
+    "clickup:task_updated:new_next_action": {"clickup": 2, "todoist": 2},
+    "clickup:task_updated:next_action": {"clickup": 1, "todoist": 3},
+    "clickup:task_updated:not_next_action": {"clickup": 1, "todoist": 3},
+}
+
+
+def send_todoist_webhook(test_client, api: FakeApi, eventName: str, taskId: str):
+    body, headers = api.todoist_webhook(
+        todoist.secret, eventName, taskId, todoist.userIds[0]
+    )
+    return test_client.post(todoistEndpoint, data=body, headers=headers)
+
+
+def send_clickup_webhook(test_client, api: FakeApi, taskId: str, field="priority"):
+    body, headers = api.clickup_webhook(
+        clickup.secret, taskId, clickup.userIds[0], field
+    )
+    return test_client.post(clickupEndpoint, data=body, headers=headers)
+
+
+def assert_within_budget(operation: str, counter: metrics.ApiCallCounter, response):
+    assert response.get_json() == {"status": "success"}, response.get_data()
+    for platformName, calls in counter.calls.items():
+        assert calls <= BUDGETS[operation].get(platformName, 0), (
+            f"{operation} made {calls} {platformName} requests. Budget:"
+            f" {BUDGETS[operation]}"
+        )
+
+
+class TestCallBudget:
+    def test_todoist_new_task(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN a new task in the Todoist inbox
+        WHEN a Todoist new task webhook is received
+        THEN assert that the task is moved to Clickup within the request budget.
+        """
+        item = fake_api.add_todoist_task(todoist.get_list_id("inbox"), priority=4)
+
+        with metrics.count_api_calls("test") as counter:
+            response = send_todoist_webhook(
+                test_client, fake_api, "item:added", item["id"]
+            )
+
+        assert_within_budget("todoist:new_task", counter, response)
+        assert counter.total == len(fake_api.requests)
+        assert fake_api.todoistTasks == {}
+        (clickupTask,) = fake_api.clickupTasks.values()
+        assert clickupTask["list"]["id"] == clickup.get_list_id("inbox")
+
+    def test_todoist_task_updated(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN a Todoist next action linked to a Clickup task
+        WHEN a Todoist task updated webhook is received
+        THEN assert that the Clickup task is updated within the request budget.
+        """
+        clickupTask = fake_api.add_clickup_task(clickup.get_list_id("inbox"))
+        item = fake_api.add_todoist_task(
+            todoist.get_list_id("next_actions"),
+            content="An updated task",
+            description=clickupTask["id"],
+        )
+
+        with metrics.count_api_calls("test") as counter:
+            response = send_todoist_webhook(
+                test_client, fake_api, "item:updated", item["id"]
+            )
+
+        assert_within_budget("todoist:task_updated", counter, response)
+        assert clickupTask["name"] == "An updated task"
+
+    def test_todoist_task_complete(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN a Todoist next action linked to a Clickup task
+        WHEN a Todoist task completed webhook is received
+        THEN assert that the Clickup task is completed within the request budget.
+        """
+        clickupTask = fake_api.add_clickup_task(clickup.get_list_id("inbox"))
+        item = fake_api.add_todoist_task(
+            todoist.get_list_id("next_actions"),
+            description=clickupTask["id"],
+            is_completed=True,
+        )
+
+        with metrics.count_api_calls("test") as counter:
+            response = send_todoist_webhook(
+                test_client, fake_api, "item:completed", item["id"]
+            )
+
+        assert_within_budget("todoist:task_complete", counter, response)
+
+    def test_clickup_new_next_action(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN a Clickup task that meets the next actions criteria
+        WHEN a Clickup task updated webhook is received
+        THEN assert that the task is copied to Todoist next actions and the Todoist
+            ID stored in Clickup within the request budget.
+        """
+        clickupTask = fake_api.add_clickup_task(
+            clickup.get_list_id("inbox"),
+            status={"status": "next action"},
+            priority={"id": "2"},
+        )
+
+        with metrics.count_api_calls("test") as counter:
+            response = send_clickup_webhook(test_client, fake_api, clickupTask["id"])
+
+        assert_within_budget("clickup:task_updated:new_next_action", counter, response)
+        (item,) = fake_api.todoistTasks.values()
+        assert item["project_id"] == todoist.get_list_id("next_actions")
+        assert clickupTask["custom_fields"][0]["value"] == item["id"]
+
+    def test_clickup_next_action_updated(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN a Clickup task that is already a Todoist next action
+        WHEN a Clickup task updated webhook is received
+        THEN assert that the Todoist task is updated within the request budget.
+        """
+        item = fake_api.add_todoist_task(todoist.get_list_id("next_actions"))
+        clickupTask = fake_api.add_clickup_task(
+            clickup.get_list_id("inbox"),
+            name="An updated task",
+            status={"status": "next action"},
+            priority={"id": "2"},
+            custom_fields=[{"id": todoistIdInClickup, "value": item["id"]}],
+        )
+        item["description"] = clickupTask["id"]
+
+        with metrics.count_api_calls("test") as counter:
+            response = send_clickup_webhook(test_client, fake_api, clickupTask["id"])
+
+        assert_within_budget("clickup:task_updated:next_action", counter, response)
+        assert item["content"] == "An updated task"
+
+    def test_clickup_not_next_action(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN a Todoist next action linked to a Clickup task
+        WHEN a Clickup task updated webhook is received for a task that no longer
+            meets the next actions criteria
+        THEN assert that the Todoist task is deleted within the request budget.
+        """
+        item = fake_api.add_todoist_task(todoist.get_list_id("next_actions"))
+        clickupTask = fake_api.add_clickup_task(
+            clickup.get_list_id("inbox"),
+            priority={"id": "2"},
+            custom_fields=[{"id": todoistIdInClickup, "value": item["id"]}],
+        )
+        item["description"] = clickupTask["id"]
+
+        with metrics.count_api_calls("test") as counter:
+            response = send_clickup_webhook(
+                test_client, fake_api, clickupTask["id"], "status"
+            )
+
+        assert_within_budget("clickup:task_updated:not_next_action", counter, response)
+        assert fake_api.todoistTasks == {}
+
+    def test_todoist_inbox_backlog(self, fake_api: FakeApi):
+        """
+        GIVEN a backlog of tasks in the Todoist inbox, one of which is already in
+            Clickup
+        WHEN the scheduled inbox check moves them
+        THEN assert that the Clickup inbox is only retrieved once and no task is
+            duplicated.
+        """
+        inbox = todoist.get_list_id("inbox")
+        items = [fake_api.add_todoist_task(inbox) for _ in range(30)]
+        fake_api.add_clickup_task(
+            clickup.get_list_id("inbox"),
+            custom_fields=[{"id": todoistIdInClickup, "value": items[0]["id"]}],
+        )
+
+        moved = move_todoist_inbox()
+
+        listPath = f"/api/v2/list/{clickup.get_list_id('inbox')}/task"
+        assert moved == 30
+        assert fake_api.requests.count(("clickup", "GET", listPath)) == 1
+        assert len(fake_api.clickupTasks) == 30
+        assert fake_api.todoistTasks == {}
@@ -0,0 +1,48 @@
+from konnector.main import app
+from konnector import jsonlib
+
+import pytest
+
+DATA = {"tasks": [{"id": "1", "name": "Ünïcode", "priority": None, "due": 1.5}], 2: []}
+
+
+@pytest.fixture(params=["json", "orjson"])
+def codec(request):
+    if request.param == "orjson" and jsonlib.orjson is None:
+        pytest.skip("orjson is not installed")
+    return jsonlib.get_codec(request.param)
+
+
+class TestJsonCodec:
+    def test_round_trip(self, codec):
+        """
+        GIVEN a JSON codec
+        WHEN data is encoded compactly and decoded
+        THEN assert that the output matches the standard library's.
+        """
+        encoded = codec.dumps(DATA)
+
+        assert encoded == jsonlib.JsonCodec().dumps(DATA)
+        assert b" " not in encoded
+        assert codec.loads(encoded) == {"tasks": DATA["tasks"], "2": []}
+
+    def test_unknown_codec(self):
+        """
+        GIVEN a codec name that isn't supported
+        WHEN the codec is requested
+        THEN assert that an exception is raised.
+        """
+        with pytest.raises(Exception, match="Unknown JSON codec"):
+            jsonlib.get_codec("simplejson")
+
+    def test_app_responses_compact(self, test_client):
+        """
+        GIVEN the app's JSON provider
+        WHEN a response is made
+        THEN assert that it is compact JSON with sorted keys.
+        """
+        with app.app_context():
+            response = app.json.response({"status": "success", "code": 202})
+
+        assert response.get_data() == b'{"code":202,"status":"success"}\n'
+        assert response.mimetype == "application/json"
@@ -3,6 +3,9 @@ from konnector.main import todoist, clickup
 from konnector.konnector import Task, Platform
 from tests.conftest import NEW_PROPERTIES, UPDATED_PROPERTIES, platformData
 
+import concurrent.futures
+import threading
+
 import pytest
 
 
@@ -89,3 +92,30 @@ class TestPlatformUnit:
             platform
         )
         assert convertedTask.get_id(platform) == platformTask.get_id(platform)
+
+
+class TestPlatformThreads:
+    def test_shared_between_threads(self):
+        """
+        GIVEN the module level platforms
+        WHEN requests are prepared in several threads
+        THEN assert that configuration is read-only, each thread has its own HTTP
+            session and each Todoist request has its own ID.
+        """
+        with pytest.raises(TypeError):
+            todoist.lists["inbox"] = "1234"
+        with pytest.raises(TypeError):
+            clickup.headers["Authorization"] = "token"
+
+        both = threading.Barrier(2, timeout=2)
+
+        def get_session(_):
+            both.wait()
+            return clickup._session()
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            sessions = list(executor.map(get_session, range(2)))
+        assert sessions[0] is not sessions[1]
+
+        requestIds = {todoist._get_request_headers()["X-Request-Id"] for _ in range(2)}
+        assert len(requestIds) == 2
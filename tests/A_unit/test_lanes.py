@@ -0,0 +1,64 @@
+from konnector.main import clickup
+from konnector.lanes import LaneScheduler, INTERACTIVE, BACKGROUND
+
+import concurrent.futures
+import time
+
+
+def send(lanes: LaneScheduler, lane: str, events: list, name: str, seconds=0.0):
+    with lanes.request(lane):
+        events.append(f"{name} start")
+        time.sleep(seconds)
+        events.append(f"{name} end")
+
+
+class TestLaneScheduler:
+    def test_background_waits_for_interactive(self):
+        """
+        GIVEN a webhook request in flight
+        WHEN a background job sends a request
+        THEN assert that the background request waits until the webhook request ends.
+        """
+        lanes = LaneScheduler(clickup, grace=0)
+        events = []
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            executor.submit(send, lanes, INTERACTIVE, events, "webhook", 0.2)
+            time.sleep(0.05)
+            executor.submit(send, lanes, BACKGROUND, events, "sweep")
+
+        assert events == ["webhook start", "webhook end", "sweep start", "sweep end"]
+
+    def test_background_leaves_rate_limit_reserve(self):
+        """
+        GIVEN less than the reserved fraction of the rate limit left
+        WHEN webhook and background requests are sent
+        THEN assert that only the background request waits for the next window.
+        """
+        lanes = LaneScheduler(clickup, reserve=0.2, grace=0)
+        lanes.observe(
+            {
+                "X-RateLimit-Remaining": "10",
+                "X-RateLimit-Limit": "100",
+                "X-RateLimit-Reset": str(time.time() + 0.3),
+            }
+        )
+
+        start = time.perf_counter()
+        with lanes.request(INTERACTIVE):
+            assert time.perf_counter() - start < 0.1
+        with lanes.request(BACKGROUND):
+            assert time.perf_counter() - start >= 0.25
+
+    def test_low_budget_without_reset_expires(self):
+        """
+        GIVEN less than the reserved fraction of the rate limit left and no reset time
+        WHEN a background request is sent and no webhook requests follow
+        THEN assert that it waits for the default window rather than forever.
+        """
+        lanes = LaneScheduler(clickup, reserve=0.2, grace=0, window=0.3)
+        lanes.observe({"X-RateLimit-Remaining": "10", "X-RateLimit-Limit": "100"})
+
+        start = time.perf_counter()
+        with lanes.request(BACKGROUND):
+            assert 0.25 <= time.perf_counter() - start < 2
@@ -0,0 +1,78 @@
+from konnector.leader import LeaderElection
+from konnector import leader
+
+import threading
+
+
+class TestLeaderElection:
+    def test_single_leader_and_failover(self, tmp_path):
+        """
+        GIVEN two processes taking part in the same election
+        WHEN the leader stops being the leader
+        THEN assert that only one is elected at a time and the other takes over.
+        """
+        elected = {"first": threading.Event(), "second": threading.Event()}
+        first = LeaderElection("test", elected["first"].set, str(tmp_path))
+        # A separate open file behaves like another process' lock
+        second = LeaderElection("test", elected["second"].set, str(tmp_path))
+
+        first.start()
+        second.start()
+
+        assert first.isLeader and elected["first"].is_set()
+        assert not second.isLeader and not elected["second"].is_set()
+        assert not second.try_acquire()
+
+        first.release()
+
+        assert elected["second"].wait(timeout=5)
+        assert second.isLeader and not first.isLeader
+        second.release()
+
+    def test_waits_without_blocking(self, tmp_path, monkeypatch):
+        """
+        GIVEN a process waiting to be the leader
+        WHEN it waits for the current leader
+        THEN assert that it never makes a blocking flock call, which would block
+            gevent workers.
+        """
+        flock = leader.fcntl.flock
+
+        def non_blocking_flock(fd, operation):
+            assert operation & leader.fcntl.LOCK_NB or operation == leader.fcntl.LOCK_UN
+            return flock(fd, operation)
+
+        monkeypatch.setattr(leader.fcntl, "flock", non_blocking_flock)
+        monkeypatch.setattr(leader, "POLL_INTERVAL", 0.01)
+        elected = threading.Event()
+        first = LeaderElection("test", lambda: None, str(tmp_path))
+        second = LeaderElection("test", elected.set, str(tmp_path))
+
+        first.start()
+        second.start()
+        first.release()
+
+        assert elected.wait(timeout=5)
+        second.release()
+
+    def test_failed_start_released(self, tmp_path, monkeypatch):
+        """
+        GIVEN a process that fails to start the leader's work once elected
+        WHEN another process is waiting to be elected
+        THEN assert that the lock is released so the other process takes over.
+        """
+        monkeypatch.setattr(leader, "POLL_INTERVAL", 0.01)
+        elected = threading.Event()
+
+        def fail():
+            raise Exception("Unable to start")
+
+        first = LeaderElection("test", fail, str(tmp_path))
+        second = LeaderElection("test", elected.set, str(tmp_path))
+
+        assert first.try_acquire() is False
+        assert not first.isLeader
+        second.start()
+
+        assert elected.wait(timeout=5) and second.isLeader
+        second.release()
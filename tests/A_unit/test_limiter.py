@@ -0,0 +1,63 @@
+from konnector.main import clickup
+from konnector.limiter import AimdLimiter, fan_out
+
+import contextlib
+import threading
+import time
+
+import pytest
+import requests
+
+
+def response(status: int) -> requests.Response:
+    resp = requests.Response()
+    resp.status_code = status
+    return resp
+
+
+class TestAimdLimiter:
+    def test_limit_adapts(self):
+        """
+        GIVEN a limiter for a platform
+        WHEN requests succeed with stable latency and then are rate limited
+        THEN assert that the limit grows additively and halves once per burst.
+        """
+        limiter = AimdLimiter(clickup, initialLimit=4, maxLimit=8)
+
+        for _ in range(4):
+            with limiter.request():
+                pass
+        assert 4.9 < limiter.limit < 5
+
+        # Three requests in flight are rate limited
+        with pytest.raises(requests.exceptions.HTTPError):
+            with contextlib.ExitStack() as stack:
+                for _ in range(3):
+                    stack.enter_context(limiter.request())
+                raise requests.exceptions.HTTPError(response=response(429))
+        assert 2.4 < limiter.limit < 2.5
+        assert limiter.inFlight == 0
+
+    def test_fan_out_within_limit(self):
+        """
+        GIVEN a limiter allowing two requests in flight
+        WHEN calls are fanned out over more items
+        THEN assert that at most two run at once and results are in order.
+        """
+        limiter = AimdLimiter(clickup, initialLimit=2, maxLimit=2)
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def call(item):
+            with limiter.request():
+                with lock:
+                    running.append(item)
+                    peak.append(len(running))
+                time.sleep(0.02)
+                with lock:
+                    running.remove(item)
+            return item * 2
+
+        assert fan_out(call, range(6)) == [0, 2, 4, 6, 8, 10]
+        assert max(peak) == 2
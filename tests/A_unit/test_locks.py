@@ -0,0 +1,141 @@
+from konnector.main import todoist, clickup
+from konnector.konnector import Task, move_task
+from konnector.fake_api import FakeApi
+from konnector import locks, store
+
+import concurrent.futures
+import pytest
+import sqlite3
+import threading
+import time
+
+
+def hold_lock(task: Task, events: list, name: str, seconds: float = 0.05):
+    with locks.lock_task(task) as waited:
+        events.append(f"{name} start")
+        time.sleep(seconds)
+        events.append(f"{name} end")
+    return waited
+
+
+class TestTaskLocks:
+    def test_same_task_serialised(self):
+        """
+        GIVEN two threads changing the same task
+        WHEN both lock the task
+        THEN assert that they run one at a time and the second knows it waited.
+        """
+        events = []
+        task = Task(ids={todoist: "1234"})
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            first = executor.submit(hold_lock, Task(ids={todoist: "1234"}), events, "a")
+            time.sleep(0.01)
+            second = executor.submit(hold_lock, task, events, "b")
+
+        assert events == ["a start", "a end", "b start", "b end"]
+        assert first.result() is False and second.result() is True
+
+    def test_different_tasks_parallel(self):
+        """
+        GIVEN two threads changing different tasks
+        WHEN both lock their task
+        THEN assert that they run at the same time.
+        """
+        both = threading.Barrier(2, timeout=2)
+
+        def lock_and_wait(taskId):
+            with locks.lock_task(Task(ids={todoist: taskId})):
+                both.wait()
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            results = [executor.submit(lock_and_wait, i) for i in ("1", "2")]
+        for result in results:
+            result.result()
+
+    def test_expired_lease_taken_over(self):
+        """
+        GIVEN a lock held by a process that died without releasing it
+        WHEN the lease has expired
+        THEN assert that the lock can be acquired.
+        """
+        store.execute(
+            "INSERT INTO task_locks VALUES (?, ?, ?)",
+            ("todoist:1234", "dead", time.time() - 1),
+        )
+
+        with locks.lock_task(Task(ids={todoist: "1234"})) as waited:
+            assert waited is False
+
+    def test_lease_renewed(self, monkeypatch):
+        """
+        GIVEN a lock held for longer than its lease
+        WHEN another process tries to take it
+        THEN assert that the lease has been renewed so it can't be taken.
+        """
+        monkeypatch.setattr(locks, "LEASE_SECONDS", 0.1)
+        task = Task(ids={todoist: "1234"})
+
+        with locks.lock_task(task):
+            time.sleep(0.3)
+            other = locks.TaskLock("todoist:1234")
+            assert other._try_lease() is False
+
+    def test_lease_lost(self, monkeypatch):
+        """
+        GIVEN a lock whose lease was taken by another process while it was held
+        WHEN the lock is released
+        THEN assert that the operation fails.
+        """
+        task = Task(ids={todoist: "1234"})
+
+        with pytest.raises(Exception, match="expired"):
+            with locks.lock_task(task):
+                store.execute(
+                    "UPDATE task_locks SET owner = 'other' WHERE key = 'todoist:1234'"
+                )
+
+        assert locks._threadLocks == {}
+
+    def test_store_error_releases_lock(self, monkeypatch):
+        """
+        GIVEN the shared store raising an error while a lease is requested
+        WHEN the task is locked again once the store has recovered
+        THEN assert that the lock is acquired.
+        """
+        task = Task(ids={todoist: "1234"})
+        tryLease = locks.TaskLock._try_lease
+
+        def locked_store(self):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(locks.TaskLock, "_try_lease", locked_store)
+        with pytest.raises(sqlite3.OperationalError):
+            with locks.lock_task(task):
+                pass
+        monkeypatch.setattr(locks.TaskLock, "_try_lease", tryLease)
+
+        with locks.lock_task(task, timeout=0.1) as waited:
+            assert waited is False
+        assert locks._threadLocks == {}
+
+    def test_concurrent_moves(self, fake_api: FakeApi):
+        """
+        GIVEN a new task in the Todoist inbox
+        WHEN a webhook and the scheduled inbox check move it at the same time
+        THEN assert that only one Clickup task is created.
+        """
+        fake_api.latency = 0.01
+        item = fake_api.add_todoist_task(todoist.get_list_id("inbox"))
+        tasks = [todoist.get_task(taskId=item["id"]) for _ in range(2)]
+
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            moves = [
+                executor.submit(move_task, task, {clickup: "inbox"}, True)
+                for task in tasks
+            ]
+        for move in moves:
+            move.result()
+
+        assert fake_api.todoistTasks == {}
+        assert len(fake_api.clickupTasks) == 1
@@ -0,0 +1,93 @@
+from konnector.main import app, create_app, todoist, clickup, clickupEndpoint
+from konnector.main import warm_up
+
+import os
+import subprocess
+import sys
+
+
+class TestAppFactory:
+    def test_import_is_lazy(self):
+        """
+        GIVEN no credentials in the environment
+        WHEN konnector.main is imported
+        THEN assert that no platform module or scheduler is imported.
+        """
+        env = {
+            key: value
+            for key, value in os.environ.items()
+            if not key.startswith(("TODOIST", "CLICKUP", "ENDPOINT"))
+        }
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                (
+                    "import sys, konnector.main;"
+                    "print([m for m in ('konnector.todoist', 'konnector.clickup',"
+                    " 'apscheduler') if m in sys.modules])"
+                ),
+            ],
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        assert result.stdout.strip() == "[]"
+
+    def test_create_app_with_config(self):
+        """
+        GIVEN config with auth disabled and a deferred scheduler
+        WHEN an app is created
+        THEN assert that it shares the platforms and only routes webhooks.
+        """
+        app = create_app({"AUTH": False, "DEFER_SCHEDULER": True})
+        rules = {rule.rule for rule in app.url_map.iter_rules()}
+
+        assert clickupEndpoint in rules
+        assert todoist.platformEndpoint in rules
+        assert "/todoist/auth" not in rules
+        assert app.config["DEFER_SCHEDULER"] is True
+
+    def test_warm_up_before_fork(self, test_client):
+        """
+        GIVEN the app loaded with an HTTP session open
+        WHEN caches are warmed before fork and a worker is prepared after it
+        THEN assert that dates are parsed, routes compiled and sessions replaced.
+        """
+        session = clickup._session()
+
+        warm_up(app)
+        # Only the platforms are prepared, as the scheduler is already running
+        for platform in (todoist, clickup):
+            platform.after_fork()
+
+        assert "_strptime" in sys.modules
+        assert app.url_map._remap is False
+        assert clickup._session() is not session
+
+    def test_fork_hooks_create_platforms(self):
+        """
+        GIVEN a fresh process where nothing has accessed the platforms
+        WHEN caches are warmed and a worker is prepared after fork
+        THEN assert that the platforms are created rather than a NameError raised.
+        """
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                (
+                    "import flask, konnector.main as main;"
+                    "main.start_scheduler = lambda: None;"
+                    "main.warm_up(flask.Flask('test'));"
+                    "main.after_fork();"
+                    "print(main.clickup)"
+                ),
+            ],
+            capture_output=True,
+            text=True,
+        )
+
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.strip() == "clickup"
@@ -0,0 +1,95 @@
+from konnector import metrics
+from konnector.metrics import Registry, Counter, Gauge, Histogram
+
+import os
+import subprocess
+import sys
+import time
+
+
+class TestMetrics:
+    def test_histogram_render(self, tmp_path):
+        """
+        GIVEN a histogram metric
+        WHEN observations are made and the registry is rendered
+        THEN assert that cumulative buckets, sum and count are in the text format.
+        """
+        registry = Registry(str(tmp_path), pid=1)
+        histogram = Histogram(
+            "test_seconds", "A test.", ["platform"], (0.1, 1), registry
+        )
+        histogram.observe(0.05, platform="todoist")
+        histogram.observe(0.5, platform="todoist")
+        histogram.observe(5, platform="todoist")
+
+        rendered = registry.render()
+        assert "# TYPE test_seconds histogram" in rendered
+        assert 'test_seconds_bucket{platform="todoist",le="0.1"} 1' in rendered
+        assert 'test_seconds_bucket{platform="todoist",le="1"} 2' in rendered
+        assert 'test_seconds_bucket{platform="todoist",le="+Inf"} 3' in rendered
+        assert 'test_seconds_count{platform="todoist"} 3' in rendered
+
+    def test_merge_workers(self, tmp_path):
+        """
+        GIVEN two worker processes sharing a metrics directory
+        WHEN each records metrics and one renders them
+        THEN assert that counters are summed and the latest gauge value is used.
+        """
+        workers = [
+            Registry(str(tmp_path), pid=pid) for pid in (os.getpid(), os.getppid())
+        ]
+        counters = [Counter("test_total", "A test.", [], r) for r in workers]
+        gauges = [Gauge("test_gauge", "A test.", [], r) for r in workers]
+
+        counters[0].inc()
+        counters[1].inc(2)
+        gauges[1].set(5)
+        gauges[0].set(7)
+        workers[1].flush()
+
+        rendered = workers[0].render()
+        assert "test_total 3" in rendered
+        assert "test_gauge 7" in rendered
+
+    def test_exited_workers(self, tmp_path):
+        """
+        GIVEN snapshots written by workers that have exited
+        WHEN a worker with the same pid as one of them starts, and the metrics are
+            rendered
+        THEN assert that their counters are still counted but their gauges aren't.
+        """
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        for pid in (process.pid, os.getpid()):
+            old = Registry(str(tmp_path), pid=pid)
+            Counter("test_total", "A test.", [], old).inc(10)
+            Gauge("test_gauge", "A test.", [], old).set(5)
+            old.flush()
+        registry = Registry(str(tmp_path), pid=os.getpid())
+        counter = Counter("test_total", "A test.", [], registry)
+        Gauge("test_gauge", "A test.", [], registry)
+        counter.inc()
+
+        for _ in range(2):
+            rendered = registry.render().splitlines()
+            assert "test_total 21" in rendered
+            assert not any(line.startswith("test_gauge ") for line in rendered)
+        assert not os.path.exists(os.path.join(tmp_path, f"{process.pid}.json"))
+
+    def test_flush_interval(self, tmp_path, monkeypatch):
+        """
+        GIVEN a metric that was recently written
+        WHEN it changes again
+        THEN assert that the snapshot is written once the flush interval has passed.
+        """
+        monkeypatch.setattr(metrics, "FLUSH_INTERVAL", 0.05)
+        registry = Registry(str(tmp_path), pid=os.getpid())
+        counter = Counter("test_total", "A test.", [], registry)
+        counter.inc()
+        counter.inc()
+
+        with open(registry.path) as f:
+            assert '"[]": 1' in f.read()
+        time.sleep(0.2)
+        with open(registry.path) as f:
+            assert '"[]": 2' in f.read()
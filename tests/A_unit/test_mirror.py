@@ -0,0 +1,160 @@
+from konnector.main import todoist, clickup, clickupEndpoint
+from konnector.konnector import Task
+from konnector.fake_api import FakeApi
+from konnector import mirror, store
+
+import os
+import subprocess
+import sys
+
+
+class TestMirror:
+    def test_task_dict_round_trip(self, task_clickup: Task):
+        """
+        GIVEN a task from Clickup
+        WHEN it is converted to a dictionary and back
+        THEN assert that the task is unchanged.
+        """
+        task_clickup.status = "next action"
+        task_clickup.subTask = True
+
+        task = Task.from_dict(
+            task_clickup.to_dict(), {"todoist": todoist, "clickup": clickup}
+        )
+
+        assert repr(task) == repr(task_clickup)
+        assert task.status == "next action" and task.subTask is True
+
+    def test_tasks_mirrored(self, fake_api: FakeApi):
+        """
+        GIVEN tasks in Todoist next actions linked to Clickup tasks
+        WHEN the tasks are retrieved and one is deleted
+        THEN assert that the mirror can find the remaining task by its Clickup ID
+            without calling the API.
+        """
+        nextActions = todoist.get_list_id("next_actions")
+        kept = fake_api.add_todoist_task(nextActions, description="cu1")
+        deleted = fake_api.add_todoist_task(nextActions, description="cu2")
+        todoist.get_tasks("next_actions")
+        todoist.delete_task(Task(ids={todoist: deleted["id"]}))
+        fake_api.requests.clear()
+
+        (found,) = mirror.find(todoist, "next_actions", ids={clickup: "cu1"})
+
+        assert found.get_id(todoist) == kept["id"]
+        assert found.get_list(todoist) == "next_actions"
+        assert mirror.find(todoist, ids={clickup: "cu2"}) == []
+        assert fake_api.requests == []
+
+    def test_read_by_another_process(self, fake_api: FakeApi):
+        """
+        GIVEN a task mirrored by one process
+        WHEN another process that hasn't mirrored any tasks reads it
+        THEN assert that the task's IDs and lists are read.
+        """
+        nextActions = todoist.get_list_id("next_actions")
+        todoistTask = fake_api.add_todoist_task(nextActions, description="cu1")
+        todoist.get_tasks("next_actions")
+
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                (
+                    "from konnector import mirror;"
+                    "from konnector.main import todoist, clickup;"
+                    "(task,) = mirror.find(todoist, ids={clickup: 'cu1'});"
+                    "print(task.get_id(todoist), task.get_list(todoist))"
+                ),
+            ],
+            env={**os.environ, "KONNECTOR_DATA_DIR": store.DATA_DIR},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        assert result.stdout.split() == [todoistTask["id"], "next_actions"]
+
+    def test_rebuild(self, fake_api: FakeApi):
+        """
+        GIVEN a mirror containing a task that no longer exists
+        WHEN the mirror is rebuilt from a full sweep
+        THEN assert that only current tasks are mirrored.
+        """
+        mirror.save(todoist, Task(ids={todoist: "gone"}, lists={todoist: "inbox"}))
+        fake_api.add_todoist_task(todoist.get_list_id("inbox"))
+        fake_api.add_clickup_task(
+            clickup.get_list_id("inbox"), status={"status": "next action"}
+        )
+
+        count = mirror.rebuild({todoist: ["inbox"], clickup: ["inbox"]})
+
+        assert count == 2
+        assert mirror.get(todoist, "gone") is None
+        assert len(mirror.find(clickup, status="next action")) == 1
+
+    def test_sub_task_index(self, fake_api: FakeApi):
+        """
+        GIVEN a Clickup list with a task and its subtask
+        WHEN the list's tasks are retrieved
+        THEN assert that parents and children can be looked up without calling the
+            API.
+        """
+        listId = clickup.get_list_id("inbox")
+        parent = fake_api.add_clickup_task(listId)
+        child = fake_api.add_clickup_task(listId, parent=parent["id"])
+        clickup.get_tasks("inbox")
+        fake_api.requests.clear()
+
+        (subTask,) = mirror.find(clickup, parentId=parent["id"])
+
+        assert subTask.get_id(clickup) == child["id"] and subTask.subTask is True
+        assert mirror.get_parent(clickup, child["id"]) == (True, parent["id"])
+        assert mirror.get_parent(clickup, parent["id"]) == (True, None)
+        assert mirror.get_parent(clickup, "unknown") == (False, None)
+        assert fake_api.requests == []
+
+    def test_parent_change_updates_sub_tasks(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN a Clickup subtask in Todoist's next actions that no longer meets the
+            next actions criteria
+        WHEN webhooks are received for its parent being renamed and then moved
+        THEN assert that the subtask is only re-evaluated when its parent is moved,
+            and is removed from next actions without being requested.
+        """
+        listId = clickup.get_list_id("inbox")
+        parent = fake_api.add_clickup_task(listId)
+        child = fake_api.add_clickup_task(
+            listId,
+            parent=parent["id"],
+            status={"status": "next action"},
+            priority={"id": "4"},
+        )
+        fake_api.add_todoist_task(
+            todoist.get_list_id("next_actions"), description=child["id"]
+        )
+        clickup.get_tasks("inbox")
+        todoist.get_tasks("next_actions")
+        fake_api.requests.clear()
+
+        body, headers = fake_api.clickup_webhook(
+            clickup.secret, parent["id"], clickup.userIds[0]
+        )
+        response = test_client.post(clickupEndpoint, data=body, headers=headers)
+
+        assert response.get_json() == {"status": "success"}, response.get_data()
+        assert len(fake_api.todoistTasks) == 1
+
+        for task in (parent, child):
+            task["list"]["id"] = clickup.get_list_id("food_log")
+        body, headers = fake_api.clickup_webhook(
+            clickup.secret, parent["id"], clickup.userIds[0], field="list"
+        )
+        response = test_client.post(clickupEndpoint, data=body, headers=headers)
+
+        assert response.get_json() == {"status": "success"}, response.get_data()
+        assert fake_api.todoistTasks == {}
+        assert mirror.get(clickup, child["id"]).get_list(clickup) == "food_log"
+        assert ("clickup", "GET", f"/api/v2/task/{child['id']}") not in (
+            fake_api.requests
+        )
@@ -0,0 +1,86 @@
+from konnector.main import todoist, clickup
+from konnector.konnector import Task, move_task, modify_task
+from konnector.fake_api import FakeApi
+from konnector import oplog, store
+
+
+def queued(platform) -> list:
+    return [
+        (row["op"], row["complete"])
+        for row in store.execute(
+            "SELECT op, complete FROM oplog WHERE platform = ?", (str(platform),)
+        )
+    ]
+
+
+class TestOplog:
+    def test_writes_compacted(self):
+        """
+        GIVEN writes queued for an unavailable platform
+        WHEN several writes are made to the same task
+        THEN assert that they are combined into one write with the final state.
+        """
+        oplog.mark_unavailable(clickup)
+        new = Task(properties={"name": "first"}, ids={todoist: "1"})
+        existing = Task(properties={"name": "first"}, ids={clickup: "2"})
+        removed = Task(properties={"name": "first"}, ids={clickup: "3"})
+        cancelled = Task(properties={"name": "first"}, ids={todoist: "4"})
+
+        oplog.write(clickup, "create", new, "inbox")
+        new.set_property("name", "second")
+        oplog.write(clickup, "update", new)
+        oplog.write(clickup, "complete", new)
+        oplog.write(clickup, "update", existing)
+        oplog.write(clickup, "update", existing)
+        oplog.write(clickup, "update", removed)
+        oplog.write(clickup, "delete", removed)
+        oplog.write(clickup, "update", removed)
+        oplog.write(clickup, "create", cancelled, "inbox")
+        oplog.write(clickup, "delete", cancelled)
+
+        assert sorted(queued(clickup)) == [
+            ("create", 1),
+            ("delete", 0),
+            ("update", 0),
+        ]
+        row = store.execute("SELECT * FROM oplog WHERE op = 'create'", ()).fetchone()
+        assert "second" in row["task"] and row["list"] == "inbox"
+
+    def test_move_queued_and_flushed(self, fake_api: FakeApi, monkeypatch):
+        """
+        GIVEN Clickup returning server errors
+        WHEN a Todoist inbox task is moved to Clickup and then updated
+        THEN assert that the writes are queued, that the Todoist task is kept until
+            Clickup recovers, and that one task with the latest properties is created
+            before the Todoist task is deleted.
+        """
+        monkeypatch.setattr(oplog.time, "sleep", lambda seconds: None)
+        item = fake_api.add_todoist_task(todoist.get_list_id("inbox"))
+        task = todoist.get_task(taskId=item["id"])
+        fake_api.errorRate = 1
+
+        # The Clickup check fails, so the create is queued
+        move_task(task, {clickup: "inbox"}, True)
+        assert not oplog.is_available(clickup)
+        fake_api.errorRate = 0
+        move_task(task, {clickup: "inbox"}, True)
+        task.set_property("name", "An updated task")
+        modify_task(task, "task_updated", {clickup: "inbox"})
+
+        assert fake_api.clickupTasks == {}
+        assert list(fake_api.todoistTasks) == [item["id"]]
+        assert queued(clickup) == [("create", 0)]
+
+        assert oplog.flush([todoist, clickup]) == 0
+        store.execute("UPDATE platform_health SET unavailable_until = 0")
+        assert oplog.flush([todoist, clickup]) == 1
+
+        (clickupTask,) = fake_api.clickupTasks.values()
+        assert clickupTask["name"] == "An updated task"
+        assert queued(clickup) == []
+        assert oplog.is_available(clickup)
+
+        move_task(task, {clickup: "inbox"}, True)
+
+        assert len(fake_api.clickupTasks) == 1
+        assert fake_api.todoistTasks == {}
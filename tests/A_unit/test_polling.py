@@ -0,0 +1,64 @@
+from konnector.main import todoist
+from konnector import polling
+
+import pytest
+
+
+@pytest.fixture(scope="function")
+def poller():
+    found = []
+    poller = polling.AdaptivePoller(
+        "test_poll",
+        lambda: found.pop(0) if found else 0,
+        todoist,
+        ["inbox"],
+        baseInterval=600,
+        minInterval=120,
+        maxInterval=2400,
+        jitter=0,
+    )
+    poller.found = found
+    return poller
+
+
+class TestAdaptivePoller:
+    def test_backs_off_while_webhooks_healthy(self, poller):
+        """
+        GIVEN webhooks are arriving and polls find nothing missed
+        WHEN the poll runs repeatedly
+        THEN assert that the interval stretches up to the maximum and calls are saved.
+        """
+        intervals = []
+        for _ in range(4):
+            polling.record_webhook(todoist, "inbox")
+            intervals.append(poller.poll())
+
+        assert intervals == [1200, 2400, 2400, 2400]
+        assert poller.apiCallsSaved == 1 + 3 + 3 + 3
+
+    def test_tightens_when_webhooks_missed(self, poller):
+        """
+        GIVEN a stretched interval
+        WHEN a poll finds a task that a webhook missed, or a webhook fails
+        THEN assert that the interval drops to the minimum.
+        """
+        poller.interval = 2400
+        poller.found.append(1)
+        polling.record_webhook(todoist, "inbox")
+
+        assert poller.poll() == 120
+
+        poller.interval = 2400
+        polling.record_webhook(todoist, "inbox", failed=True)
+
+        assert poller.poll() == 120
+
+    def test_returns_to_base_without_webhooks(self, poller):
+        """
+        GIVEN a stretched interval
+        WHEN no webhooks arrive between polls
+        THEN assert that the interval returns to the base interval.
+        """
+        poller.interval = 2400
+
+        assert [poller.poll() for _ in range(3)] == [1200, 600, 600]
@@ -0,0 +1,61 @@
+from konnector.main import todoist, clickup, todoistEndpoint
+from konnector.fake_api import FakeApi
+from konnector import recorder, replay
+
+
+class TestReplay:
+    def test_record_and_resign(
+        self, test_client, fake_api: FakeApi, monkeypatch, tmp_path
+    ):
+        """
+        GIVEN webhook recording is enabled
+        WHEN a signed Todoist webhook is received
+        THEN assert that the webhook is recorded without its signature and re-signing
+            the recording reproduces the original request.
+        """
+        recordFile = tmp_path / "webhooks.ndjson"
+        monkeypatch.setattr(recorder, "RECORD_FILE", str(recordFile))
+        item = fake_api.add_todoist_task(todoist.get_list_id("inbox"))
+        body, headers = fake_api.todoist_webhook(
+            todoist.secret, "item:added", item["id"], todoist.userIds[0]
+        )
+
+        test_client.post(todoistEndpoint, data=body, headers=headers)
+
+        (record,) = replay.load_webhooks(recordFile)
+        assert record["platform"] == "todoist"
+        assert record["path"] == todoistEndpoint
+        assert todoist.signatureKey not in record["headers"]
+        signers = replay.build_signers(todoist.secret, clickup.secret)
+        replayBody, replayHeaders = replay.sign(record, signers)
+        assert replayBody == body
+        assert replayHeaders[todoist.signatureKey] == headers[todoist.signatureKey]
+        assert replayHeaders["User-Agent"] == headers["User-Agent"]
+
+    def test_bad_webhook_not_recorded(self, test_client, monkeypatch, tmp_path):
+        """
+        GIVEN webhook recording is enabled
+        WHEN a webhook with an invalid signature is received
+        THEN assert that the webhook is not recorded.
+        """
+        recordFile = tmp_path / "webhooks.ndjson"
+        monkeypatch.setattr(recorder, "RECORD_FILE", str(recordFile))
+        headers = {"User-Agent": "Todoist-Webhooks", todoist.signatureKey: "bad"}
+
+        test_client.post(todoistEndpoint, data=b"{}", headers=headers)
+
+        assert not recordFile.exists()
+
+    def test_schedule(self):
+        """
+        GIVEN recorded webhooks
+        WHEN their replay is scheduled with time compression, a rate or bursts
+        THEN assert that the send times are correct.
+        """
+        records = [{"time": 100.0}, {"time": 102.0}, {"time": 106.0}, {"time": 107.0}]
+
+        assert replay.schedule(records) == [0, 2, 6, 7]
+        assert replay.schedule(records, speed=2) == [0, 1, 3, 3.5]
+        assert replay.schedule(records, maxGap=1) == [0, 1, 2, 3]
+        assert replay.schedule(records, rate=4) == [0, 0.25, 0.5, 0.75]
+        assert replay.schedule(records, rate=4, burst=2) == [0, 0, 0.5, 0.5]
@@ -0,0 +1,152 @@
+from konnector.main import todoist, clickup, clickupEndpoint
+from konnector.main import dueDateTimers, next_action_due, run_scheduler
+from konnector import main, store
+from konnector.konnector import Task
+from konnector.fake_api import FakeApi
+from konnector.timers import TaskTimers
+
+import os
+import sqlite3
+import subprocess
+import sys
+import time
+
+
+def timers() -> list[tuple]:
+    return [
+        tuple(row) for row in store.execute("SELECT name, task_id FROM task_timers")
+    ]
+
+
+class TestTaskTimers:
+    def test_timers_fire_in_order(self):
+        """
+        GIVEN timers set for several tasks
+        WHEN some of them are due
+        THEN assert that only those fire, earliest first, and only once.
+        """
+        timers = TaskTimers("test_timers", callback=None)
+        timers.set("late", 300)
+        timers.set("early", 100)
+        timers.set("middle", 200)
+        timers.set("cancelled", 150)
+        timers.cancel("cancelled")
+
+        assert timers.next_fire_time() == 100
+        assert timers.pop_due(now=250) == ["early", "middle"]
+        assert timers.pop_due(now=250) == []
+        assert timers.next_fire_time() == 300
+
+    def test_due_date_makes_next_action(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN a Clickup next action subtask due in 5 days with normal priority
+        WHEN its due date comes within 3 days
+        THEN assert that the timer fires and the task is added to Todoist next
+            actions.
+        """
+        dueDate = int((time.time() + 5 * 86400) * 1000)
+        clickupTask = fake_api.add_clickup_task(
+            clickup.get_list_id("inbox"),
+            status={"status": "next action"},
+            priority={"id": "3"},
+            parent="parentTask",
+            due_date=str(dueDate),
+        )
+        body, headers = fake_api.clickup_webhook(
+            clickup.secret, clickupTask["id"], clickup.userIds[0], "due_date"
+        )
+
+        test_client.post(clickupEndpoint, data=body, headers=headers)
+
+        assert fake_api.todoistTasks == {}
+        assert dueDateTimers.next_fire_time() == dueDate / 1000 - 3 * 86400
+
+        assert dueDateTimers.pop_due(now=time.time() + 2 * 86400) == [clickupTask["id"]]
+        # Simulate the time passing
+        clickupTask["due_date"] = str(int((time.time() + 86400) * 1000))
+        next_action_due(clickupTask["id"])
+
+        (item,) = fake_api.todoistTasks.values()
+        assert item["project_id"] == todoist.get_list_id("next_actions")
+
+    def test_timers_seeded_on_scheduler_start(self, fake_api: FakeApi, monkeypatch):
+        """
+        GIVEN a mirrored Clickup next action due in 5 days that has no timer
+        WHEN the scheduler starts
+        THEN assert that a timer is set without a webhook for the task.
+        """
+        dueDate = int((time.time() + 5 * 86400) * 1000)
+        clickupTask = fake_api.add_clickup_task(
+            clickup.get_list_id("inbox"),
+            status={"status": "next action"},
+            priority={"id": "3"},
+            parent="parentTask",
+            due_date=str(dueDate),
+        )
+        clickup.get_tasks("inbox")
+        dueDateTimers.cancel(clickupTask["id"])
+        started = []
+        monkeypatch.setattr(
+            main,
+            "create_scheduler",
+            lambda: type("Scheduler", (), {"start": lambda self: started.append(1)})(),
+        )
+
+        run_scheduler()
+
+        assert started == [1]
+        assert dueDateTimers.next_fire_time() == dueDate / 1000 - 3 * 86400
+        assert timers() == [("next_action_due", clickupTask["id"])]
+
+    def test_scheduler_starts_without_mirror(self, monkeypatch):
+        """
+        GIVEN a mirror that can't be read
+        WHEN the scheduler starts
+        THEN assert that it starts without seeding timers.
+        """
+
+        def locked_store(*args, **kwargs):
+            raise sqlite3.OperationalError("database is locked")
+
+        started = []
+        monkeypatch.setattr(main.mirror, "find", locked_store)
+        monkeypatch.setattr(
+            main,
+            "create_scheduler",
+            lambda: type("Scheduler", (), {"start": lambda self: started.append(1)})(),
+        )
+
+        run_scheduler()
+
+        assert started == [1]
+
+    def test_timers_seeded_by_another_process(self, fake_api: FakeApi):
+        """
+        GIVEN a Clickup next action mirrored by one process
+        WHEN a process that hasn't mirrored any tasks is elected to run the scheduler
+        THEN assert that the timer is set for the task's ID.
+        """
+        dueDate = int((time.time() + 5 * 86400) * 1000)
+        clickupTask = fake_api.add_clickup_task(
+            clickup.get_list_id("inbox"),
+            status={"status": "next action"},
+            priority={"id": "3"},
+            parent="parentTask",
+            due_date=str(dueDate),
+        )
+        clickup.get_tasks("inbox")
+        dueDateTimers.cancel(clickupTask["id"])
+        # A task without an ID can't be checked again when its timer fires
+        main.set_due_date_timer(Task(properties={"due_date": dueDate}))
+
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import konnector.main as main; main.seed_due_date_timers()",
+            ],
+            env={**os.environ, "KONNECTOR_DATA_DIR": store.DATA_DIR},
+            check=True,
+        )
+
+        assert timers() == [("next_action_due", clickupTask["id"])]
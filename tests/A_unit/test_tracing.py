@@ -0,0 +1,69 @@
+from konnector import limiter, tracing
+
+import json
+import time
+
+
+class TestTracing:
+    def test_nested_spans(self, tmp_path, monkeypatch):
+        """
+        GIVEN a trace file
+        WHEN a root span is opened with child spans
+        THEN assert that one trace is exported containing the spans with parent IDs
+            and the time spent in API requests.
+        """
+        traceFile = tmp_path / "traces.jsonl"
+        monkeypatch.setattr(tracing, "TRACE_FILE", str(traceFile))
+
+        @tracing.traced
+        def get_task():
+            with tracing.span(f"todoist.{tracing.REQUEST_SPAN}", method="GET"):
+                pass
+
+        with tracing.span("webhook"):
+            get_task()
+
+        traces = traceFile.read_text().splitlines()
+        assert len(traces) == 1
+        trace = json.loads(traces[0])
+        assert trace["name"] == "webhook"
+        assert [span["name"] for span in trace["spans"]] == [
+            "webhook",
+            "get_task",
+            "todoist._send_request",
+        ]
+        assert trace["spans"][1]["parent_id"] == trace["spans"][0]["span_id"]
+        assert trace["spans"][2]["parent_id"] == trace["spans"][1]["span_id"]
+        assert trace["spans"][2]["attributes"] == {"method": "GET"}
+        assert trace["network_ms"] == trace["spans"][2]["duration_ms"]
+
+    def test_disabled(self, monkeypatch):
+        """
+        GIVEN no trace file
+        WHEN a span is opened
+        THEN assert that attributes can still be set without a trace being recorded.
+        """
+        monkeypatch.setattr(tracing, "TRACE_FILE", "")
+        with tracing.span("webhook") as span:
+            span.set_attributes(event="new_task")
+        assert tracing.current_span() is tracing._NOOP_SPAN
+
+    def test_concurrent_requests(self, tmp_path, monkeypatch):
+        """
+        GIVEN a trace file
+        WHEN API requests are sent concurrently within a span
+        THEN assert that the network wall time only counts overlapping requests once.
+        """
+        traceFile = tmp_path / "traces.jsonl"
+        monkeypatch.setattr(tracing, "TRACE_FILE", str(traceFile))
+
+        def send_request(_):
+            with tracing.span(f"clickup.{tracing.REQUEST_SPAN}"):
+                time.sleep(0.1)
+
+        with tracing.span("webhook"):
+            limiter.fan_out(send_request, range(3))
+
+        trace = json.loads(traceFile.read_text())
+        assert trace["network_ms"] >= 300
+        assert 100 <= trace["network_wall_ms"] <= trace["duration_ms"] < 250
@@ -0,0 +1,64 @@
+from konnector.main import todoist, clickup, todoistEndpoint, clickupEndpoint
+from konnector.fake_api import FakeApi
+from konnector import metrics, versions
+
+
+def stale_count(platform) -> float:
+    key = metrics.WEBHOOKS_STALE._key({"platform": platform, "event": "task_updated"})
+    return metrics.WEBHOOKS_STALE.samples.get(key, 0)
+
+
+class TestWebhookVersions:
+    def test_stale_clickup_webhook_dropped(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN a Clickup webhook for a task that has already had a later webhook
+        WHEN the earlier webhook arrives late
+        THEN assert that it is dropped and counted without requests to either API.
+        """
+        task = fake_api.add_clickup_task(clickup.get_list_id("inbox"))
+        dropped = stale_count(clickup)
+        versions.apply(clickup, task["id"], int(task["date_updated"]) + 1000)
+        body, headers = fake_api.clickup_webhook(
+            clickup.secret, task["id"], clickup.userIds[0], "priority"
+        )
+
+        response = test_client.post(clickupEndpoint, data=body, headers=headers)
+
+        assert b"Stale" in response.get_data()
+        assert fake_api.requests == []
+        assert stale_count(clickup) == dropped + 1
+
+    def test_todoist_webhooks_in_order(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN Todoist webhooks for a task
+        WHEN they arrive in order, or the latest is delivered again
+        THEN assert that each is processed and the task version is recorded.
+        """
+        item = fake_api.add_todoist_task(
+            todoist.get_list_id("next_actions"), updated_at="2023-01-02T01:02:03.5Z"
+        )
+
+        for _ in range(2):
+            body, headers = fake_api.todoist_webhook(
+                todoist.secret, "item:updated", item["id"], todoist.userIds[0]
+            )
+            response = test_client.post(todoistEndpoint, data=body, headers=headers)
+            assert b"Stale" not in response.get_data()
+
+        assert versions.get(todoist, item["id"]) == 1672621323500
+
+    def test_todoist_version_fractions(self):
+        """
+        GIVEN Todoist updated_at times with fractions of any length, or none
+        WHEN each webhook's version is read
+        THEN assert that each time is parsed, whichever Python version is used.
+        """
+        for updatedAt, expected in (
+            ("2023-01-02T01:02:03.5Z", 1672621323500),
+            ("2023-01-02T01:02:03.25Z", 1672621323250),
+            ("2023-01-02T01:02:03.000000Z", 1672621323000),
+            ("2023-01-02T01:02:03Z", 1672621323000),
+        ):
+            data = {"event_data": {"id": "1", "updated_at": updatedAt}}
+
+            assert todoist._get_version_from_webhook(data) == ("1", expected)
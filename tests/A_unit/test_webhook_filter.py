@@ -0,0 +1,72 @@
+from konnector.main import todoist, clickup, todoistEndpoint, clickupEndpoint
+from konnector.fake_api import FakeApi, sign_clickup
+from konnector.konnector import find_json_values
+from konnector import metrics
+
+import json
+
+
+def rejected_count(platform, reason: str) -> float:
+    key = metrics.WEBHOOKS_REJECTED._key({"platform": platform, "reason": reason})
+    return metrics.WEBHOOKS_REJECTED.samples.get(key, 0)
+
+
+class TestWebhookFilter:
+    def test_find_json_values(self):
+        """
+        GIVEN a JSON body with a key at several depths
+        WHEN the key's values are found without parsing the body
+        THEN assert that strings, numbers and escaped strings are all found.
+        """
+        body = json.dumps(
+            {"id": 12, "items": [{"id": 'a"b'}, {"id": "34", "ids": "56"}]}
+        ).encode()
+
+        assert find_json_values(body, b'"id"') == {"12", 'a"b', "34"}
+        assert find_json_values(body, b'"missing"') == set()
+
+    def test_unsynced_list_rejected_before_parsing(
+        self, test_client, fake_api: FakeApi, monkeypatch
+    ):
+        """
+        GIVEN a signed Clickup webhook for a list that isn't synced
+        WHEN it is received
+        THEN assert that it is rejected without parsing its body or any requests.
+        """
+        rejected = rejected_count(clickup, "list")
+        body = json.dumps(
+            {
+                "event": "taskUpdated",
+                "task_id": "abc",
+                "history_items": [{"user": {"id": 2511898}, "parent_id": "999"}],
+            }
+        ).encode()
+        headers = {"X-Signature": sign_clickup(clickup.secret, body)}
+
+        def parsed(data):
+            raise AssertionError("Webhook body was parsed")
+
+        monkeypatch.setattr(clickup, "_get_check_user_from_webhook", parsed)
+
+        response = test_client.post(clickupEndpoint, data=body, headers=headers)
+
+        assert b"Invalid clickup list ID: 999" in response.get_data()
+        assert fake_api.requests == []
+        assert rejected_count(clickup, "list") == rejected + 1
+
+    def test_bad_signature_rejected(self, test_client, fake_api: FakeApi):
+        """
+        GIVEN a Todoist webhook signed with the wrong secret
+        WHEN it is received
+        THEN assert that it is rejected and counted by reason.
+        """
+        item = fake_api.add_todoist_task(todoist.get_list_id("inbox"))
+        body, headers = fake_api.todoist_webhook(
+            "wrong", "item:added", item["id"], todoist.userIds[0]
+        )
+        rejected = rejected_count(todoist, "signature")
+
+        response = test_client.post(todoistEndpoint, data=body, headers=headers)
+
+        assert b"Bad HMAC" in response.get_data()
+        assert rejected_count(todoist, "signature") == rejected + 1
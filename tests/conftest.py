@@ -1,5 +1,7 @@
 from konnector.main import app, todoist, clickup
 from konnector.konnector import Task, Platform
+from konnector.fake_api import FakeApiServer
+from konnector import store
 
 # TODO Use init
 from conf.conf_todoist import TODOIST_IN_LIST, todoist_dict, task_todoist  # noqa: F401
@@ -101,3 +103,24 @@ def task_2():
 def new_platform():
     platform = Platform("https://example.com", "/example")
     return platform
+
+
+@pytest.fixture(scope="session")
+def fake_api_server():
+    with FakeApiServer() as server:
+        yield server
+
+
+@pytest.fixture(scope="function")
+def fake_api(monkeypatch, fake_api_server: FakeApiServer):
+    for platform in (todoist, clickup):
+        monkeypatch.setattr(platform, "apiUrl", fake_api_server.url(platform.name))
+    fake_api_server.api.reset()
+    return fake_api_server.api
+
+
+@pytest.fixture(autouse=True)
+def data_dir(monkeypatch, tmp_path):
+    # Shared state is kept separate for each test
+    monkeypatch.setattr(store, "DATA_DIR", str(tmp_path / "data"))
+    return tmp_path / "data"